@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# benchmark for storing klimalogg history records
+# Copyright 2026 The weewx-klimalogg authors
+"""Store generated history records in a kl schema database, once with one
+transaction per record as StdArchive does, and once with store_records as
+KlimaLoggBulkIngest does, and report the time of each.
+
+weewx must be importable, for example:
+
+  PYTHONPATH=/home/weewx/bin python bench/bulk_ingest.py 51200
+
+Give a MySQL or MariaDB database to use that instead of SQLite; the
+database is dropped at the start of each run:
+
+  python bench/bulk_ingest.py 51200 mysql localhost weewx weewx
+"""
+
+from __future__ import print_function
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+import weedb
+import weewx.manager
+import user.kl as kl
+
+
+def gen_records(count, interval=300):
+    """records like those of genStartupRecords, ending now"""
+    end = int(time.time()) // interval * interval
+    for i in range(count):
+        ts = end - (count - 1 - i) * interval
+        rec = {'dateTime': ts, 'usUnits': 16, 'interval': interval // 60}
+        for x in range(9):
+            t = 20.0 + x + (i % 288) / 28.8
+            h = 40.0 + x + (i % 144) / 14.4
+            rec['temp%d' % x] = t
+            rec['humidity%d' % x] = h
+            rec['dewpoint%d' % x] = t - (100 - h) / 5.0
+            rec['heatindex%d' % x] = t
+        yield rec
+
+
+def open_db(db_dict):
+    try:
+        weedb.drop(db_dict)
+    except weedb.NoDatabase:
+        pass
+    return weewx.manager.DaySummaryManager.open_with_create(
+        db_dict, schema=kl.schema)
+
+
+def per_record(db_dict, count):
+    with open_db(db_dict) as dbm:
+        for rec in gen_records(count):
+            dbm.addRecord(rec, log_success=False)
+
+
+def bulk(db_dict, count):
+    with open_db(db_dict) as dbm:
+        kl.store_records(dbm, gen_records(count))
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 51200
+    tmpdir = None
+    if len(sys.argv) > 2 and sys.argv[2] == 'mysql':
+        db_dict = {'driver': 'weedb.mysql', 'database_name': 'kl_bench',
+                   'host': sys.argv[3], 'user': sys.argv[4],
+                   'password': sys.argv[5]}
+    else:
+        tmpdir = tempfile.mkdtemp()
+        db_dict = {'driver': 'weedb.sqlite', 'SQLITE_ROOT': tmpdir,
+                   'database_name': 'kl_bench.sdb'}
+    try:
+        for name, func in (('per record', per_record), ('bulk', bulk)):
+            t0 = time.time()
+            func(db_dict, count)
+            dt = time.time() - t0
+            print('%-10s %d records in %.1f s, %.0f records/s' %
+                  (name, count, dt, count / dt))
+    finally:
+        if tmpdir is not None:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    main()
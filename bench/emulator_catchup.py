@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+# benchmark for reading klimalogg history through the driver
+# Copyright 2026 The weewx-klimalogg authors
+"""Run KlimaLoggDriver.genStartupRecords against a KlimaLoggEmulator and
+report the catch-up throughput, then time a few LOOP packets.  The driver
+and the emulated console share a ScaledClock, so a run at speed 100 takes
+about a hundredth of the time the same run takes with a real console.
+
+weewx must be importable, for example:
+
+  PYTHONPATH=/home/weewx/bin python bench/emulator_catchup.py 5000 100
+
+Add 'adaptive' after the speed to use the adaptive_timing option.
+"""
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+import user.kl as kl
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 100
+    adaptive = len(sys.argv) > 3 and sys.argv[3] == 'adaptive'
+    clock = kl.ScaledClock(speed)
+    kl.time = clock
+    console = kl.KlimaLoggEmulator(records=records, clock=clock, seed=1)
+    driver = kl.KlimaLoggDriver(transport=console, polling_interval=10,
+                                batch_size=records,
+                                adaptive_timing=adaptive)
+    since = int(clock.time()) - (records - 1) * console.interval
+
+    t0 = time.time()
+    t0_sim = clock.time()
+    count = 0
+    for _ in driver.genStartupRecords(since):
+        count += 1
+    dt = time.time() - t0
+    dt_sim = clock.time() - t0_sim
+    print('%d records in %.1f s (%.1f s simulated), %.1f records/s simulated' %
+          (count, dt, dt_sim, count / dt_sim if dt_sim else 0))
+
+    t0_sim = clock.time()
+    n = 0
+    for packet in driver.genLoopPackets():
+        if len(packet) > 2:
+            n += 1
+            print('LOOP packet after %.1f s simulated' %
+                  (clock.time() - t0_sim))
+            t0_sim = clock.time()
+        if n == 3:
+            break
+    print('console: %s' % console.stats)
+    if adaptive:
+        print('timing: %s' % driver.get_poll_timing())
+
+
+if __name__ == '__main__':
+    main()
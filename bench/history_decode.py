@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# benchmark for decoding klimalogg history frames
+# Copyright 2026 The weewx-klimalogg authors
+"""Compare HistoryData.read with HistoryData.read_batch on a synthetic image
+of a full logger: 51,200 records in history frames of 6 records each.
+
+weewx must be importable, for example:
+
+  PYTHONPATH=/home/weewx/bin python bench/history_decode.py
+"""
+
+from __future__ import print_function
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+import user.kl as kl
+
+NUM_RECORDS = 51200
+
+
+def bcd(x):
+    return ((x // 10) << 4) | (x % 10)
+
+
+def put_temperature(buf, ofs, hi, value):
+    """write a temperature as 3 nibbles, or NP when value is None"""
+    if value is None:
+        n = (0xa, 0xa, 0xa)
+    else:
+        v = int(round((value + kl.SensorLimits.temperature_offset) * 10))
+        n = (v // 100, (v // 10) % 10, v % 10)
+    if hi:
+        buf[ofs] = (n[0] << 4) | n[1]
+        buf[ofs + 1] = (n[2] << 4) | (buf[ofs + 1] & 0xF)
+    else:
+        buf[ofs] = (buf[ofs] & 0xF0) | n[0]
+        buf[ofs + 1] = (n[1] << 4) | n[2]
+
+
+def make_frame(rnd, ts, sensors):
+    """one history frame with 6 records, newest at position 6"""
+    buf = bytearray(kl.HistoryData.FRAME_SIZE)
+    for i in range(1, 7):
+        t = time.localtime(ts - (6 - i) * 900)
+        if rnd.random() < 0.01:
+            m = kl.HistoryData.BUFMAPALA[i]
+            buf[m[0]] = 0xee
+            dt = m[1]
+            buf[m[2]] = (rnd.choice((1, 2, 4, 8)) << 4) | rnd.randint(0, 8)
+            put_temperature(buf, m[3], 0, rnd.uniform(-20, 40))
+            put_temperature(buf, m[4], 0, -10.0)
+            put_temperature(buf, m[5], 1, 30.0)
+            buf[m[6]] = bcd(rnd.randint(1, 99))
+            buf[m[7]] = bcd(20)
+            buf[m[8]] = bcd(80)
+        else:
+            m = kl.HistoryData.BUFMAPHIS[i]
+            dt = m[0]
+            for j in range(0, 9):
+                value = rnd.uniform(-20, 40) if j < sensors else None
+                put_temperature(buf, m[1][j], j % 2, value)
+                buf[m[2][j]] = bcd(rnd.randint(1, 99)) if j < sensors else 0xaa
+        buf[dt:dt + 5] = bytearray([bcd(t.tm_year - 2000), bcd(t.tm_mon),
+                                    bcd(t.tm_mday), bcd(t.tm_hour),
+                                    bcd(t.tm_min)])
+    return buf
+
+
+def main():
+    rnd = random.Random(1)
+    nframes = (NUM_RECORDS + 5) // 6
+    ts = int(time.time()) // 900 * 900 - nframes * 6 * 900
+    frames = [make_frame(rnd, ts + n * 6 * 900, 1 + n % 9)
+              for n in range(0, nframes)]
+    print('%d frames, %d records' % (nframes, nframes * 6))
+
+    t0 = time.time()
+    scalar = []
+    for buf in frames:
+        data = kl.HistoryData()
+        data.read(buf)
+        scalar.append(data)
+    t1 = time.time()
+    print('HistoryData.read:        %.3f s' % (t1 - t0))
+
+    if kl.numpy is None:
+        print('numpy is not available, skipping HistoryData.read_batch')
+        return
+    image = kl.numpy.frombuffer(b''.join([bytes(f) for f in frames]),
+                                dtype=kl.numpy.uint8).reshape(nframes, -1)
+    t0 = time.time()
+    batch = kl.HistoryData.read_batch(image)
+    t1 = time.time()
+    print('HistoryData.read_batch:  %.3f s' % (t1 - t0))
+
+    for a, b in zip(scalar, batch):
+        assert dict(a.values.items()) == dict(b.values.items())
+    print('results are identical')
+
+
+if __name__ == '__main__':
+    main()
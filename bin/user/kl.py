@@ -1182,8 +1182,16 @@ Step 7. Perform a setTX command
 Step 8. Go to step 1 to wait for state 0xde16 again.
 """
 from __future__ import print_function  # Python 2/3 compatiblity
+from array import array
 from datetime import datetime
+import abc
+import collections
+import heapq
+import json
+import mmap
+import os
 import random
+import struct
 import sys
 import threading
 import time
@@ -1197,7 +1205,24 @@ except ImportError:
     # Python 2
     from StringIO import StringIO
 
+try:
+    # Python 3
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
+
+try:
+    # optional, used to decode history frames in bulk
+    import numpy
+except ImportError:
+    numpy = None
+
+import weedb
 import weewx.drivers
+import weewx.engine
+import weewx.manager
+import weewx.units
 import weewx.wxformulas
 import weeutil.weeutil
 
@@ -1235,7 +1260,7 @@ except ImportError:
         logmsg(syslog.LOG_ERR, msg)
 
 DRIVER_NAME = 'KlimaLogg'
-DRIVER_VERSION = '1.4.2'
+DRIVER_VERSION = '1.5.0'
 
 
 def loader(config_dict, _):
@@ -1322,6 +1347,14 @@ KL_SENSOR_MAP = {
 }
 
 
+# bitmask of the 9 sensor channels; channel 0 is the console itself
+ALL_SENSORS = 0x1FF
+
+# the channel numbers of each bitmask of channels
+SENSOR_CHANNELS = tuple(tuple(x for x in range(0, 9) if (m >> x) & 1)
+                        for m in range(0, ALL_SENSORS + 1))
+
+
 # kl schema to use in place of the wview schema
 schema = [('dateTime',             'INTEGER NOT NULL UNIQUE PRIMARY KEY'),
           ('usUnits',              'INTEGER NOT NULL'),
@@ -1385,7 +1418,7 @@ def log_traceback(prefix='**** '):
     sfd.seek(0)
     for line in sfd:
         log.error('%s: %s' %
-                  (threading.currentThread().getName(), prefix + line))
+                  (threading.current_thread().name, prefix + line))
     del sfd
 
 
@@ -1407,6 +1440,65 @@ def get_datum_diff(v, np, ofl):
     return v
 
 
+def compile_sensor_map(sensor_map, prefix, record_class):
+    """the sensor map as a plan for extract_sensor_values: a tuple of the
+    values of record_class to copy, each as (name, slot, index, channel,
+    NP, OFL), and a tuple of the battery flags, each as (name, byte of the
+    alarm data, bit).  channel is None for values that are not of a
+    sensor.  Labels that record_class does not have are left out."""
+    values = []
+    batteries = []
+    for k in sensor_map:
+        label = sensor_map[k]
+        name = prefix + k
+        if label.startswith('BatteryStatus'):
+            if 'AlarmData' in record_class.KEYS:
+                n = int(label[-1])
+                if n == 0:
+                    batteries.append((name, 1, 0x80))
+                else:
+                    batteries.append((name, 0, 1 << (n - 1)))
+        elif label in record_class.KEYS:
+            slot, idx = record_class.KEYS[label]
+            np = ofl = None
+            channel = idx if slot in ('temp', 'temp_max', 'temp_min',
+                                      'humidity', 'humidity_max',
+                                      'humidity_min', 'dewpoint',
+                                      'heatindex') else None
+            if slot == 'dt':
+                channel = record_class.DT_MAP[idx][3]
+            elif label.startswith('Temp'):
+                np = SensorLimits.temperature_NP
+                ofl = SensorLimits.temperature_OFL
+            elif label.startswith('Humidity'):
+                np = SensorLimits.humidity_NP
+                ofl = SensorLimits.humidity_OFL
+            values.append((name, slot, idx, channel, np, ofl))
+    return tuple(values), tuple(batteries)
+
+
+def extract_sensor_values(plan, r, packet, sensors=ALL_SENSORS):
+    """add the values of the record r named by a compiled sensor map to
+    packet.  The values of channels that are not in the bitmask sensors
+    are None."""
+    values, batteries = plan
+    for name, slot, idx, channel, np, ofl in values:
+        if channel is not None and not (sensors >> channel) & 1:
+            x = None
+        elif slot == 'dt':
+            x = r.get_dt(idx)
+        elif idx is None:
+            x = getattr(r, slot)
+        else:
+            x = getattr(r, slot)[idx]
+        if np is not None and x is not None:
+            x = get_datum_diff(x, np, ofl)
+        packet[name] = x
+    if batteries and r.alarm_data is not None:
+        for name, byte, bit in batteries:
+            packet[name] = 1 if r.alarm_data[byte] ^ bit == 0 else 0
+
+
 def calc_checksum(buf, start, end=None):
     if end is None:
         end = len(buf)
@@ -1432,18 +1524,80 @@ def tstr_to_ts(tstr):
     return None
 
 
+# epoch of local midnight by (year, month, day), or None when the day has a
+# DST transition; see dt_to_ts
+_local_midnight = dict()
+
+
+def dt_to_ts(dt):
+    """convert a naive local datetime to an epoch timestamp.  The result is
+    the same as tstr_to_ts(str(dt)), but the time.strptime/time.mktime round
+    trip is done once per day instead of once per value."""
+    day = (dt.year, dt.month, dt.day)
+    try:
+        midnight = _local_midnight[day]
+    except KeyError:
+        try:
+            midnight = time.mktime(day + (0, 0, 0, 0, 0, -1))
+            next_midnight = time.mktime((dt.year, dt.month, dt.day + 1,
+                                         0, 0, 0, 0, 0, -1))
+        except (OverflowError, ValueError):
+            return None
+        if next_midnight - midnight != 86400:
+            # the UTC offset changes during this day
+            midnight = None
+        if len(_local_midnight) > 1000:
+            _local_midnight.clear()
+        _local_midnight[day] = midnight
+    if midnight is None:
+        try:
+            return int(time.mktime((dt.year, dt.month, dt.day, dt.hour,
+                                    dt.minute, dt.second, 0, 0, -1)))
+        except (OverflowError, ValueError):
+            return None
+    return int(midnight) + dt.hour * 3600 + dt.minute * 60 + dt.second
+
+
+# (dewpoint, heat index) by (temperature, humidity); see derived_values
+_derived = dict()
+
+
+def derived_values(temp, humidity):
+    """the dewpoint and heat index in degree C for a temperature and a
+    humidity.  Decoded temperatures come in steps of 0.1 and humidities in
+    steps of 1, so there are at most some 100,000 pairs, and each is
+    calculated once."""
+    key = (temp, humidity)
+    try:
+        return _derived[key]
+    except KeyError:
+        result = (weewx.wxformulas.dewpointC(temp, humidity),
+                  weewx.wxformulas.heatindexC(temp, humidity))
+        _derived[key] = result
+        return result
+
+
 def bytes_to_addr(a, b, c):
     return (((a << 8) | b) << 8) | c
 
 
 def addr_to_index(addr):
-    return (addr - 0x070000) / 32
+    return (addr - 0x070000) // 32
 
 
 def index_to_addr(idx):
     return 32 * idx + 0x070000
 
 
+def plan_segment(plan, idx):
+    """the position in plan of the segment [lo, hi, hi_ts] with the ring
+    index idx, which is after lo up to hi, or None"""
+    for n, (lo, hi, _) in enumerate(plan or ()):
+        if 0 < get_index(idx - lo) <= get_index(hi - lo):
+            return n
+    return None
+
+
 def print_dict(data):
     for x in sorted(data.keys()):
         if x == 'dateTime':
@@ -1476,6 +1630,15 @@ class KlimaLoggConfEditor(weewx.drivers.AbstractConfEditor):
     # from the sensors.
     polling_interval = 10
 
+    # Use push to emit each observation as soon as it arrives, instead of
+    # once per polling interval.
+    #loop_mode = poll
+
+    # How to talk to the USB transceiver: legacy (pyusb 0.x), core (pyusb
+    # 1.x with libusb), or auto to use core when it is available.  Use
+    # emulator to run against a simulated console, without hardware.
+    #transport = legacy
+
     # Sensors labels can have 1-10 upper-case alphanumeric characters or
     # the characters: space - + ( ) * , . / \ o
     # Sensor labels cannot be specified for non-present sensors.
@@ -1500,6 +1663,25 @@ class KlimaLoggConfEditor(weewx.drivers.AbstractConfEditor):
     #    outTemp = Temp1
     #    extraTemp2 = Temp2
 
+    # With user.kl.KlimaLoggBulkIngest in prep_services, the history read
+    # at startup is stored in one transaction per this many records or
+    # seconds.
+    #catchup_chunk_size = 1000
+    #catchup_chunk_period = 60
+
+    # To serve more than one console, list them here.  Consoles on the same
+    # transceiver use different logger channels, a transceiver is selected
+    # by its serial.  Observations are prefixed with the console name and
+    # an underscore unless a console has its own sensor map or prefix.
+    #[[consoles]]
+    #    [[[house]]]
+    #        logger_channel = 1
+    #    [[[cellar]]]
+    #        logger_channel = 2
+    #        [[[[sensor_map]]]]
+    #            cellarTemp = Temp0
+    #            cellarHumidity = Humidity0
+
 """
 
     def prompt_for_settings(self):
@@ -1539,10 +1721,25 @@ class KlimaLoggConfigurator(weewx.drivers.AbstractConfigurator):
         parser.add_option("--history-since", dest="recmin",
                           type=int, metavar="N",
                           help="display history records since N minutes ago")
+        parser.add_option("--dump", dest="dump", metavar="FILE",
+                          help="save the whole history memory of the station"
+                          " to FILE")
+        parser.add_option("--show-dump", dest="show_dump", metavar="FILE",
+                          help="display the history records saved in FILE")
+        parser.add_option("--import-dump", dest="import_dump", metavar="FILE",
+                          help="add the history records saved in FILE to"
+                          " the database")
         parser.add_option("--maxtries", dest="maxtries", type=int, default=3,
                           help="maximum number of retries, 0 indicates no max")
 
     def do_options(self, options, parser, config_dict, prompt):
+        # a logger image is read without the transceiver
+        if options.show_dump is not None:
+            self.show_dump(options.show_dump)
+            return
+        if options.import_dump is not None:
+            self.import_dump(options.import_dump, config_dict)
+            return
         maxtries = 3 if options.maxtries is None else int(options.maxtries)
         self.station = KlimaLoggDriver(**config_dict[DRIVER_NAME])
         if options.check:
@@ -1556,6 +1753,8 @@ class KlimaLoggConfigurator(weewx.drivers.AbstractConfigurator):
         elif options.recmin is not None:
             ts = int(time.time()) - options.recmin * 60
             self.show_history(maxtries, ts=ts)
+        elif options.dump is not None:
+            self.dump_history(maxtries, options.dump)
         else:
             self.show_info(maxtries)
         self.station.closePort()
@@ -1680,6 +1879,537 @@ class KlimaLoggConfigurator(weewx.drivers.AbstractConfigurator):
         for r in records:
             print(r)
 
+    def dump_history(self, maxtries, path):
+        """Save the history memory of the station to a logger image, without
+        decoding it; see show_dump and import_dump."""
+        print("Querying the station for its history memory...")
+        image = LoggerImage(path)
+        image.create()
+        ntries = 0
+        last_n = None
+        self.station.start_dumping_history(image)
+        self.station.clear_wait_at_start()  # let rf communication start
+        while not self.station.is_history_dumped():
+            if ntries >= maxtries:
+                print('Giving up after %d tries' % ntries)
+                break
+            time.sleep(30)
+            n = image.num_read
+            if n == last_n:
+                ntries += 1
+                print('No data after %d tries (%s)' % (ntries, PRESS_USB))
+            else:
+                ntries = 0
+            last_n = n
+            print("  Saved %s records: current=%s latest=%s remaining=%s\r" %
+                  (n, self.station.get_next_history_index(),
+                   self.station.get_latest_history_index(),
+                   self.station.get_uncached_history_count()))
+            sys.stdout.flush()
+        self.station.stop_caching_history()
+        self.station.clear_history_cache()
+        image.close()
+        print('Saved %d records to %s' % (image.num_read, path))
+
+    def show_dump(self, path):
+        """Display the history records of a logger image."""
+        image = LoggerImage(path)
+        image.open()
+        print('device id: 0x%04x, logger: %d, latest index: %d, dumped: %s' %
+              (image.device_id, image.logger_id + 1, image.latest_index,
+               weeutil.weeutil.timestamp_to_string(image.dump_ts)))
+        n = 0
+        for r in image.gen_history_records():
+            print(r)
+            n += 1
+        image.close()
+        print('Found %d records' % n)
+
+    def import_dump(self, path, config_dict):
+        """Add the records of a logger image that are newer than the
+        database to the archive, named with the sensor map of the driver
+        and in the unit system of the database."""
+        binding = config_dict.get('StdArchive', {}).get('data_binding',
+                                                        'wx_binding')
+        stn_dict = config_dict.get(DRIVER_NAME, {})
+        image = LoggerImage(path)
+        image.open()
+        console = KlimaLoggConsole(None, image.logger_id + 1,
+                                   sensor_map=KlimaLoggDriver.get_sensor_map(
+                                       stn_dict))
+        with weewx.manager.open_manager_with_config(
+                config_dict, binding, initialize=True) as dbmanager:
+            since_ts = dbmanager.lastGoodStamp() or 0
+            n = store_records(
+                dbmanager, console.gen_image_records(image, since_ts),
+                int(stn_dict.get('catchup_chunk_size', 1000)),
+                float(stn_dict.get('catchup_chunk_period', 60)),
+                unit_system=target_unit_system(config_dict))
+        image.close()
+        print('Added %d records from %s' % (n, path))
+
+
+# the weewx versions whose database managers store_records and
+# store_backfill know; they use internals of the managers, which are not
+# part of the weewx API
+WEEWX_VERSIONS = ('4.', '5.')
+
+
+def check_manager(dbmanager):
+    """raise UnsupportedFeature unless dbmanager is of a weewx version that
+    store_records and store_backfill know, with the internals they use"""
+    if not weewx.__version__.startswith(WEEWX_VERSIONS):
+        raise weewx.UnsupportedFeature(
+            'bulk storage is not known to work with weewx %s' %
+            weewx.__version__)
+    names = ['connection', 'table_name', '_addSingleRecord']
+    if isinstance(dbmanager, weewx.manager.DaySummaryManager):
+        names.extend(['_get_day_summary', '_calc_weight', '_set_day_summary',
+                      'backfill_day_summary'])
+    missing = [name for name in names if not hasattr(dbmanager, name)]
+    if missing:
+        raise weewx.UnsupportedFeature(
+            'bulk storage needs %s of the database manager of weewx %s' %
+            (', '.join(missing), weewx.__version__))
+
+
+def target_unit_system(config_dict):
+    """the unit system of the records that StdConvert passes to StdArchive"""
+    target_unit = config_dict.get('StdConvert', {}).get('target_unit', 'US')
+    return weewx.units.unit_constants[target_unit.upper()]
+
+
+def to_db_units(dbmanager, rec, unit_system=None):
+    """rec in the unit system of the archive of dbmanager, or in
+    unit_system if the archive has none yet, as StdConvert would have
+    converted it for StdArchive.  Without either rec is returned as is."""
+    target = dbmanager.std_unit_system or unit_system
+    if target is None:
+        return rec
+    return weewx.units.to_std_system(rec, target)
+
+
+def store_records(dbmanager, records, chunk_size=1000, chunk_period=60,
+                  stored=None, in_order=True, unit_system=None):
+    """Add records to the archive of dbmanager, in one transaction for each
+    chunk_size records or chunk_period seconds, whichever comes first.  The
+    daily summaries are not updated per record but in one pass at the end.
+    After each transaction stored is called with the time of its last
+    record.  Records that are not in_order are stored by store_backfill,
+    which updates the daily summaries as it goes.  The records are
+    converted by to_db_units with unit_system.  Returns the number of
+    records.  Raises UnsupportedFeature before storing anything if the
+    manager is not one that this knows, see check_manager."""
+    check_manager(dbmanager)
+    store_chunk = _store_chunk if in_order else store_backfill
+    count = 0
+    chunk = []
+    start = time.time()
+    for rec in records:
+        chunk.append(to_db_units(dbmanager, rec, unit_system))
+        if len(chunk) >= chunk_size or time.time() - start >= chunk_period:
+            count += store_chunk(dbmanager, chunk)
+            loginf('stored %d records %s %s' %
+                   (count, 'up to' if in_order else 'back to',
+                    weeutil.weeutil.timestamp_to_string(rec['dateTime'])))
+            if stored is not None:
+                stored(rec['dateTime'])
+            chunk = []
+            start = time.time()
+    if chunk:
+        count += store_chunk(dbmanager, chunk)
+        if stored is not None:
+            stored(chunk[-1]['dateTime'])
+    if count and in_order:
+        # the manager caches the time stamps of its first and last records
+        dbmanager.first_timestamp = dbmanager.firstGoodStamp()
+        dbmanager.last_timestamp = dbmanager.lastGoodStamp()
+        if isinstance(dbmanager, weewx.manager.DaySummaryManager):
+            # from the last update of the daily summaries
+            dbmanager.backfill_day_summary(progress_fn=None)
+    return count
+
+
+def _store_chunk(dbmanager, chunk):
+    n = 0
+    with weedb.Transaction(dbmanager.connection) as cursor:
+        for rec in chunk:
+            try:
+                # the archive table only, not the daily summaries
+                weewx.manager.Manager._addSingleRecord(
+                    dbmanager, rec, cursor, log_success=False)
+                n += 1
+            except (weedb.IntegrityError, weedb.OperationalError) as e:
+                logerr('unable to store record %s: %s' %
+                       (weeutil.weeutil.timestamp_to_string(rec['dateTime']), e))
+    return n
+
+
+def store_backfill(dbmanager, records, unit_system=None):
+    """Add history records that are older than those stored meanwhile from
+    LOOP packets to the archive of dbmanager, in one transaction, and each
+    to the daily summary of its day.  Unlike addRecord, this leaves the
+    time of the last update of the daily summaries as it is.  The records
+    may be in any order; those with the time of a stored record are
+    skipped, a record of the logger does not change.  The records are
+    converted by to_db_units with unit_system.  Returns the number of
+    records added.  Raises UnsupportedFeature if the manager is not one
+    that this knows, see check_manager."""
+    check_manager(dbmanager)
+    summaries = isinstance(dbmanager, weewx.manager.DaySummaryManager)
+    sql = 'SELECT dateTime FROM %s WHERE dateTime=?' % dbmanager.table_name
+    n = 0
+    days = dict()
+    with weedb.Transaction(dbmanager.connection) as cursor:
+        for rec in records:
+            cursor.execute(sql, (rec['dateTime'],))
+            if cursor.fetchone() is not None:
+                logdbg('record %s has been stored before' %
+                       weeutil.weeutil.timestamp_to_string(rec['dateTime']))
+                continue
+            rec = to_db_units(dbmanager, rec, unit_system)
+            try:
+                weewx.manager.Manager._addSingleRecord(
+                    dbmanager, rec, cursor, log_success=False,
+                    log_failure=False)
+            except (weedb.IntegrityError, weedb.OperationalError) as e:
+                logerr('unable to store record %s: %s' %
+                       (weeutil.weeutil.timestamp_to_string(rec['dateTime']), e))
+                continue
+            n += 1
+            if not summaries:
+                continue
+            sod = weeutil.weeutil.startOfArchiveDay(rec['dateTime'])
+            if sod not in days:
+                days[sod] = dbmanager._get_day_summary(sod, cursor)
+            try:
+                days[sod].addRecord(rec, weight=dbmanager._calc_weight(rec))
+            except ValueError as e:
+                loginf('record %s not in daily summary: %s' %
+                       (weeutil.weeutil.timestamp_to_string(rec['dateTime']), e))
+        for accum in days.values():
+            dbmanager._set_day_summary(accum, None, cursor)
+    if n:
+        dbmanager.first_timestamp = dbmanager.firstGoodStamp()
+        dbmanager.last_timestamp = dbmanager.lastGoodStamp()
+    return n
+
+
+class KlimaLoggBulkIngest(weewx.engine.StdService):
+    """Store the history read from the console at startup with
+    store_records, instead of one transaction per record.  Add it to
+    prep_services: the services of prep_services get the STARTUP event
+    before StdArchive, so the history is stored before the catch-up of
+    StdArchive, which then gets no records from the driver.  If the bulk
+    ingest fails, what it has not stored is left to that catch-up.  The
+    records of the bulk ingest are not passed to other services: they are
+    converted to the unit system of the database, or to the target_unit
+    of StdConvert for a new one, but StdCalibrate and StdQC do not see
+    them.
+
+    catchup_chunk_size and catchup_chunk_period in the driver section set
+    the size of the transactions; the records go to the data binding of
+    StdArchive.
+
+    With backfill in the driver section, the history is read in a thread
+    of its own while the engine gets LOOP packets.  The records read since
+    the last LOOP packet, at most catchup_chunk_size, are stored with each
+    LOOP packet by store_backfill, in the thread of the engine, so that
+    they do not contend with the archive records of StdArchive."""
+
+    def __init__(self, engine, config_dict):
+        super(KlimaLoggBulkIngest, self).__init__(engine, config_dict)
+        stn_dict = config_dict.get(DRIVER_NAME, {})
+        self.chunk_size = int(stn_dict.get('catchup_chunk_size', 1000))
+        self.chunk_period = float(stn_dict.get('catchup_chunk_period', 60))
+        archive_dict = config_dict.get('StdArchive', {})
+        self.data_binding = archive_dict.get('data_binding', 'wx_binding')
+        self.no_catchup = weeutil.weeutil.tobool(
+            archive_dict.get('no_catchup', False))
+        self.unit_system = target_unit_system(config_dict)
+        self.backfill = weeutil.weeutil.tobool(stn_dict.get('backfill', False))
+        self.backfill_queue = None  # records read, then None when done
+        self.backfill_chunk = []  # records taken from the queue, not stored
+        self.backfill_done = False
+        self.backfill_count = 0
+        self.t0 = None
+        self.bind(weewx.STARTUP, self.startup)
+        if self.backfill:
+            self.bind(weewx.NEW_LOOP_PACKET, self.new_loop_packet)
+
+    def startup(self, _event):
+        if self.no_catchup or not isinstance(self.engine.console,
+                                             KlimaLoggDriver):
+            return
+        # the database is created here if it does not exist yet, as by
+        # StdArchive, which gets its startup event after this service
+        dbmanager = self.engine.db_binder.get_manager(self.data_binding,
+                                                      initialize=True)
+        t0 = time.time()
+        try:
+            check_manager(dbmanager)
+        except weewx.UnsupportedFeature as e:
+            # nothing read yet, StdArchive catches up as without this service
+            logerr('bulk ingest disabled: %s' % e)
+            return
+        if self.backfill:
+            # before the catch-up of StdArchive, which would read the
+            # history before the first LOOP packet
+            self.start_backfill(dbmanager.lastGoodStamp())
+            return
+        try:
+            console = self.engine.console
+            n = store_records(dbmanager,
+                              console.gen_history_records(
+                                  dbmanager.lastGoodStamp(),
+                                  console.newest_first),
+                              self.chunk_size, self.chunk_period,
+                              console.history_stored,
+                              not console.newest_first, self.unit_system)
+        except (weewx.HardwareError, weewx.UnitError,
+                weedb.DatabaseError) as e:
+            # the records of the chunks stored are not read again
+            logerr('bulk ingest abandoned: %s' % e)
+            return
+        console.startup_records_stored()
+        loginf('bulk ingest stored %d records in %.0f s' %
+               (n, time.time() - t0))
+
+    def start_backfill(self, since_ts):
+        records = self.engine.console.start_backfill(since_ts)
+        # at most a chunk waits, reading pauses while the driver holds more
+        self.backfill_queue = queue.Queue(self.chunk_size)
+        self.t0 = time.time()
+        thread = threading.Thread(target=self.read_backfill, args=(records,))
+        thread.name = 'KLBackfill'
+        thread.daemon = True
+        thread.start()
+
+    def read_backfill(self, records):
+        """queue the history records as they are read, then None"""
+        try:
+            for rec in records:
+                self.backfill_queue.put(rec)
+        except weewx.HardwareError as e:
+            logerr('backfill abandoned: %s' % e)
+        finally:
+            self.backfill_queue.put(None)
+
+    def new_loop_packet(self, _event):
+        """store the history records that have been read meanwhile.  This
+        runs in the thread of the engine, as does new_archive_record of
+        StdArchive, so the two never write through the manager of the
+        binding at the same time; and the manager reads a daily summary
+        from the database each time it adds to it, so neither overwrites
+        what the other has added."""
+        if self.backfill_queue is None:
+            return
+        chunk = self.backfill_chunk
+        try:
+            while not self.backfill_done and len(chunk) < self.chunk_size:
+                rec = self.backfill_queue.get_nowait()
+                if rec is None:
+                    self.backfill_done = True
+                    break
+                chunk.append(rec)
+        except queue.Empty:
+            pass
+        if chunk:
+            dbmanager = self.engine.db_binder.get_manager(self.data_binding)
+            try:
+                self.backfill_count += store_backfill(dbmanager, chunk,
+                                                      self.unit_system)
+            except (weewx.UnitError, weedb.DatabaseError) as e:
+                # the transaction is rolled back, the records are stored
+                # with the next LOOP packet
+                logerr('backfill cannot store %d records: %s' %
+                       (len(chunk), e))
+                return
+            self.backfill_chunk = []
+            self.engine.console.history_stored(chunk[-1]['dateTime'])
+            logdbg('backfill stored %d records up to %s' %
+                   (self.backfill_count, weeutil.weeutil.timestamp_to_string(
+                       chunk[-1]['dateTime'])))
+        if self.backfill_done:
+            self.backfill_queue = None
+            loginf('backfill stored %d records in %.0f s' %
+                   (self.backfill_count, time.time() - self.t0))
+
+
+class KlimaLoggConsole(object):
+    """A console served by the driver: the logger channel and transceiver
+    through which it is reached, and how its observations are named."""
+
+    def __init__(self, name, logger_channel, serial=None, prefix='',
+                 sensor_map=None, values=None, transport=None,
+                 capture_file=None, checkpoint_file=None):
+        self.name = name
+        self.logger_channel = logger_channel
+        self.logger_id = logger_channel - 1
+        self.serial = serial
+        self.prefix = prefix
+        self.sensor_map = sensor_map
+        self.values = values
+        self.transport = transport
+        self.capture_file = capture_file
+        self.checkpoint_file = checkpoint_file
+        self.service = None
+        self.last_obs_version = None
+        # the sensor map compiled for current data and history records
+        self.current_plan = self.history_plan = ((), ())
+        if sensor_map is not None:
+            self.current_plan = compile_sensor_map(sensor_map, prefix,
+                                                   CurrentRecord)
+            self.history_plan = compile_sensor_map(sensor_map, prefix,
+                                                   HistoryRecord)
+        # (time, ring index) of the history records handed out, not stored
+        self.unstored = collections.deque()
+        # reading the newest records first, see history_gaps
+        self.newest_first = False
+        self.plan = None
+        self.history_complete = False
+
+    def __str__(self):
+        return '%s (channel %s)' % (self.name, self.logger_channel)
+
+    def get_snapshot(self):
+        return self.service.getSnapshot(self.logger_id)
+
+    def get_last_contact(self):
+        return self.service.getLastStat(self.logger_id).last_seen_ts
+
+    def get_active_sensors(self):
+        return self.get_snapshot().sensors
+
+    def start_caching_history(self, since_ts=0, num_rec=0):
+        self.service.startCachingHistory(since_ts, num_rec, self.logger_id)
+
+    def start_streaming_history(self, since_ts=0, newest_first=False):
+        self.newest_first = newest_first
+        self.plan = None
+        self.history_complete = False
+        self.service.startStreamingHistory(since_ts, self.logger_id,
+                                           self.read_checkpoint(),
+                                           newest_first)
+
+    def get_history_record(self, timeout):
+        return self.service.getHistoryRecord(timeout, self.logger_id)
+
+    def start_dumping_history(self, image):
+        self.service.startDumpingHistory(image, self.logger_id)
+
+    def is_history_dumped(self):
+        return self.service.isHistoryDumped(self.logger_id)
+
+    def is_history_streamed(self):
+        return self.service.isHistoryStreamed(self.logger_id)
+
+    def stop_caching_history(self):
+        self.service.stopCachingHistory(self.logger_id)
+
+    def get_uncached_history_count(self):
+        return self.service.getUncachedHistoryCount(self.logger_id)
+
+    def get_next_history_index(self):
+        return self.service.getNextHistoryIndex(self.logger_id)
+
+    def get_history_plan(self):
+        return self.service.getHistoryPlan(self.logger_id)
+
+    def get_latest_history_index(self):
+        return self.service.getLatestHistoryIndex(self.logger_id)
+
+    def get_cached_history_count(self):
+        return self.service.getCachedHistoryCount(self.logger_id)
+
+    def get_history_cache_records(self):
+        return self.service.getHistoryCacheRecords(self.logger_id)
+
+    def clear_history_cache(self):
+        self.service.clearHistoryCache(self.logger_id)
+
+    def clear_wait_at_start(self):
+        self.service.clearWaitAtStart(self.logger_id)
+
+    def history_packet(self, r, last_ts):
+        """the archive record for the HistoryRecord r, which follows the
+        record at last_ts"""
+        rec = dict()
+        rec['usUnits'] = weewx.METRIC
+        rec['dateTime'] = r.date_time
+        rec['interval'] = (r.date_time - last_ts) / 60
+        # calculate the dewpoint and heatindex for each sensor
+        # FIXME: this belongs in StdWXCalculate
+        for y in SENSOR_CHANNELS[r.sensors]:
+            r.dewpoint[y], r.heatindex[y] = derived_values(
+                r.temp[y], r.humidity[y])
+        # get values requested from the sensor map
+        extract_sensor_values(self.history_plan, r, rec, r.sensors)
+        return rec
+
+    def gen_image_records(self, image, since_ts=0):
+        """the archive records of the LoggerImage image since since_ts"""
+        last_ts = None
+        for r in image.gen_history_records(since_ts):
+            if last_ts is not None:
+                yield self.history_packet(r, last_ts)
+            last_ts = r.date_time
+
+    def read_checkpoint(self):
+        if self.checkpoint_file is None:
+            return None
+        try:
+            with open(self.checkpoint_file) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            loginf('console %s: no checkpoint: %s' % (self, e))
+            return None
+
+    def history_stored(self, ts):
+        """the records up to ts, or back to ts when reading the newest
+        first, have been stored; remember where in the ring of the logger
+        the last one is"""
+        last = None
+        if self.newest_first:
+            while self.unstored and self.unstored[0][0] >= ts:
+                last = self.unstored.popleft()
+        else:
+            while self.unstored and self.unstored[0][0] <= ts:
+                last = self.unstored.popleft()
+        if last is None or self.checkpoint_file is None:
+            return
+        checkpoint = {'latest_index': self.get_latest_history_index(),
+                      'device_id': self.service.getDeviceID(),
+                      'logger_channel': self.logger_channel}
+        if self.newest_first:
+            checkpoint['gaps'] = self.history_gaps(last)
+        else:
+            checkpoint['next_index'] = last[1]
+            checkpoint['last_ts'] = last[0]
+        tmp = self.checkpoint_file + '.tmp'
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(checkpoint, f)
+            os.rename(tmp, self.checkpoint_file)
+        except (IOError, OSError) as e:
+            logerr('console %s: cannot save checkpoint: %s' % (self, e))
+
+    def history_gaps(self, last):
+        """the segments of the plan that are still to be read once the
+        record last, (time, ring index), and all newer have been stored.
+        Of the segment of last, the records after its lo up to last are
+        left; the first of them only gives the interval of the next one."""
+        if self.history_complete and not self.unstored:
+            return []
+        n = plan_segment(self.plan, last[1])
+        if n is None:
+            return []
+        lo = self.plan[n][0]
+        gaps = [list(g) for g in self.plan[n + 1:]]
+        if get_index(last[1] - lo) > 2:
+            gaps.insert(0, [lo, last[1], last[0]])
+        return gaps
+
 
 class KlimaLoggDriver(weewx.drivers.AbstractDevice):
     """Driver for TFA KlimaLogg stations."""
@@ -1702,6 +2432,12 @@ class KlimaLoggDriver(weewx.drivers.AbstractDevice):
         polling_interval: How often to sample the USB interface for data.
         [Optional. Default is 10 seconds]
 
+        loop_mode: 'poll' to return a LOOP packet every polling_interval, or
+        'push' to return one as soon as the console sends new data.  In push
+        mode an empty packet is returned after polling_interval without
+        data.
+        [Optional. Default is poll]
+
         comm_interval: Communications mode interval
         [Optional.  Default is 8]
 
@@ -1728,15 +2464,83 @@ class KlimaLoggDriver(weewx.drivers.AbstractDevice):
         the logger.
         [Optional.  Default is 51200]
 
-        batch_size: Number of records to read in each tranche while reading
-        records from the logger.
+        batch_size: Number of records that may be read from the logger
+        ahead of the records that weewx has taken.  Reading pauses while
+        this many records wait.
         [Optional.  Default is 1800]
+
+        transport: How to talk to the USB transceiver: 'legacy' for the
+        pyusb 0.x API, 'core' for the pyusb 1.x API with libusb, 'auto'
+        to use core when it is available, or 'emulator' for a simulated
+        console.  A transport object may also be given, for example a
+        KlimaLoggEmulator with other settings.
+        [Optional.  Default is legacy]
+
+        capture_file: Append every transfer to and from the transceiver to
+        this file, in the binary format of CaptureTransport.
+        [Optional.  Default is None]
+
+        replay_file: Instead of a transceiver, play back the responses in
+        this capture file.
+        [Optional.  Default is None]
+
+        adaptive_timing: Learn when the console answers each kind of
+        message and sleep and poll accordingly, instead of the fixed
+        timing.  See get_poll_timing for what has been learned.
+        [Optional.  Default is False]
+
+        checkpoint_file: Where to note how far history has been read and
+        stored, so that reading can resume from there after a restart.
+        [Optional.  Default is None]
+
+        catchup_chunk_size, catchup_chunk_period: With KlimaLoggBulkIngest
+        in prep_services, history read at startup is stored in one
+        transaction per this many records or seconds.
+        [Optional.  Default is 1000 and 60]
+
+        backfill: With KlimaLoggBulkIngest in prep_services, read the
+        history in the background while LOOP packets are returned, instead
+        of before the first one.  The records are stored as they arrive,
+        with each LOOP packet, see KlimaLoggBulkIngest.
+        [Optional.  Default is False]
+
+        backfill_share: While history is read, the share of the requests to
+        the console that ask for history; the others ask for current
+        weather.  Current weather is always asked for when it is stale.
+        [Optional.  Default is 0.9 with backfill, else 1.0]
+
+        history_order: 'oldest' to read the history from the oldest record
+        on, 'newest' to read the newest records first and go back in time.
+        With newest, the records are stored out of order, which only
+        KlimaLoggBulkIngest does; without it the order is oldest.  With a
+        checkpoint_file, the gaps left when reading stops are read at the
+        next start.
+        [Optional.  Default is oldest]
+
+        consoles: Serve several consoles instead of one.  Each subsection
+        names a console and may specify its logger_channel, serial,
+        sensor_text1-8, sensor_map, transport, capture_file and
+        checkpoint_file; serial,
+        sensor_map and transport default to the values for the driver.
+        Consoles with the same serial share a transceiver and RF thread,
+        each transceiver gets its own.  Observations of a console are
+        prefixed with its prefix, which defaults to the name of the console
+        and an underscore, or to nothing if the console has its own
+        sensor_map.  LOOP packets and archive records contain the
+        observations of all consoles.
+        [Optional.  Default is None]
         """
         loginf('driver version is %s' % DRIVER_VERSION)
         self.vendor_id = stn_dict.get('vendor_id', 0x6666)
         self.product_id = stn_dict.get('product_id', 0x5555)
         self.model = stn_dict.get('model', 'TFA KlimaLogg Pro')
         self.polling_interval = int(stn_dict.get('polling_interval', 10))
+        self.loop_mode = stn_dict.get('loop_mode', 'poll').lower()
+        if self.loop_mode not in ('poll', 'push'):
+            raise weewx.ViolatedPrecondition(
+                "loop_mode must be 'poll' or 'push', not '%s'" %
+                self.loop_mode)
+        loginf('loop mode is %s' % self.loop_mode)
         self.comm_interval = int(stn_dict.get('comm_interval', 8))
         self.logger_channel = int(stn_dict.get('logger_channel', 1))
         loginf('channel is %s' % self.logger_channel)
@@ -1745,32 +2549,58 @@ class KlimaLoggDriver(weewx.drivers.AbstractDevice):
         self.config_serial = stn_dict.get('serial', None)
         if self.config_serial is not None:
             loginf('serial is %s' % self.config_serial)
-        self.sensor_map = stn_dict.get('sensor_map', None)
-        if self.sensor_map is None:
-            sensor_map_id = int(stn_dict.get('sensor_map_id', 0))
-            if sensor_map_id == 0:
-                self.sensor_map = KL_SENSOR_MAP
-                self.setup_units_kl_schema()
-                logdbg('using sensor map for kl schema')
-            else:
-                self.sensor_map = WVIEW_SENSOR_MAP
-                self.setup_units_wview_schema()
-                logdbg('using sensor map for wview schema')
-        else:
-            logdbg('using custom sensor map')
+        self.sensor_map = self.get_sensor_map(stn_dict)
         loginf('sensor map is: %s' % self.sensor_map)
         self.max_history_records = int(stn_dict.get('max_history_records', 51200))
         loginf('catchup limited to %s records' % self.max_history_records)
         self.batch_size = int(stn_dict.get('batch_size', 1800))
+        self.transport = stn_dict.get('transport', 'legacy')
+        self.replay_file = stn_dict.get('replay_file', None)
+        if self.replay_file is not None:
+            self.transport = ReplayTransport(self.replay_file)
+        loginf('transport is %s' % self.transport)
+        self.capture_file = stn_dict.get('capture_file', None)
+        if self.capture_file is not None:
+            loginf('capture file is %s' % self.capture_file)
+        self.checkpoint_file = stn_dict.get('checkpoint_file', None)
+        if self.checkpoint_file is not None:
+            loginf('checkpoint file is %s' % self.checkpoint_file)
         timing = int(stn_dict.get('timing', 300))
         self.first_sleep = float(timing) / 1000.0
         loginf('timing is %s ms (%0.3f s)' % (timing, self.first_sleep))
+        self.adaptive_timing = weeutil.weeutil.tobool(
+            stn_dict.get('adaptive_timing', False))
+        if self.adaptive_timing:
+            loginf('timing is adapted to the console')
+        self.backfill = weeutil.weeutil.tobool(stn_dict.get('backfill', False))
+        self.backfill_share = float(stn_dict.get(
+            'backfill_share', 0.9 if self.backfill else 1.0))
+        if not 0.0 <= self.backfill_share <= 1.0:
+            raise weewx.ViolatedPrecondition(
+                "backfill_share must be between 0 and 1")
+        if self.backfill:
+            loginf('history is read in the background, with %.0f%% of the'
+                   ' requests' % (self.backfill_share * 100))
+        # KlimaLoggBulkIngest has stored the history records, or reads them
+        # in the background; see startup_records_stored and start_backfill
+        self.startup_records_done = False
+        history_order = stn_dict.get('history_order', 'oldest').lower()
+        if history_order not in ('oldest', 'newest'):
+            raise weewx.ViolatedPrecondition(
+                "history_order must be 'oldest' or 'newest', not '%s'" %
+                history_order)
+        self.newest_first = history_order == 'newest'
+        loginf('history order is %s first' % history_order)
         self.values = dict()
         for i in range(1, 9):
             self.values['sensor_text%d' % i] = stn_dict.get('sensor_text%d' % i, None)
+        self._consoles = self.get_consoles(stn_dict.get('consoles', None))
+        self._console = self._consoles[0]
 
         now = int(time.time())
         self._service = None
+        self._services = []
+        self._snapshot_ready = threading.Condition()
         self._last_obs_ts = None
         self._last_nodata_log_ts = now
         self._nodata_interval = 300  # how often to check for no data
@@ -1805,14 +2635,34 @@ class KlimaLoggDriver(weewx.drivers.AbstractDevice):
         """Generator function that continuously returns decoded packets."""
         while True:
             self._packet_count += 1
+            if self.loop_mode == 'push':
+                # wait for new data, but no longer than the polling interval
+                self.wait_for_current_data(self.polling_interval)
             now = int(time.time() + 0.5)
-            packet = self.get_observation()
+            is_new = False
+            packet = None
+            for console in self._consoles:
+                snapshot = console.get_snapshot()
+                # the observations of a console that has no new data are
+                # not repeated with the time of another's
+                if console.last_obs_version == snapshot.current_version:
+                    continue
+                is_new = True
+                console.last_obs_version = snapshot.current_version
+                obs = self.get_observation(snapshot, console)
+                if obs is None:
+                    continue
+                if packet is None:
+                    packet = obs
+                else:
+                    obs['dateTime'] = max(obs['dateTime'], packet['dateTime'])
+                    packet.update(obs)
             if packet is not None:
                 ts = packet['dateTime']
                 if DEBUG_WEATHER_DATA > 0:
                     logdbg('genLoopPackets: packet_count=%s: ts=%s packet=%s' %
                            (self._packet_count, ts, packet))
-                if self._last_obs_ts is None or self._last_obs_ts != ts:
+                if is_new:
                     self._last_obs_ts = ts
                     self._empty_packet_count = 0
                     self._last_nodata_log_ts = now
@@ -1862,124 +2712,211 @@ class KlimaLoggDriver(weewx.drivers.AbstractDevice):
                     self._last_contact_log_ts = now
 
             yield packet
-            time.sleep(self.polling_interval)                    
+            if self.loop_mode != 'push':
+                time.sleep(self.polling_interval)
+
+    def wait_for_current_data(self, timeout):
+        """wait until a console has new current data, or timeout seconds"""
+        end = time.time() + timeout
+        with self._snapshot_ready:
+            while True:
+                for console in self._consoles:
+                    snapshot = console.get_snapshot()
+                    if console.last_obs_version != snapshot.current_version:
+                        return
+                remaining = end - time.time()
+                if remaining <= 0:
+                    return
+                self._snapshot_ready.wait(remaining)
 
     def genStartupRecords(self, ts):
+        if self.startup_records_done:
+            # KlimaLoggBulkIngest has taken care of them
+            return
+        # a record has been stored by the time the next one is asked for
+        last_ts = None
+        n = 0
+        for rec in self.gen_history_records(ts):
+            yield rec
+            last_ts = rec['dateTime']
+            n += 1
+            if n % 100 == 0:
+                self.history_stored(last_ts)
+        if last_ts is not None:
+            self.history_stored(last_ts)
+
+    def startup_records_stored(self):
+        """KlimaLoggBulkIngest has stored the history records since the
+        last record in the database; genStartupRecords then has none"""
+        self.startup_records_done = True
+
+    def start_backfill(self, ts):
+        """the history records of all consoles since ts, to be read in the
+        background while LOOP packets are returned; genStartupRecords then
+        has no records"""
+        self.startup_records_done = True
+        return self.gen_history_records(ts, self.newest_first)
+
+    def history_stored(self, ts):
+        """the history records up to ts have been stored"""
+        for console in self._consoles:
+            console.history_stored(ts)
+
+    def gen_history_records(self, ts, newest_first=False):
+        """the history records of all consoles since ts, the oldest first
+        unless newest_first, then followed by those of the gaps of the
+        checkpoints"""
         loginf('Scanning historical records')
-        self.clear_wait_at_start()  # let rf communication start
-        first_ts = ts
-        max_store_period = 300  # do another batch when period to save records is more than max_store_period
-        batch_started = False
+        # start all consoles at once, a console that is not asked for its
+        # records marks them as read
+        for console in self._consoles:
+            console.start_streaming_history(ts, newest_first)
+            console.clear_wait_at_start()  # let rf communication start
+        if len(self._consoles) == 1:
+            for rec in self.gen_console_records(self._console, ts):
+                yield rec
+            return
+        # merge the records of the consoles in time order, those with the
+        # same time stamp into one record
+        streams = [self.gen_timed_records(i, c, ts)
+                   for i, c in enumerate(self._consoles)]
+        last = None
+        for _, _, rec in heapq.merge(*streams):
+            rec_ts = rec['dateTime']
+            if last is not None and last['dateTime'] == rec_ts:
+                last.update(rec)
+                continue
+            if last is not None:
+                yield last
+            last = rec
+        if last is not None:
+            yield last
+
+    def gen_timed_records(self, n, console, ts):
+        sign = -1 if console.newest_first else 1
+        for rec in self.gen_console_records(console, ts):
+            yield sign * rec['dateTime'], n, rec
+
+    def gen_console_records(self, console, ts):
+        """the history records of one console since ts, as they arrive"""
+        maxtries = 1445  # once per day at 00:00 the communication starts automatically ???
+        ntries = 0
         records_handled = 0
-        n = 0
-        store_period = max_store_period
-        while store_period >= max_store_period:
-            maxtries = 1445  # once per day at 00:00 the communication starts automatically ???
-            ntries = 0
-            last_n = nrem = None
-            last_ts = int(time.time())
-            self.start_caching_history(since_ts=first_ts)
-            while nrem is None or nrem > 0:
+        last_ts = None
+        this_ts = None
+        last = None
+        while not console.is_history_streamed():
+            r = console.get_history_record(15)
+            if r is None:
+                ntries += 1
                 if ntries >= maxtries:
                     logerr('No historical data after %d tries' % ntries)
-                    return
-                time.sleep(15)
-                ntries += 1
-                now = int(time.time())
-                n = self.get_cached_history_count()
-                batch_started = n > 0
-                if n == last_n:
-                    dur = now - last_ts
-                    if not batch_started:
-                        if records_handled == 0:
-                            logtee(PRESS_USB)
-                        else:
-                            logtee("The next batch of %s records will start within 5 minutes" % self.batch_size)
-                else:
-                    ntries = 0
-                    last_ts = now
-                last_n = n
-                nrem = self.get_uncached_history_count()
-                ni = self.get_next_history_index()
-                li = self.get_latest_history_index()
-                if batch_started and n != 0:
-                    logtee("Records scanned: %s" % n)
-                # handle historical records in batches of batch_size
-                if n >= self.batch_size:
                     break
-            self.stop_caching_history()
-            records = self.get_history_cache_records()
-            self.clear_history_cache()
-            num_received = len(records) - 1
-            logtee('Found %d historical records' % num_received)
-            last_ts = None
-            this_ts = None
-            for r in records:
-                this_ts = r['dateTime']
-                records_handled += 1
-                logtee("Handle record %s: %s" % (records_handled, weeutil.weeutil.timestamp_to_string(this_ts)))
-                if last_ts is not None:
-                    rec = dict()
-                    rec['usUnits'] = weewx.METRIC
-                    rec['dateTime'] = this_ts
-                    rec['interval'] = (this_ts - last_ts) / 60
-                    # calculate the dewpoint and heatindex for each sensor
-                    # FIXME: this belongs in StdWXCalculate
-                    for y in range(0, 9):
-                        if 'Temp%d' % y in r and 'Humidity%d' % y in r:
-                            r['dewpoint%d' % y] = weewx.wxformulas.dewpointC(
-                                r['Temp%s' % y], r['Humidity%d' % y])
-                            r['heatindex%d' % y] = weewx.wxformulas.heatindexC(
-                                r['Temp%s' % y], r['Humidity%d' % y])
-                    # get values requested from the sensor map
-                    for k in self.sensor_map:
-                        label = self.sensor_map[k]
-                        if label in r:
-                            if label.startswith('Temp'):
-                                x = get_datum_diff(r[label],
-                                                   SensorLimits.temperature_NP,
-                                                   SensorLimits.temperature_OFL)
-                            elif label.startswith('Humidity'):
-                                x = get_datum_diff(r[label],
-                                                   SensorLimits.humidity_NP,
-                                                   SensorLimits.humidity_OFL)
-                            else:
-                                x = r[label]
-                            rec[k] = x
-                    yield rec
-                last_ts = this_ts
-            # go for another scan when store_period is greater than
-            # max_store_period
-            if this_ts is not None:
-                store_period = int(time.time()) - this_ts
-                logtee("Saved %d historical records; ts last saved record %s" %
-                       (num_received,
-                        weeutil.weeutil.timestamp_to_string(this_ts)))
-                if n >= self.batch_size:
-                    first_ts = this_ts  # continue next batch with last found time stamp
-                    logtee('Scan the next batch of %d historical records' % self.batch_size)
-                    logtee("The scan will start after the next historical record is received.")
-                elif store_period >= max_store_period:
-                    first_ts = this_ts  # continue next batch with last found time stamp
-                    logtee('Scan the historical records missed during the store period of %d s' % store_period)
-                    logtee("The scan will start after the next historical record is received.")
-            else:
-                store_period = 0
+                if records_handled == 0:
+                    logtee(PRESS_USB)
+                else:
+                    logtee("Records scanned: %s remaining: %s" %
+                           (records_handled,
+                            console.get_uncached_history_count()))
+                continue
+            ntries = 0
+            this_ts = r.date_time
+            records_handled += 1
+            logtee("Handle record %s: %s" % (records_handled, weeutil.weeutil.timestamp_to_string(this_ts)))
+            if console.newest_first:
+                if console.plan is None:
+                    console.plan = console.get_history_plan()
+                # the one before, if this one, which is older, is of the
+                # same segment and so gives its interval
+                if (last is not None and
+                    plan_segment(console.plan, r.index) ==
+                    plan_segment(console.plan, last.index)):
+                    console.unstored.append((last_ts, last.index))
+                    yield console.history_packet(last, this_ts)
+            elif last_ts is not None:
+                console.unstored.append((this_ts, r.index))
+                yield console.history_packet(r, last_ts)
+            last_ts = this_ts
+            last = r
+        console.history_complete = console.is_history_streamed()
+        console.stop_caching_history()
+        console.clear_history_cache()
+        if this_ts is not None:
+            logtee("Saved %d historical records; ts last saved record %s" %
+                   (max(records_handled - 1, 0),
+                    weeutil.weeutil.timestamp_to_string(this_ts)))
+
+    def get_consoles(self, consoles_dict):
+        """the consoles to serve, from the consoles section if there is one,
+        otherwise the one console given by the driver settings"""
+        if not consoles_dict:
+            return [KlimaLoggConsole(None, self.logger_channel,
+                                     self.config_serial, '', self.sensor_map,
+                                     self.values, self.transport,
+                                     self.capture_file,
+                                     self.checkpoint_file)]
+        consoles = []
+        seen = set()
+        for name in consoles_dict:
+            cfg = consoles_dict[name]
+            channel = int(cfg.get('logger_channel', 1))
+            if not 1 <= channel <= 10:
+                raise weewx.ViolatedPrecondition(
+                    "console %s: logger_channel must be 1-10" % name)
+            serial = cfg.get('serial', self.config_serial)
+            if (serial, channel) in seen:
+                raise weewx.ViolatedPrecondition(
+                    "console %s: channel %s of transceiver %s is already used"
+                    % (name, channel, serial))
+            seen.add((serial, channel))
+            sensor_map = cfg.get('sensor_map', None)
+            prefix = cfg.get('prefix', '' if sensor_map else '%s_' % name)
+            values = dict()
+            for i in range(1, 9):
+                values['sensor_text%d' % i] = cfg.get('sensor_text%d' % i, None)
+            console = KlimaLoggConsole(name, channel, serial, prefix,
+                                       sensor_map or self.sensor_map, values,
+                                       cfg.get('transport', self.transport),
+                                       cfg.get('capture_file', None),
+                                       cfg.get('checkpoint_file', None))
+            loginf("console %s: serial=%s prefix='%s'" %
+                   (console, serial, prefix))
+            consoles.append(console)
+        return consoles
 
     def startUp(self):
         if self._service is not None:
             return
-        self._service = CommunicationService(self.first_sleep, self.values,
-                                             self.max_history_records,
-                                             self.batch_size)
-        self._service.setup(self.frequency, self.comm_interval,
-                            self.logger_channel, self.vendor_id,
-                            self.product_id, self.config_serial)
-        self._service.startRFThread()
+        # one service, and so one RF thread, for each transceiver
+        services = dict()
+        for console in self._consoles:
+            service = services.get(console.serial)
+            if service is None:
+                service = CommunicationService(self.first_sleep, console.values,
+                                               self.max_history_records,
+                                               self.batch_size,
+                                               console.transport,
+                                               console.capture_file,
+                                               self.adaptive_timing,
+                                               self._snapshot_ready,
+                                               self.backfill_share)
+                services[console.serial] = service
+                self._services.append(service)
+            service.addConsole(console.logger_channel, console.values)
+            console.service = service
+        for service in self._services:
+            console = [c for c in self._consoles if c.service is service][0]
+            service.setup(self.frequency, self.comm_interval,
+                          console.logger_channel, self.vendor_id,
+                          self.product_id, console.serial)
+            service.startRFThread()
+        self._service = self._console.service
 
     def shutDown(self):
-        self._service.stopRFThread()
-        self._service.teardown()
+        for service in self._services:
+            service.stopRFThread()
+            service.teardown()
+        self._services = []
         self._service = None
 
     def transceiver_is_present(self):
@@ -1994,8 +2931,43 @@ class KlimaLoggDriver(weewx.drivers.AbstractDevice):
     def get_transceiver_id(self):
         return self._service.getDeviceID()
 
+    def get_poll_timing(self):
+        return self._service.getPollTiming()
+
+    def get_active_sensors(self, console=None):
+        """bitmask of the channels of the console that have a sensor; bit 0
+        is the console itself"""
+        if console is None:
+            console = self._console
+        return console.get_active_sensors()
+
     def get_last_contact(self):
-        return self._service.getLastStat().last_seen_ts
+        """when the console heard from least recently was last heard from"""
+        last = None
+        for console in self._consoles:
+            ts = console.get_last_contact()
+            if ts is None:
+                return None
+            if last is None or ts < last:
+                last = ts
+        return last
+
+    @classmethod
+    def get_sensor_map(cls, stn_dict):
+        """the sensor map of the driver settings stn_dict; the unit groups
+        of the observations of a schema map are set up"""
+        sensor_map = stn_dict.get('sensor_map', None)
+        if sensor_map is not None:
+            logdbg('using custom sensor map')
+        elif int(stn_dict.get('sensor_map_id', 0)) == 0:
+            sensor_map = KL_SENSOR_MAP
+            cls.setup_units_kl_schema()
+            logdbg('using sensor map for kl schema')
+        else:
+            sensor_map = WVIEW_SENSOR_MAP
+            cls.setup_units_wview_schema()
+            logdbg('using sensor map for wview schema')
+        return sensor_map
 
     @staticmethod
     def setup_units_kl_schema():
@@ -2069,86 +3041,71 @@ class KlimaLoggDriver(weewx.drivers.AbstractDevice):
                    'Temp7', 'Humidity7',
                    'Temp8', 'Humidity8']
 
-    def get_observation(self):
-        data = self._service.getCurrentData()
-        ts = data.values['timestamp']
+    def get_observation(self, snapshot=None, console=None):
+        if console is None:
+            console = self._console
+        if snapshot is None:
+            snapshot = console.get_snapshot()
+        values = snapshot.current.values
+        ts = values.timestamp
         if ts is None:
             return None
 
         # add elements required for weewx LOOP packets
         packet = {'usUnits': weewx.METRIC, 'dateTime': ts}
 
-        # calculate dewpoints and heatindices
-        # FIXME: this belongs in StdWXCalculate
-        for y in range(0, 9):
-            if 'Temp%d' % y in data.values and 'Humidity%d' % y in data.values:
-                data.values['dewpoint%d' % y] = weewx.wxformulas.dewpointC(
-                    data.values['Temp%d' % y],
-                    data.values['Humidity%d' % y])
-                data.values['heatindex%d' % y] = weewx.wxformulas.heatindexC(
-                    data.values['Temp%d' % y],
-                    data.values['Humidity%d' % y])
-
         # extract the values from the data object
-        for k in self.sensor_map:
-            label = self.sensor_map[k]
-            if label.startswith('BatteryStatus') and 'AlarmData' in data.values:
-                if label == 'BatteryStatus0':
-                    x = 1 if data.values['AlarmData'][1] ^ 0x80 == 0 else 0
-                else:
-                    n = int(label[-1]) - 1
-                    bitmask = 1 << n
-                    x = 1 if data.values['AlarmData'][0] ^ bitmask == 0 else 0
-                packet[k] = x
-            elif label in data.values:
-                if label.startswith('Temp'):
-                    x = get_datum_diff(data.values[label],
-                                       SensorLimits.temperature_NP,
-                                       SensorLimits.temperature_OFL)
-                elif label.startswith('Humidity'):
-                    x = get_datum_diff(data.values[label],
-                                       SensorLimits.humidity_NP,
-                                       SensorLimits.humidity_OFL)
-                else:
-                    x = data.values[label]
-                packet[k] = x
-
+        extract_sensor_values(console.current_plan, values, packet,
+                              snapshot.sensors)
         return packet
 
     def get_config(self):
         logdbg('get station configuration')
-        cfg = self._service.getConfigData().as_dict()
+        cfg = self._console.get_snapshot().config
         cs = cfg.get('checksum_out')
         if cs is None or cs == 0:
             return None
         return cfg
 
     def start_caching_history(self, since_ts=0, num_rec=0):
-        self._service.startCachingHistory(since_ts, num_rec)
+        self._console.start_caching_history(since_ts, num_rec)
 
     def stop_caching_history(self):
-        self._service.stopCachingHistory()
+        self._console.stop_caching_history()
 
     def get_uncached_history_count(self):
-        return self._service.getUncachedHistoryCount()
+        return self._console.get_uncached_history_count()
+
+    def start_dumping_history(self, image):
+        self._console.start_dumping_history(image)
+
+    def is_history_dumped(self):
+        return self._console.is_history_dumped()
 
     def get_next_history_index(self):
-        return self._service.getNextHistoryIndex()
+        return self._console.get_next_history_index()
 
     def get_latest_history_index(self):
-        return self._service.getLatestHistoryIndex()
+        return self._console.get_latest_history_index()
 
     def get_cached_history_count(self):
-        return self._service.getCachedHistoryCount()
+        return self._console.get_cached_history_count()
 
     def get_history_cache_records(self):
-        return self._service.getHistoryCacheRecords()
+        return self._console.get_history_cache_records()
 
     def clear_history_cache(self):
-        self._service.clearHistoryCache()
+        self._console.clear_history_cache()
 
     def clear_wait_at_start(self):
-        self._service.clearWaitAtStart()
+        self._console.clear_wait_at_start()
+
+    def get_console(self, logger_channel=None):
+        """the console on logger_channel, the first one if None"""
+        for console in self._consoles:
+            if logger_channel in (None, console.logger_channel):
+                return console
+        return None
 
 # The following classes and methods are adapted from the implementation by
 # eddie de pieri, which is in turn based on the HeavyWeather implementation.
@@ -2237,6 +3194,58 @@ class Decode(object):
 
     CHARSTR = "!1234567890ABCDEFGHIJKLMNOPQRSTUVWXYZ-+()o*,/\ ."
 
+    # Lookup tables for the BCD values in current, history and config frames.
+    # The index is the raw nibbles of the value, most significant nibble
+    # first; the entry is the decoded value, or the NP/OFL sentinel when any
+    # nibble is an error nibble (a-e) or an overflow nibble (f).  The tables
+    # are filled in by build_tables when the module is imported.
+    TEMPERATURE_3_1 = ()  # 3 nibbles, 4096 entries
+    HUMIDITY_2_0 = ()  # 2 nibbles, 256 entries
+
+    @staticmethod
+    def build_tables():
+        def status(nibbles, np, ofl):
+            # same precedence as isErr* before isOFL*
+            if [n for n in nibbles if 10 <= n < 15]:
+                return np
+            if 15 in nibbles:
+                return ofl
+            return None
+
+        temps = []
+        for key in range(0, 0x1000):
+            n0, n1, n2 = key >> 8, (key >> 4) & 0xF, key & 0xF
+            result = status((n0, n1, n2), SensorLimits.temperature_NP,
+                            SensorLimits.temperature_OFL)
+            if result is None:
+                rawtemp = n0 * 10 + n1 * 1 + n2 * 0.1
+                result = rawtemp - SensorLimits.temperature_offset
+            temps.append(result)
+        hums = []
+        for key in range(0, 0x100):
+            n0, n1 = key >> 4, key & 0xF
+            result = status((n0, n1), SensorLimits.humidity_NP,
+                            SensorLimits.humidity_OFL)
+            if result is None:
+                result = n0 * 10 + n1 * 1
+            hums.append(result)
+        Decode.TEMPERATURE_3_1 = tuple(temps)
+        Decode.HUMIDITY_2_0 = tuple(hums)
+
+    @staticmethod
+    def key3(buf, start, startOnHiNibble):
+        """pack 3 nibbles into an index for TEMPERATURE_3_1"""
+        if startOnHiNibble:
+            return (buf[start] << 4) | (buf[start + 1] >> 4)
+        return ((buf[start] & 0xF) << 8) | buf[start + 1]
+
+    @staticmethod
+    def key2(buf, start, startOnHiNibble):
+        """pack 2 nibbles into an index for HUMIDITY_2_0"""
+        if startOnHiNibble:
+            return buf[start]
+        return ((buf[start] & 0xF) << 4) | (buf[start + 1] >> 4)
+
     @staticmethod
     def toCharacters3_2(buf, start, startOnHiNibble):
         """read 3 (4 bits) nibbles, presentation as 2 (6 bit) characters"""
@@ -2459,33 +3468,168 @@ class Decode(object):
     @staticmethod
     def toHumidity_2_0(buf, start, startOnHiNibble):
         """read 2 nibbles, presentation with 0 decimal"""
-        if Decode.isErr2(buf, start, startOnHiNibble):
-            result = SensorLimits.humidity_NP
-        elif Decode.isOFL2(buf, start, startOnHiNibble):
-            result = SensorLimits.humidity_OFL
-        else:
-            result = Decode.toInt_2(buf, start, startOnHiNibble)
-        return result
+        return Decode.HUMIDITY_2_0[Decode.key2(buf, start, startOnHiNibble)]
 
     @staticmethod
     def toTemperature_3_1(buf, start, startOnHiNibble):
         """read 3 nibbles, presentation with 1 decimal; units of degree C"""
-        if Decode.isErr3(buf, start, startOnHiNibble):
-            result = SensorLimits.temperature_NP
-        elif Decode.isOFL3(buf, start, startOnHiNibble):
-            result = SensorLimits.temperature_OFL
+        return Decode.TEMPERATURE_3_1[Decode.key3(buf, start, startOnHiNibble)]
+
+
+Decode.build_tables()
+
+
+class Record(object):
+    """Fixed-layout record with dict-style access.
+
+    Values live in slots, or in arrays indexed by sensor number, instead of
+    a dict keyed by formatted labels.  KEYS maps each label to a (slot,
+    index) pair so that callers can still use record['Temp3']; the index is
+    None for a scalar slot."""
+
+    __slots__ = ()
+    KEYS = dict()
+
+    def __getitem__(self, key):
+        slot, idx = self.KEYS[key]
+        if idx is None:
+            return getattr(self, slot)
+        return getattr(self, slot)[idx]
+
+    def __setitem__(self, key, value):
+        slot, idx = self.KEYS[key]
+        if idx is None:
+            setattr(self, slot, value)
         else:
-            if startOnHiNibble:
-                rawtemp = (buf[start] >> 4) * 10 \
-                    + (buf[start + 0] & 0xF) * 1 \
-                    + (buf[start + 1] >> 4) * 0.1
-            else:
-                rawtemp = (buf[start] & 0xF) * 10 \
-                    + (buf[start + 1] >> 4) * 1 \
-                    + (buf[start + 1] & 0xF) * 0.1
-            result = rawtemp - SensorLimits.temperature_offset
+            getattr(self, slot)[idx] = value
+
+    def __contains__(self, key):
+        return key in self.KEYS
+
+    def __iter__(self):
+        return iter(self.KEYS)
+
+    def __len__(self):
+        return len(self.KEYS)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self.KEYS)
+
+    def items(self):
+        return [(k, self[k]) for k in self.KEYS]
+
+
+class CurrentRecord(Record):
+    """Values of a current weather frame, indexed by sensor number 0-8.
+
+    The min/max date-times are not used in LOOP packets, so they are decoded
+    from a copy of the frame only when they are looked up."""
+
+    __slots__ = ('timestamp', 'signal_quality', 'alarm_data',
+                 'temp', 'temp_max', 'temp_min',
+                 'humidity', 'humidity_max', 'humidity_min',
+                 'dewpoint', 'heatindex', 'buf', 'dt')
+
+    # index of a min/max date-time is 4 * sensor + one of these
+    DT_TEMP_MAX = 0
+    DT_TEMP_MIN = 1
+    DT_HUMIDITY_MAX = 2
+    DT_HUMIDITY_MIN = 3
+
+    # where each date-time is: (offset, startOnHiNibble, value slot, sensor,
+    # sentinels, label); filled in from CurrentData.BUFMAP at import
+    DT_MAP = ()
+
+    TEMPS = array('d', [SensorLimits.temperature_NP] * 9)
+    HUMIDITIES = array('d', [SensorLimits.humidity_NP] * 9)
+
+    def __init__(self, buf=None):
+        self.timestamp = None
+        self.signal_quality = None
+        self.alarm_data = None
+        self.temp = array('d', self.TEMPS)
+        self.temp_max = array('d', self.TEMPS)
+        self.temp_min = array('d', self.TEMPS)
+        self.humidity = array('d', self.HUMIDITIES)
+        self.humidity_max = array('d', self.HUMIDITIES)
+        self.humidity_min = array('d', self.HUMIDITIES)
+        self.dewpoint = [None] * 9
+        self.heatindex = [None] * 9
+        self.buf = buf
+        self.dt = None
+
+    def __getitem__(self, key):
+        slot, idx = self.KEYS[key]
+        if slot == 'dt':
+            return self.get_dt(idx)
+        return Record.__getitem__(self, key)
+
+    def get_dt(self, idx):
+        """decode the min/max date-time idx on first use"""
+        if self.buf is None:
+            return None
+        if self.dt is None:
+            self.dt = dict()
+        elif idx in self.dt:
+            return self.dt[idx]
+        ofs, hi, slot, x, bad, lbl = self.DT_MAP[idx]
+        if getattr(self, slot)[x] in bad:
+            result = None
+        else:
+            result = Decode.toDateTime8(self.buf, ofs, hi, lbl)
+        self.dt[idx] = result
         return result
 
+    def calc_derived(self, sensors=ALL_SENSORS):
+        """calculate the dewpoints and heat indices of the channels in the
+        bitmask sensors"""
+        # FIXME: this belongs in StdWXCalculate
+        for y in SENSOR_CHANNELS[sensors]:
+            self.dewpoint[y], self.heatindex[y] = derived_values(
+                self.temp[y], self.humidity[y])
+
+    def resolve(self):
+        """decode any date-times that have not been looked up yet"""
+        for idx in range(0, len(self.DT_MAP)):
+            self.get_dt(idx)
+
+    @staticmethod
+    def build_keys(bufmap):
+        t_bad = (SensorLimits.temperature_NP, SensorLimits.temperature_OFL)
+        h_bad = (SensorLimits.humidity_NP, SensorLimits.humidity_OFL)
+        keys = {'timestamp': ('timestamp', None),
+                'SignalQuality': ('signal_quality', None),
+                'AlarmData': ('alarm_data', None)}
+        dt_map = []
+        for x in range(0, 9):
+            keys['Temp%d' % x] = ('temp', x)
+            keys['Temp%dMax' % x] = ('temp_max', x)
+            keys['Temp%dMin' % x] = ('temp_min', x)
+            keys['Humidity%d' % x] = ('humidity', x)
+            keys['Humidity%dMax' % x] = ('humidity_max', x)
+            keys['Humidity%dMin' % x] = ('humidity_min', x)
+            keys['dewpoint%d' % x] = ('dewpoint', x)
+            keys['heatindex%d' % x] = ('heatindex', x)
+            o = bufmap[x]
+            for lbl, ofs, hi, slot, bad in (
+                    ('Temp%dMax' % x, o[3], 0, 'temp_max', t_bad),
+                    ('Temp%dMin' % x, o[4], 0, 'temp_min', t_bad),
+                    ('Humidity%dMax' % x, o[8], 1, 'humidity_max', h_bad),
+                    ('Humidity%dMin' % x, o[9], 1, 'humidity_min', h_bad)):
+                keys[lbl + 'DT'] = ('dt', len(dt_map))
+                dt_map.append((ofs, hi, slot, x, bad, lbl))
+        CurrentRecord.KEYS = keys
+        CurrentRecord.DT_MAP = tuple(dt_map)
+
 
 class CurrentData(object):
 
@@ -2499,64 +3643,134 @@ class CurrentData(object):
               7: (194,196,197,186,190,183,184,185,175,179),
               8: (218,220,221,210,214,207,208,209,199,203)}
 
+    # length of a current weather frame
+    FRAME_SIZE = 0xE5
+
+    # BUFMAP compiled into one flat entry per sensor: the sensor number then
+    # the offsets of the values.  Temperatures start on the low nibble,
+    # humidities on the high nibble, so the nibbles are packed inline.
+    PLAN = ()
+
     def __init__(self):
-        self.values = dict()
-        self.values['timestamp'] = None
-        self.values['SignalQuality'] = None
-        for i in range(0, 9):
-            self.values['Temp%d' % i] = SensorLimits.temperature_NP
-            self.values['Temp%dMax' % i] = SensorLimits.temperature_NP
-            self.values['Temp%dMaxDT'] = None
-            self.values['Temp%dMin' % i] = SensorLimits.temperature_NP
-            self.values['Temp%dMinDT'] = None
-            self.values['Humidity%d' % i] = SensorLimits.humidity_NP
-            self.values['Humidity%dMax' % i] = SensorLimits.humidity_NP
-            self.values['Humidity%dMaxDT'] = None
-            self.values['Humidity%dMin' % i] = SensorLimits.humidity_NP
-            self.values['Humidity%dMinDT'] = None
+        self.values = CurrentRecord()
 
-    def read(self, buf):
-        values = dict()
-        values['timestamp'] = int(time.time() + 0.5)
-        values['SignalQuality'] = buf[4] & 0x7F
-        for x in range(0, 9):
-            lbl = 'Temp%s' % x
-            values[lbl + 'Max'] = Decode.toTemperature_3_1(buf, self.BUFMAP[x][0], 0)
-            values[lbl + 'Min'] = Decode.toTemperature_3_1(buf, self.BUFMAP[x][1], 1)
-            values[lbl] = Decode.toTemperature_3_1(buf, self.BUFMAP[x][2], 0)
-            values[lbl + 'MaxDT'] = None if values[lbl + 'Max'] == SensorLimits.temperature_NP or values[lbl + 'Max'] == SensorLimits.temperature_OFL else Decode.toDateTime8(buf, self.BUFMAP[x][3], 0, lbl + 'Max')
-            values[lbl + 'MinDT'] = None if values[lbl + 'Min'] == SensorLimits.temperature_NP or values[lbl + 'Min'] == SensorLimits.temperature_OFL else Decode.toDateTime8(buf, self.BUFMAP[x][4], 0, lbl + 'Min')
-            lbl = 'Humidity%s' % x
-            values[lbl + 'Max'] = Decode.toHumidity_2_0(buf, self.BUFMAP[x][5], 1)
-            values[lbl + 'Min'] = Decode.toHumidity_2_0(buf, self.BUFMAP[x][6], 1)
-            values[lbl] = Decode.toHumidity_2_0(buf, self.BUFMAP[x][7], 1)
-            values[lbl + 'MaxDT'] = None if values[lbl + 'Max'] == SensorLimits.humidity_NP or values[lbl + 'Max'] == SensorLimits.humidity_OFL else Decode.toDateTime8(buf, self.BUFMAP[x][8], 1, lbl + 'Max')
-            values[lbl + 'MinDT'] = None if values[lbl + 'Min'] == SensorLimits.humidity_NP or values[lbl + 'Min'] == SensorLimits.humidity_OFL else Decode.toDateTime8(buf, self.BUFMAP[x][9], 1, lbl + 'Min')
-        values['AlarmData'] = buf[223:223 + 12]
+    @staticmethod
+    def compile_plan(bufmap):
+        plan = []
+        for x in sorted(bufmap):
+            o = bufmap[x]
+            plan.append((x, o[0], o[1], o[2], o[5], o[6], o[7]))
+        return tuple(plan)
+
+    def read(self, buf, sensors=ALL_SENSORS):
+        """decode the values of the channels in the bitmask sensors.  Of the
+        other channels only the temperature and humidity are decoded, to
+        tell when a sensor shows up; their min/max values stay NP."""
+        temp = Decode.TEMPERATURE_3_1
+        hum = Decode.HUMIDITY_2_0
+        # the min/max date-times are not decoded here; the record decodes
+        # them from a copy of the frame when they are first looked up.
+        values = CurrentRecord(buf[0:self.FRAME_SIZE])
+        values.timestamp = int(time.time() + 0.5)
+        values.signal_quality = buf[4] & 0x7F
+        t = values.temp
+        t_max = values.temp_max
+        t_min = values.temp_min
+        h = values.humidity
+        h_max = values.humidity_max
+        h_min = values.humidity_min
+        plan = self.PLAN
+        for x in SENSOR_CHANNELS[sensors]:
+            _, o_tmax, o_tmin, o_t, o_hmax, o_hmin, o_h = plan[x]
+            t_max[x] = temp[((buf[o_tmax] & 0xF) << 8) | buf[o_tmax + 1]]
+            t_min[x] = temp[(buf[o_tmin] << 4) | (buf[o_tmin + 1] >> 4)]
+            t[x] = temp[((buf[o_t] & 0xF) << 8) | buf[o_t + 1]]
+            h_max[x] = hum[buf[o_hmax]]
+            h_min[x] = hum[buf[o_hmin]]
+            h[x] = hum[buf[o_h]]
+        for x in SENSOR_CHANNELS[ALL_SENSORS & ~sensors]:
+            o_t = plan[x][3]
+            t[x] = temp[((buf[o_t] & 0xF) << 8) | buf[o_t + 1]]
+            h[x] = hum[buf[plan[x][6]]]
+        values.alarm_data = buf[223:223 + 12]
         self.values = values
 
     def to_log(self):
-        logdbg("timestamp: %s" % self.values['timestamp'])
-        logdbg("SignalQuality: %3.0f " % self.values['SignalQuality'])
+        v = self.values
+        v.resolve()
+        logdbg("timestamp: %s" % v.timestamp)
+        logdbg("SignalQuality: %3.0f " % v.signal_quality)
         for x in range(0, 9):
-            if self.values['Temp%d' % x] != SensorLimits.temperature_NP:
+            if v.temp[x] != SensorLimits.temperature_NP:
                 logdbg("Temp%d:     %5.1f   Min: %5.1f (%s)   Max: %5.1f (%s)"
-                       % (x, self.values['Temp%s' % x],
-                          self.values['Temp%sMin' % x],
-                          self.values['Temp%sMinDT' % x],
-                          self.values['Temp%sMax' % x],
-                          self.values['Temp%sMaxDT' % x]))
-            if self.values['Humidity%d' % x] != SensorLimits.humidity_NP:
+                       % (x, v.temp[x],
+                          v.temp_min[x],
+                          v.get_dt(4 * x + v.DT_TEMP_MIN),
+                          v.temp_max[x],
+                          v.get_dt(4 * x + v.DT_TEMP_MAX)))
+            if v.humidity[x] != SensorLimits.humidity_NP:
                 logdbg("Humidity%d: %5.0f   Min: %5.0f (%s)   Max: %5.0f (%s)"
-                       % (x, self.values['Humidity%s' % x],
-                          self.values['Humidity%sMin' % x],
-                          self.values['Humidity%sMinDT' % x],
-                          self.values['Humidity%sMax' % x],
-                          self.values['Humidity%sMaxDT' % x]))
-        byte_str = ' '.join(['%02x' % x for x in self.values['AlarmData']])
+                       % (x, v.humidity[x],
+                          v.humidity_min[x],
+                          v.get_dt(4 * x + v.DT_HUMIDITY_MIN),
+                          v.humidity_max[x],
+                          v.get_dt(4 * x + v.DT_HUMIDITY_MAX)))
+        byte_str = ' '.join(['%02x' % x for x in v.alarm_data])
         logdbg('AlarmData: %s' % byte_str)
 
 
+CurrentData.PLAN = CurrentData.compile_plan(CurrentData.BUFMAP)
+CurrentRecord.build_keys(CurrentData.BUFMAP)
+
+
+class ConfigRecord(Record):
+    """Values of a station configuration.  Sensor values are indexed by
+    sensor number 0-8, descriptions and sensor texts by sensor number 1-8
+    less one."""
+
+    __slots__ = ('in_cs', 'out_cs', 'settings', 'time_zone',
+                 'history_interval', 'alarm_set', 'reset_hi_lo',
+                 'temp_max', 'temp_min', 'humidity_max', 'humidity_min',
+                 'description', 'sensor_text')
+
+    def __init__(self):
+        self.in_cs = 0  # checksum of received config
+        self.out_cs = 0  # calculated checksum from outbuf config
+        self.settings = 0
+        self.time_zone = 0
+        self.history_interval = 0
+        self.alarm_set = [0] * 5
+        self.reset_hi_lo = 0
+        self.temp_max = array('d', CurrentRecord.TEMPS)
+        self.temp_min = array('d', CurrentRecord.TEMPS)
+        self.humidity_max = array('d', CurrentRecord.HUMIDITIES)
+        self.humidity_min = array('d', CurrentRecord.HUMIDITIES)
+        self.description = [[0] * 8 for _ in range(0, 8)]
+        self.sensor_text = [''] * 8
+
+    @staticmethod
+    def build_keys():
+        keys = {'InBufCS': ('in_cs', None),
+                'OutBufCS': ('out_cs', None),
+                'Settings': ('settings', None),
+                'TimeZone': ('time_zone', None),
+                'HistoryInterval': ('history_interval', None),
+                'AlarmSet': ('alarm_set', None),
+                'ResetHiLo': ('reset_hi_lo', None)}
+        for x in range(0, 9):
+            keys['Temp%dMax' % x] = ('temp_max', x)
+            keys['Temp%dMin' % x] = ('temp_min', x)
+            keys['Humidity%dMax' % x] = ('humidity_max', x)
+            keys['Humidity%dMin' % x] = ('humidity_min', x)
+        for x in range(1, 9):
+            keys['Description%d' % x] = ('description', x - 1)
+            keys['SensorText%d' % x] = ('sensor_text', x - 1)
+        ConfigRecord.KEYS = keys
+
+
+ConfigRecord.build_keys()
+
+
 class StationConfig(object):
 
     BUFMAP = {0: ( 8, 11, 14, 17, 20, 23, 26, 29, 32),
@@ -2565,47 +3779,50 @@ class StationConfig(object):
               3: (36, 38, 40, 42, 44, 46, 48, 50, 52),
               4: (58, 66, 74, 82, 90, 98,106,114)}
 
+    # sections of the out buffer that are encoded on their own, see encode
+    SECTION_ALARM_SET = 0
+    SECTION_SENSOR = 1
+    SECTION_DESCRIPTION = 2
+
     def __init__(self):
-        self.values = dict()
+        self.values = ConfigRecord()
         self.set_values = dict()
         self.read_config_sensor_texts = True
-        self.values['InBufCS'] = 0  # checksum of received config
-        self.values['OutBufCS'] = 0  # calculated checksum from outbuf config
-        self.values['Settings'] = 0
-        self.values['TimeZone'] = 0
-        self.values['HistoryInterval'] = 0
-        self.values['AlarmSet'] = [0] * 5
-        self.values['ResetHiLo'] = 0
-        for i in range(0, 9):
-            self.values['Temp%dMax' % i] = SensorLimits.temperature_NP
-            self.values['Temp%dMin' % i] = SensorLimits.temperature_NP
-            self.values['Humidity%dMax' % i] = SensorLimits.humidity_NP
-            self.values['Humidity%dMin' % i] = SensorLimits.humidity_NP
         for i in range(1, 9):
-            self.values['Description%d' % i] = [0] * 8
-            self.values['SensorText%d' % i] = ''
             self.set_values['Description%d' % i] = [0] * 8
             self.set_values['SensorText%d' % i] = ''
+        # the encoded out buffer, None until it has been built from values
+        self.out_buf = None
+        # the config frame as received, None until one has been read
+        self.in_buf = None
+        # sections of the out buffer that no longer match values
+        self.dirty = set()
     
     def getOutBufCS(self):
-        return self.values['OutBufCS']
+        return self.values.out_cs
              
     def getInBufCS(self):
-        return self.values['InBufCS']
+        return self.values.in_cs
 
     def setAlarmClockOffset(self):
         # set Humidity Lo alarm when stations clock is too way off
-        self.values['Humidity0Min'] = 99
-        self.values['AlarmSet'][4] = (self.values['AlarmSet'][4] & 0xfd) + 0x2
+        self.setHumidity0Alarm(99, (self.values.alarm_set[4] & 0xfd) + 0x2)
 
     def resetAlarmClockOffset(self):
         # reset Humidity Lo alarm when stations clock is within margins
-        self.values['Humidity0Min'] = 20
-        self.values['AlarmSet'][4] = (self.values['AlarmSet'][4] & 0xfd)
+        self.setHumidity0Alarm(20, (self.values.alarm_set[4] & 0xfd))
+
+    def setHumidity0Alarm(self, humidity_min, alarm_set):
+        if self.values.humidity_min[0] != humidity_min:
+            self.values.humidity_min[0] = humidity_min
+            self.dirty.add((self.SECTION_SENSOR, 0))
+        if self.values.alarm_set[4] != alarm_set:
+            self.values.alarm_set[4] = alarm_set
+            self.dirty.add((self.SECTION_ALARM_SET, 0))
 
     def setSensorText(self, values):
         # test if config is read and sensor texts are not set before
-        if self.values['InBufCS'] != 0 and self.read_config_sensor_texts:
+        if self.values.in_cs != 0 and self.read_config_sensor_texts:
             self.read_config_sensor_texts = False
             # Use the sensor labels from the configuration
             for x in range(1, 9):
@@ -2627,7 +3844,7 @@ class StationConfig(object):
                     if not text_ok:
                         sensor_text = None
                 if sensor_text is not None:
-                    if self.values['SensorText%s' % x] == '(No sensor)':
+                    if self.values.sensor_text[x - 1] == '(No sensor)':
                         logerr('sensor_text%d: "%s" ignored: no sensor present'
                                % (x, sensor_text))
                     else:
@@ -2655,8 +3872,10 @@ class StationConfig(object):
                         txt[1] = ((char_id9 << 6) & 0xC0) + (char_id10 & 0x30) + ((char_id9 >> 2) & 0x0F)
                         txt[0] = (char_id10 & 0x0F)
                         # copy the results to the outputbuffer data
-                        self.values['Description%d' % x] = txt
-                        self.values['SensorText%d' % x] = sensor_text.ljust(10)
+                        if list(self.values.description[x - 1]) != txt:
+                            self.values.description[x - 1] = txt
+                            self.dirty.add((self.SECTION_DESCRIPTION, x - 1))
+                        self.values.sensor_text[x - 1] = sensor_text.ljust(10)
 
     @staticmethod
     def reverseByteOrder(buf, start, count):
@@ -2689,123 +3908,253 @@ class StationConfig(object):
         StationConfig.parse_0(number * 10.0, buf, start, startOnHiNibble, numbytes)
 
     def read(self, buf):
-        values = dict()
-        values['Settings'] = buf[5]
-        values['TimeZone'] = buf[6]
-        values['HistoryInterval'] = buf[7] & 0xF
+        values = ConfigRecord()
+        values.settings = buf[5]
+        values.time_zone = buf[6]
+        values.history_interval = buf[7] & 0xF
         for x in range(0, 9):
-            lbl = 'Temp%s' % x
-            values[lbl + 'Max'] = Decode.toTemperature_3_1(buf, self.BUFMAP[0][x], 1)
-            values[lbl + 'Min'] = Decode.toTemperature_3_1(buf, self.BUFMAP[1][x], 0)
-            lbl = 'Humidity%s' % x
-            values[lbl + 'Max'] = Decode.toHumidity_2_0(buf, self.BUFMAP[2][x], 1)
-            values[lbl + 'Min'] = Decode.toHumidity_2_0(buf, self.BUFMAP[3][x], 1)
-        values['AlarmSet'] = buf[53:53 + 5]
-        for x in range(1, 9):
-            values['Description%s' % x] = buf[self.BUFMAP[4][x - 1]:self.BUFMAP[4][x - 1] + 8]
-            txt1 = Decode.toCharacters3_2(buf, self.BUFMAP[4][x - 1] + 6, 0)
-            txt2 = Decode.toCharacters3_2(buf, self.BUFMAP[4][x - 1] + 5, 1)
-            txt3 = Decode.toCharacters3_2(buf, self.BUFMAP[4][x - 1] + 3, 0)
-            txt4 = Decode.toCharacters3_2(buf, self.BUFMAP[4][x - 1] + 2, 1)
-            txt5 = Decode.toCharacters3_2(buf, self.BUFMAP[4][x - 1], 0)
+            values.temp_max[x] = Decode.toTemperature_3_1(buf, self.BUFMAP[0][x], 1)
+            values.temp_min[x] = Decode.toTemperature_3_1(buf, self.BUFMAP[1][x], 0)
+            values.humidity_max[x] = Decode.toHumidity_2_0(buf, self.BUFMAP[2][x], 1)
+            values.humidity_min[x] = Decode.toHumidity_2_0(buf, self.BUFMAP[3][x], 1)
+        values.alarm_set = buf[53:53 + 5]
+        for x in range(0, 8):
+            start = self.BUFMAP[4][x]
+            values.description[x] = buf[start:start + 8]
+            txt1 = Decode.toCharacters3_2(buf, start + 6, 0)
+            txt2 = Decode.toCharacters3_2(buf, start + 5, 1)
+            txt3 = Decode.toCharacters3_2(buf, start + 3, 0)
+            txt4 = Decode.toCharacters3_2(buf, start + 2, 1)
+            txt5 = Decode.toCharacters3_2(buf, start, 0)
             sensor_txt = txt1 + txt2 + txt3 + txt4 + txt5
             if sensor_txt == ' E@@      ':
-                values['SensorText%s' % x] = '(No sensor)'
+                values.sensor_text[x] = '(No sensor)'
             else:
-                values['SensorText%s' % x] = sensor_txt
-        values['ResetHiLo'] = buf[122]
-        values['InBufCS'] = (buf[123] << 8) | buf[124]
+                values.sensor_text[x] = sensor_txt
+        values.reset_hi_lo = buf[122]
+        values.in_cs = (buf[123] << 8) | buf[124]
         # checksum is not calculated for ResetHiLo (Output only)
-        values['OutBufCS'] = calc_checksum(buf, 5, end=122) + 7
+        values.out_cs = calc_checksum(buf, 5, end=122) + 7
         self.values = values
-
-    # FIXME: this has side effects that should be removed
-    # FIXME: self.values['HistoryInterval']
-    # FIXME: self.values['OutBufCS']
-    def testConfigChanged(self):
-        """see if configuration has changed"""
-        newbuf = [0] * 125
-        # Set historyInterval to 5 minutes if > 5 minutes (default: 15 minutes)
-        if self.values['HistoryInterval'] > HI_05MIN:
-            logdbg('change HistoryInterval to 5 minutes')
-            self.values['HistoryInterval'] = HI_05MIN
-        newbuf[5] = self.values['Settings']
-        newbuf[6] = self.values['TimeZone']
-        newbuf[7] = self.values['HistoryInterval']
-        for x in range(0, 9):
-            lbl = 'Temp%s' % x
-            self.parse_1(self.values[lbl + 'Max'] + SensorLimits.temperature_offset, newbuf, self.BUFMAP[0][x], 1, 3)
-            self.parse_1(self.values[lbl + 'Min'] + SensorLimits.temperature_offset, newbuf, self.BUFMAP[1][x], 0, 3)
-            self.reverseByteOrder(newbuf, self.BUFMAP[0][x], 3)  # Temp
-            lbl = 'Humidity%s' % x
-            self.parse_0(self.values[lbl + 'Max'], newbuf, self.BUFMAP[2][x], 1, 2)
-            self.parse_0(self.values[lbl + 'Min'], newbuf, self.BUFMAP[3][x], 1, 2)
-            self.reverseByteOrder(newbuf, self.BUFMAP[2][x], 2)  # Humidity
-        # insert reverse self.values['AlarmSet'] into newbuf
-        rev = self.values['AlarmSet'][::-1]
-        for y in range(0, 5):
-            newbuf[53 + y] = rev[y]
-        # insert reverse self.values['Description%d'] into newbuf
-        for x in range(1, 9):
-            rev = self.values['Description%d' % x][::-1]
+        self.in_buf = bytes(bytearray(buf[0:0x7D]))
+        self.out_buf = None
+        self.dirty.clear()
+
+    def sectionSpans(self, section):
+        """ranges of the out buffer bytes that hold a section"""
+        kind, x = section
+        if kind == self.SECTION_ALARM_SET:
+            return ((53, 58),)
+        if kind == self.SECTION_SENSOR:
+            return ((self.BUFMAP[0][x], self.BUFMAP[0][x] + 3),
+                    (self.BUFMAP[2][x], self.BUFMAP[2][x] + 2))
+        return ((self.BUFMAP[4][x], self.BUFMAP[4][x] + 8),)
+
+    def encodeSection(self, buf, section):
+        """encode one section of values into buf"""
+        v = self.values
+        kind, x = section
+        if kind == self.SECTION_ALARM_SET:
+            # insert reverse self.values.alarm_set into buf
+            rev = v.alarm_set[::-1]
+            for y in range(0, 5):
+                buf[53 + y] = rev[y]
+        elif kind == self.SECTION_SENSOR:
+            for a, b in self.sectionSpans(section):
+                buf[a:b] = [0] * (b - a)
+            self.parse_1(v.temp_max[x] + SensorLimits.temperature_offset, buf, self.BUFMAP[0][x], 1, 3)
+            self.parse_1(v.temp_min[x] + SensorLimits.temperature_offset, buf, self.BUFMAP[1][x], 0, 3)
+            self.reverseByteOrder(buf, self.BUFMAP[0][x], 3)  # Temp
+            self.parse_0(v.humidity_max[x], buf, self.BUFMAP[2][x], 1, 2)
+            self.parse_0(v.humidity_min[x], buf, self.BUFMAP[3][x], 1, 2)
+            self.reverseByteOrder(buf, self.BUFMAP[2][x], 2)  # Humidity
+        else:
+            # insert reverse self.values.description into buf
+            rev = v.description[x][::-1]
             for y in range(0, 8):
-                newbuf[self.BUFMAP[4][x - 1] + y] = rev[y]
-        newbuf[122] = self.values['ResetHiLo']
-        # checksum is not calculated for ResetHiLo (Output only)
-        self.values['OutBufCS'] = calc_checksum(newbuf, 5, end=122) + 7
-        newbuf[123] = (self.values['OutBufCS'] >> 8) & 0xFF
-        newbuf[124] = (self.values['OutBufCS'] >> 0) & 0xFF
-        if self.values['OutBufCS'] == self.values['InBufCS']:
+                buf[self.BUFMAP[4][x] + y] = rev[y]
+
+    def encode(self):
+        """bring the out buffer and its checksum up to date with values.
+        Only the sections that changed since the last call are encoded
+        again, and the checksum is adjusted by the difference in their
+        bytes."""
+        v = self.values
+        if self.out_buf is None:
+            # FIXME: this has side effects that should be removed
+            # FIXME: self.values.history_interval
+            buf = [0] * 125
+            # Set historyInterval to 5 minutes if > 5 minutes (default: 15 minutes)
+            if v.history_interval > HI_05MIN:
+                logdbg('change HistoryInterval to 5 minutes')
+                v.history_interval = HI_05MIN
+            buf[5] = v.settings
+            buf[6] = v.time_zone
+            buf[7] = v.history_interval
+            for x in range(0, 9):
+                self.encodeSection(buf, (self.SECTION_SENSOR, x))
+            self.encodeSection(buf, (self.SECTION_ALARM_SET, 0))
+            for x in range(0, 8):
+                self.encodeSection(buf, (self.SECTION_DESCRIPTION, x))
+            buf[122] = v.reset_hi_lo
+            # checksum is not calculated for ResetHiLo (Output only)
+            v.out_cs = calc_checksum(buf, 5, end=122) + 7
+            self.out_buf = buf
+        elif self.dirty:
+            buf = self.out_buf
+            for section in self.dirty:
+                spans = self.sectionSpans(section)
+                for a, b in spans:
+                    v.out_cs -= calc_checksum(buf, a, end=b)
+                self.encodeSection(buf, section)
+                for a, b in spans:
+                    v.out_cs += calc_checksum(buf, a, end=b)
+        else:
+            return
+        self.dirty.clear()
+        self.out_buf[123] = (v.out_cs >> 8) & 0xFF
+        self.out_buf[124] = (v.out_cs >> 0) & 0xFF
+
+    def is_dirty(self):
+        """True if the configuration in the station differs from ours, i.e.
+        a SetConfig is needed"""
+        v = self.values
+        self.encode()
+        if v.out_cs == v.in_cs:
             if DEBUG_CONFIG_DATA > 2:
-                logdbg('checksum not changed: OutBufCS=%04x' %
-                       self.values['OutBufCS'])
+                logdbg('checksum not changed: OutBufCS=%04x' % v.out_cs)
             changed = 0
         else:
             if DEBUG_CONFIG_DATA > 0:
                 logdbg('checksum changed: OutBufCS=%04x InBufCS=%04x ' % 
-                       (self.values['OutBufCS'], self.values['InBufCS']))
-            if self.values['InBufCS'] != 0 and DEBUG_CONFIG_DATA > 1:
+                       (v.out_cs, v.in_cs))
+            if v.in_cs != 0 and DEBUG_CONFIG_DATA > 1:
                 self.to_log()
             changed = 1
-        return changed, newbuf
+        return changed
+
+    def testConfigChanged(self):
+        """see if configuration has changed, return the flag and the out
+        buffer"""
+        return self.is_dirty(), self.out_buf
 
     def to_log(self):
-        contrast = (int(self.values['Settings']) >> 4) & 0x0F
-        alert = 'ON' if int(self.values['Settings']) & 0x8 == 0 else 'OFF'
-        dcf_recep = 'OFF' if int(self.values['Settings']) & 0x4 == 0 else 'ON'
-        time_form = '24h' if int(self.values['Settings']) & 0x2 == 0 else '12h'
-        temp_form = 'C' if int(self.values['Settings']) & 0x1 == 0 else 'F'
-        time_zone = self.values['TimeZone'] if int(self.values['TimeZone']) <= 12 else int(self.values['TimeZone']) - 256
-        history_interval = history_intervals.get(self.values['HistoryInterval'])
-        logdbg('OutBufCS: %04x' % self.values['OutBufCS'])
-        logdbg('InBufCS:  %04x' % self.values['InBufCS'])
+        v = self.values
+        contrast = (int(v.settings) >> 4) & 0x0F
+        alert = 'ON' if int(v.settings) & 0x8 == 0 else 'OFF'
+        dcf_recep = 'OFF' if int(v.settings) & 0x4 == 0 else 'ON'
+        time_form = '24h' if int(v.settings) & 0x2 == 0 else '12h'
+        temp_form = 'C' if int(v.settings) & 0x1 == 0 else 'F'
+        time_zone = v.time_zone if int(v.time_zone) <= 12 else int(v.time_zone) - 256
+        history_interval = history_intervals.get(v.history_interval)
+        logdbg('OutBufCS: %04x' % v.out_cs)
+        logdbg('InBufCS:  %04x' % v.in_cs)
         logdbg('Settings: %02x: contrast: %s, alert: %s, DCF reception: %s, time format: %s, temp format: %s' %
-               (self.values['Settings'], contrast, alert, dcf_recep, time_form, temp_form))
-        logdbg('TimeZone difference with Frankfurt (CET): %02x (tz: %s hour)' % (self.values['TimeZone'], time_zone))
-        logdbg('HistoryInterval: %02x, period: %s minute(s)' % (self.values['HistoryInterval'], history_interval))
-        byte_str = ' '.join(['%02x' % x for x in self.values['AlarmSet']])
+               (v.settings, contrast, alert, dcf_recep, time_form, temp_form))
+        logdbg('TimeZone difference with Frankfurt (CET): %02x (tz: %s hour)' % (v.time_zone, time_zone))
+        logdbg('HistoryInterval: %02x, period: %s minute(s)' % (v.history_interval, history_interval))
+        byte_str = ' '.join(['%02x' % x for x in v.alarm_set])
         logdbg('AlarmSet:     %s' % byte_str)
-        logdbg('ResetHiLo:    %02x' % self.values['ResetHiLo'])
+        logdbg('ResetHiLo:    %02x' % v.reset_hi_lo)
         for x in range(0, 9):
             logdbg('Sensor%d:      %3.1f - %3.1f, %3.0f - %3.0f' %
-                   (x,
-                    self.values['Temp%dMin' % x], 
-                    self.values['Temp%dMax' % x],
-                    self.values['Humidity%dMin' % x],
-                    self.values['Humidity%dMax' % x]))
-        for x in range(1, 9):
-            byte_str = ' '.join(['%02x' % y for y in self.values['Description%d' % x]])
-            logdbg('Description%d: %s; SensorText%d: %s' % (x, byte_str, x, self.values['SensorText%s' % x]))
+                   (x, v.temp_min[x], v.temp_max[x],
+                    v.humidity_min[x], v.humidity_max[x]))
+        for x in range(0, 8):
+            byte_str = ' '.join(['%02x' % y for y in v.description[x]])
+            logdbg('Description%d: %s; SensorText%d: %s' % (x + 1, byte_str, x + 1, v.sensor_text[x]))
 
     def as_dict(self):
-        return {'checksum_in': self.values['InBufCS'],
-                'checksum_out': self.values['OutBufCS'],
-                'settings': self.values['Settings'],
-                'history_interval': self.values['HistoryInterval']}
+        return {'checksum_in': self.values.in_cs,
+                'checksum_out': self.values.out_cs,
+                'settings': self.values.settings,
+                'history_interval': self.values.history_interval}
+
+
+class HistoryValues(Record):
+    """Values of the six positions of a history frame.  Positions 1-6 are
+    indexed 0-5; the sensor values of a history record are at index
+    9 * (position - 1) + sensor."""
+
+    __slots__ = ('alarm', 'dt', 'temp', 'humidity',
+                 'alarm_temp', 'alarm_temp_hi', 'alarm_temp_lo',
+                 'alarm_humidity', 'alarm_humidity_hi', 'alarm_humidity_lo',
+                 'alarm_data', 'sensor')
+
+    TEMPS = array('d', [SensorLimits.temperature_NP] * 54)
+    HUMIDITIES = array('d', [SensorLimits.humidity_NP] * 54)
+
+    def __init__(self):
+        self.alarm = [0] * 6
+        self.dt = [datetime(1900, 1, 1, 0, 0)] * 6
+        self.temp = array('d', self.TEMPS)
+        self.humidity = array('d', self.HUMIDITIES)
+        self.alarm_temp = array('d', self.TEMPS[0:6])
+        self.alarm_temp_hi = array('d', self.TEMPS[0:6])
+        self.alarm_temp_lo = array('d', self.TEMPS[0:6])
+        self.alarm_humidity = array('d', self.HUMIDITIES[0:6])
+        self.alarm_humidity_hi = array('d', self.HUMIDITIES[0:6])
+        self.alarm_humidity_lo = array('d', self.HUMIDITIES[0:6])
+        self.alarm_data = [0] * 6
+        self.sensor = [0] * 6
+
+    @staticmethod
+    def build_keys():
+        keys = dict()
+        for i in range(1, 7):
+            p = i - 1
+            keys['Pos%dAlarm' % i] = ('alarm', p)
+            keys['Pos%dDT' % i] = ('dt', p)
+            keys['Pos%dHumidityHi' % i] = ('alarm_humidity_hi', p)
+            keys['Pos%dHumidityLo' % i] = ('alarm_humidity_lo', p)
+            keys['Pos%dHumidity' % i] = ('alarm_humidity', p)
+            keys['Pos%dTempHi' % i] = ('alarm_temp_hi', p)
+            keys['Pos%dTempLo' % i] = ('alarm_temp_lo', p)
+            keys['Pos%dTemp' % i] = ('alarm_temp', p)
+            keys['Pos%dAlarmdata' % i] = ('alarm_data', p)
+            keys['Pos%dSensor' % i] = ('sensor', p)
+            for j in range(0, 9):
+                keys['Pos%dTemp%d' % (i, j)] = ('temp', 9 * p + j)
+                keys['Pos%dHumidity%d' % (i, j)] = ('humidity', 9 * p + j)
+        HistoryValues.KEYS = keys
+
+
+HistoryValues.build_keys()
+
+
+class HistoryRecord(Record):
+    """One history record with weewx conventions, indexed by sensor number"""
+
+    __slots__ = ('date_time', 'temp', 'humidity', 'dewpoint', 'heatindex',
+                 'index', 'sensors')
+
+    def __init__(self, date_time, temp, humidity):
+        self.date_time = date_time
+        self.temp = temp
+        self.humidity = humidity
+        self.dewpoint = [None] * 9
+        self.heatindex = [None] * 9
+        self.index = None  # position in the ring of the logger
+        self.sensors = ALL_SENSORS  # the channels that have been decoded
+
+    @staticmethod
+    def build_keys():
+        keys = {'dateTime': ('date_time', None)}
+        for x in range(0, 9):
+            keys['Temp%d' % x] = ('temp', x)
+            keys['Humidity%d' % x] = ('humidity', x)
+            keys['dewpoint%d' % x] = ('dewpoint', x)
+            keys['heatindex%d' % x] = ('heatindex', x)
+        HistoryRecord.KEYS = keys
+
+
+HistoryRecord.build_keys()
 
 
 class HistoryData(object):
 
+    FRAME_SIZE = 0xB5
+
     BUFMAPHIS = {1: (176,
                      (174,173,171,170,168,167,165,164,162),
                      (161,160,159,158,157,156,155,154,153)),
@@ -2832,128 +4181,399 @@ class HistoryData(object):
                  5: ( 68, 63, 62, 60, 58, 57, 56, 55, 54),
                  6: ( 40, 35, 34, 32, 30, 29, 28, 27, 26)}
 
-    def __init__(self):
-        self.values = {}
-        for i in range(1, 7):
-            self.values['Pos%dAlarm' % i] = 0
-            self.values['Pos%dDT' % i] = datetime(1900, 1, 1, 0, 0)
-            self.values['Pos%dHumidityHi' % i] = SensorLimits.humidity_NP
-            self.values['Pos%dHumidityLo' % i] = SensorLimits.humidity_NP
-            self.values['Pos%dHumidity' % i] = SensorLimits.humidity_NP
-            self.values['Pos%dTempHi' % i] = SensorLimits.temperature_NP
-            self.values['Pos%dTempLo' % i] = SensorLimits.temperature_NP
-            self.values['Pos%dTemp' % i] = SensorLimits.temperature_NP
-            self.values['Pos%dAlarmdata' % i] = 0
-            self.values['Pos%dSensor' % i] = 0
-            for j in range(0, 9):
-                self.values['Pos%dTemp%d' % (i, j)] = SensorLimits.temperature_NP
-                self.values['Pos%dHumidity%d' % (i, j)] = SensorLimits.humidity_NP
+    def __init__(self, values=None):
+        self.values = HistoryValues() if values is None else values
 
-    def read(self, buf):
-        values = {}
+    def read(self, buf, sensors=ALL_SENSORS):
+        """decode the 6 records of a frame, with the values of the channels
+        in the bitmask sensors; the others stay NP"""
+        channels = SENSOR_CHANNELS[sensors]
+        values = HistoryValues()
         for i in range(1, 7):
-            values['Pos%dAlarm' % i] = 1 if buf[self.BUFMAPALA[i][0]] == 0xee else 0
-            if values['Pos%dAlarm' % i] == 0:
+            p = i - 1
+            ala = self.BUFMAPALA[i]
+            values.alarm[p] = 1 if buf[ala[0]] == 0xee else 0
+            if values.alarm[p] == 0:
                 # History record
-                values['Pos%dDT' % i] = Decode.toDateTime10(
-                    buf, self.BUFMAPHIS[i][0], 1, 'HistoryData%d' % i)
-                for j in range(0, 9):
-                    values['Pos%dTemp%d' % (i, j)] = Decode.toTemperature_3_1(
-                        buf, self.BUFMAPHIS[i][1][j], j % 2)
-                    values['Pos%dHumidity%d' % (i, j)] = Decode.toHumidity_2_0(
-                        buf, self.BUFMAPHIS[i][2][j], 1)
+                his = self.BUFMAPHIS[i]
+                values.dt[p] = Decode.toDateTime10(
+                    buf, his[0], 1, 'HistoryData%d' % i)
+                for j in channels:
+                    values.temp[9 * p + j] = Decode.toTemperature_3_1(
+                        buf, his[1][j], j % 2)
+                    values.humidity[9 * p + j] = Decode.toHumidity_2_0(
+                        buf, his[2][j], 1)
             else:
                 # Alarm record
-                values['Pos%dDT' % i] = Decode.toDateTime10(
-                    buf, self.BUFMAPALA[i][1], 1, 'HistoryData%d' % i)
-                values['Pos%dHumidityHi' % i] = Decode.toHumidity_2_0(
-                    buf, self.BUFMAPALA[i][8], 1)
-                values['Pos%dHumidityLo' % i] = Decode.toHumidity_2_0(
-                    buf, self.BUFMAPALA[i][7], 1)
-                values['Pos%dHumidity' % i] = Decode.toHumidity_2_0(
-                    buf, self.BUFMAPALA[i][6], 1)
-                values['Pos%dTempHi' % i] = Decode.toTemperature_3_1(
-                    buf, self.BUFMAPALA[i][5], 1)
-                values['Pos%dTempLo' % i] = Decode.toTemperature_3_1(
-                    buf, self.BUFMAPALA[i][4], 0)
-                values['Pos%dTemp' % i] = Decode.toTemperature_3_1(
-                    buf, self.BUFMAPALA[i][3], 0)
-                values['Pos%dAlarmdata' % i] = (buf[self.BUFMAPALA[i][2]] >> 4) & 0xf
-                values['Pos%dSensor' % i] = buf[self.BUFMAPALA[i][2]] & 0xf
+                values.dt[p] = Decode.toDateTime10(
+                    buf, ala[1], 1, 'HistoryData%d' % i)
+                values.alarm_humidity_hi[p] = Decode.toHumidity_2_0(
+                    buf, ala[8], 1)
+                values.alarm_humidity_lo[p] = Decode.toHumidity_2_0(
+                    buf, ala[7], 1)
+                values.alarm_humidity[p] = Decode.toHumidity_2_0(
+                    buf, ala[6], 1)
+                values.alarm_temp_hi[p] = Decode.toTemperature_3_1(
+                    buf, ala[5], 1)
+                values.alarm_temp_lo[p] = Decode.toTemperature_3_1(
+                    buf, ala[4], 0)
+                values.alarm_temp[p] = Decode.toTemperature_3_1(
+                    buf, ala[3], 0)
+                values.alarm_data[p] = (buf[ala[2]] >> 4) & 0xf
+                values.sensor[p] = buf[ala[2]] & 0xf
         self.values = values
 
     def to_log(self):
+        v = self.values
         last_ts = None
         for i in range(1, 7):
-            if self.values['Pos%dAlarm' % i] == 0:
+            p = i - 1
+            if v.alarm[p] == 0:
                 # History record
-                if self.values['Pos%dDT' % i] != last_ts:
+                if v.dt[p] != last_ts:
+                    t = v.temp[9 * p:9 * p + 9]
+                    h = v.humidity[9 * p:9 * p + 9]
                     logdbg("Pos%dDT %s, Pos%dTemp0: %3.1f, Pos%sHumidity0: %3.1f" %
-                           (i, self.values['Pos%dDT' % i],
-                            i, self.values['Pos%dTemp0' % i],
-                            i, self.values['Pos%dHumidity0' % i]))
+                           (i, v.dt[p], i, t[0], i, h[0]))
                     logdbg("Pos%dTemp 1-8:      %3.1f, %3.1f, %3.1f, %3.1f, %3.1f, %3.1f, %3.1f, %3.1f" %
-                           (i,
-                            self.values['Pos%dTemp1' % i],
-                            self.values['Pos%dTemp2' % i],
-                            self.values['Pos%dTemp3' % i],
-                            self.values['Pos%dTemp4' % i],
-                            self.values['Pos%dTemp5' % i],
-                            self.values['Pos%dTemp6' % i],
-                            self.values['Pos%dTemp7' % i],
-                            self.values['Pos%dTemp8' % i]))
+                           ((i,) + tuple(t[1:9])))
                     logdbg("Pos%dHumidity 1-8: %3.0f, %3.0f, %3.0f, %3.0f, %3.0f, %3.0f, %3.0f, %3.0f" %
-                           (i,
-                            self.values['Pos%dHumidity1' % i],
-                            self.values['Pos%dHumidity2' % i],
-                            self.values['Pos%dHumidity3' % i],
-                            self.values['Pos%dHumidity4' % i],
-                            self.values['Pos%dHumidity5' % i],
-                            self.values['Pos%dHumidity6' % i],
-                            self.values['Pos%dHumidity7' % i],
-                            self.values['Pos%dHumidity8' % i]))
-                last_ts = self.values['Pos%dDT' % i]
+                           ((i,) + tuple(h[1:9])))
+                last_ts = v.dt[p]
             else:
                 # Alarm record
-                if self.values['Pos%dAlarmdata' % i] & 0x1:
+                if v.alarm_data[p] & 0x1:
                     logdbg('Alarm=%01x: Humidity%d: %3.0f above/reached Hi-limit (%3.0f) on %s' %
-                           (self.values['Pos%dAlarmdata' % i],
-                            self.values['Pos%dSensor' % i],
-                            self.values['Pos%dHumidity' % i],
-                            self.values['Pos%dHumidityHi' % i],
-                            self.values['Pos%dDT' % i]))
-                if self.values['Pos%dAlarmdata' % i] & 0x2:
+                           (v.alarm_data[p], v.sensor[p], v.alarm_humidity[p],
+                            v.alarm_humidity_hi[p], v.dt[p]))
+                if v.alarm_data[p] & 0x2:
                     logdbg('Alarm=%01x: Humidity%d: %3.0f below/reached Lo-limit (%3.0f) on %s' %
-                           (self.values['Pos%dAlarmdata' % i],
-                            self.values['Pos%dSensor' % i],
-                            self.values['Pos%dHumidity' % i],
-                            self.values['Pos%dHumidityLo' % i],
-                            self.values['Pos%dDT' % i]))
-                if self.values['Pos%dAlarmdata' % i] & 0x4:
+                           (v.alarm_data[p], v.sensor[p], v.alarm_humidity[p],
+                            v.alarm_humidity_lo[p], v.dt[p]))
+                if v.alarm_data[p] & 0x4:
                     logdbg('Alarm=%01x: Temp%d: %3.1f above/reached Hi-limit (%3.1f) on %s' %
-                           (self.values['Pos%dAlarmdata' % i],
-                            self.values['Pos%dSensor' % i],
-                            self.values['Pos%dTemp' % i],
-                            self.values['Pos%dTempHi' % i],
-                            self.values['Pos%dDT' % i]))
-                if self.values['Pos%dAlarmdata' % i] & 0x8:
+                           (v.alarm_data[p], v.sensor[p], v.alarm_temp[p],
+                            v.alarm_temp_hi[p], v.dt[p]))
+                if v.alarm_data[p] & 0x8:
                     logdbg('Alarm=%01x: Temp%d: %3.1f below/reached Lo-limit(%3.1f) on %s' %
-                           (self.values['Pos%dAlarmdata' % i],
-                            self.values['Pos%dSensor' % i],
-                            self.values['Pos%dTemp' % i],
-                            self.values['Pos%dTempLo' % i],
-                            self.values['Pos%dDT' % i]))
+                           (v.alarm_data[p], v.sensor[p], v.alarm_temp[p],
+                            v.alarm_temp_lo[p], v.dt[p]))
 
     def as_dict(self, x=1):
-        """emit historical data as a dict with weewx conventions"""
-        data = {'dateTime': tstr_to_ts(str(self.values['Pos%dDT' % x]))}
-        for y in range(0, 9):
-            data['Temp%d' % y] = self.values['Pos%dTemp%d' % (x, y)]
-            data['Humidity%d' % y] = self.values['Pos%dHumidity%d' % (x, y)]
-        return data
+        """emit historical data as a record with weewx conventions"""
+        p = x - 1
+        return HistoryRecord(dt_to_ts(self.values.dt[p]),
+                             self.values.temp[9 * p:9 * p + 9],
+                             self.values.humidity[9 * p:9 * p + 9])
 
+    @staticmethod
+    def read_batch(frames, sensors=ALL_SENSORS):
+        """decode a batch of history frames, return a HistoryData for each.
+
+        frames is either a 2-D uint8 numpy array with one frame per row, as
+        read from a saved logger image, or a sequence of frame buffers, such
+        as frames queued during a catch-up.  The frames are decoded in one
+        pass with numpy when it is available, one by one otherwise.  Either
+        way the values of the channels that are not in the bitmask sensors
+        stay NP."""
+        if numpy is None:
+            result = []
+            for buf in frames:
+                data = HistoryData()
+                data.read(buf, sensors)
+                result.append(data)
+            return result
+        return HistoryData.read_batch_numpy(frames, sensors)
+
+    # index arrays for read_batch_numpy, built on first use
+    NP_PLAN = None
 
-class HistoryCache:
+    @staticmethod
+    def compile_np_plan():
+        his = HistoryData.BUFMAPHIS
+        ala = HistoryData.BUFMAPALA
+        pos = range(1, 7)
+        ofs = numpy.arange(5)
+        plan = {
+            'flag': numpy.array([ala[i][0] for i in pos]),
+            'his_dt': numpy.array([his[i][0] for i in pos])[:, None] + ofs,
+            'his_temp': numpy.array([his[i][1] for i in pos]),
+            'his_temp_hi': numpy.arange(9) % 2 == 1,
+            'his_humidity': numpy.array([his[i][2] for i in pos]),
+            'ala_dt': numpy.array([ala[i][1] for i in pos])[:, None] + ofs,
+            'temperature': numpy.array(Decode.TEMPERATURE_3_1),
+            'humidity': numpy.array(Decode.HUMIDITY_2_0)}
+        for j in range(2, 9):
+            plan['ala%d' % j] = numpy.array([ala[i][j] for i in pos])
+        HistoryData.NP_PLAN = plan
+
+    @staticmethod
+    def read_batch_numpy(frames, sensors=ALL_SENSORS):
+        if HistoryData.NP_PLAN is None:
+            HistoryData.compile_np_plan()
+        plan = HistoryData.NP_PLAN
+        size = HistoryData.FRAME_SIZE
+        if not isinstance(frames, numpy.ndarray):
+            raw = b''.join([bytes(bytearray(f[0:size])) for f in frames])
+            frames = numpy.frombuffer(raw, dtype=numpy.uint8).reshape(-1, size)
+        buf = frames[:, 0:size].astype(numpy.int32)
+        n = len(buf)
+        tlut = plan['temperature']
+        hlut = plan['humidity']
+
+        def temperature(ofs, hi):
+            b0 = buf[:, ofs]
+            b1 = buf[:, ofs + 1]
+            return tlut[numpy.where(hi, (b0 << 4) | (b1 >> 4),
+                                    ((b0 & 0xF) << 8) | b1)]
+
+        alarm = buf[:, plan['flag']] == 0xee
+        # date-time bytes of each position, either as history or alarm record
+        raw = numpy.where(alarm[:, :, None],
+                          buf[:, plan['ala_dt']], buf[:, plan['his_dt']])
+        hi = raw >> 4
+        lo = raw & 0xF
+        bad = (((hi >= 10) & (hi != 15)) | ((lo >= 10) & (lo != 15))).any(axis=2)
+        dt = hi * 10 + lo
+        dt[:, :, 0] += 2000
+
+        # history records; all channels are decoded, then those that are
+        # not in sensors are set to NP
+        t_np = SensorLimits.temperature_NP
+        h_np = SensorLimits.humidity_NP
+        present = (sensors >> numpy.arange(9)) & 1 == 1
+        his = ~alarm[:, :, None] & present
+        temp = numpy.where(his, temperature(plan['his_temp'], plan['his_temp_hi']), t_np)
+        humidity = numpy.where(his, hlut[buf[:, plan['his_humidity']]], h_np)
+
+        # alarm records
+        alarm_temp = numpy.where(alarm, temperature(plan['ala3'], False), t_np)
+        alarm_temp_lo = numpy.where(alarm, temperature(plan['ala4'], False), t_np)
+        alarm_temp_hi = numpy.where(alarm, temperature(plan['ala5'], True), t_np)
+        alarm_humidity = numpy.where(alarm, hlut[buf[:, plan['ala6']]], h_np)
+        alarm_humidity_lo = numpy.where(alarm, hlut[buf[:, plan['ala7']]], h_np)
+        alarm_humidity_hi = numpy.where(alarm, hlut[buf[:, plan['ala8']]], h_np)
+        info = buf[:, plan['ala2']]
+        alarm_data = numpy.where(alarm, (info >> 4) & 0xf, 0)
+        sensor = numpy.where(alarm, info & 0xf, 0)
+
+        alarm = alarm.astype(numpy.int32).tolist()
+        bad = bad.tolist()
+        dt = dt.tolist()
+        temp = temp.reshape(n, 54).tolist()
+        humidity = humidity.reshape(n, 54).tolist()
+        alarm_temp = alarm_temp.tolist()
+        alarm_temp_lo = alarm_temp_lo.tolist()
+        alarm_temp_hi = alarm_temp_hi.tolist()
+        alarm_humidity = alarm_humidity.tolist()
+        alarm_humidity_lo = alarm_humidity_lo.tolist()
+        alarm_humidity_hi = alarm_humidity_hi.tolist()
+        alarm_data = alarm_data.tolist()
+        sensor = sensor.tolist()
+
+        result = []
+        datetimes = dict()
+        for r in range(0, n):
+            # every slot is assigned below, so skip the default values
+            values = HistoryValues.__new__(HistoryValues)
+            values.alarm = alarm[r]
+            values.dt = [None] * 6
+            for p in range(0, 6):
+                result_dt = None
+                if bad[r][p]:
+                    logerr('ToDateTime: bogus date for HistoryData%d:'
+                           ' error status in buffer' % (p + 1))
+                else:
+                    key = tuple(dt[r][p])
+                    result_dt = datetimes.get(key)
+                    if result_dt is None:
+                        year, month, days, hours, minutes = key
+                        try:
+                            result_dt = datetime(year, month, days, hours, minutes)
+                            datetimes[key] = result_dt
+                        except ValueError:
+                            logerr(('ToDateTime: bogus date for HistoryData%d:'
+                                    ' bad date conversion from'
+                                    ' %s %s %s %s %s') %
+                                   (p + 1, minutes, hours, days, month, year))
+                if result_dt is None:
+                    result_dt = datetime(1900, 1, 1, 0, 0)
+                values.dt[p] = result_dt
+            values.temp = array('d', temp[r])
+            values.humidity = array('d', humidity[r])
+            values.alarm_temp = array('d', alarm_temp[r])
+            values.alarm_temp_lo = array('d', alarm_temp_lo[r])
+            values.alarm_temp_hi = array('d', alarm_temp_hi[r])
+            values.alarm_humidity = array('d', alarm_humidity[r])
+            values.alarm_humidity_lo = array('d', alarm_humidity_lo[r])
+            values.alarm_humidity_hi = array('d', alarm_humidity_hi[r])
+            values.alarm_data = alarm_data[r]
+            values.sensor = sensor[r]
+            result.append(HistoryData(values))
+        return result
+
+
+class LoggerImage(object):
+    """The history ring of a logger saved to a file by a dump, see
+    CommunicationService.startDumpingHistory.
+
+    The file starts with a header: the magic KLIMG, a version byte, the
+    time of the dump, the device id, the logger id, the index of the latest
+    record and the config frame of the console.  The header is padded to
+    HEADER_SIZE bytes.  Then come the 51200 slots of the ring, 32 bytes
+    each as in the memory of the logger, so the slot of index n is at
+    HEADER_SIZE + 32 * n.  A slot holds the 28 bytes of the record as they
+    are sent in a history frame, then 1 if the record has been read, then
+    3 bytes of padding."""
+
+    HEADER = struct.Struct('<5sBIHBxI125s')
+    HEADER_SIZE = 256
+    MAGIC = b'KLIMG'
+    VERSION = 1
+    NUM_SLOTS = 51200
+    SLOT_SIZE = 32
+    RECORD_SIZE = 28
+    READ = b'\x01\x00\x00\x00'
+    # records of slots that have never been written
+    BLANK = (b'\x00' * RECORD_SIZE, b'\xff' * RECORD_SIZE)
+
+    def __init__(self, path):
+        self.path = path
+        self.f = None
+        self.mm = None
+        self.dump_ts = None
+        self.device_id = 0
+        self.logger_id = 0
+        self.latest_index = 0
+        self.config = None
+        self.num_read = 0
+
+    def create(self):
+        """start an empty image, with all slots unread"""
+        self.f = open(self.path, 'w+b')
+        self.f.truncate(self.HEADER_SIZE + self.NUM_SLOTS * self.SLOT_SIZE)
+        self.dump_ts = int(time.time())
+        self.num_read = 0
+        self.write_header()
+
+    def write_header(self):
+        """save the header, so that the image can be opened even if the
+        dump stops before it is closed"""
+        config = self.config if self.config is not None else b''
+        self.f.seek(0)
+        self.f.write(self.HEADER.pack(
+            self.MAGIC, self.VERSION, self.dump_ts, self.device_id,
+            self.logger_id, self.latest_index, config))
+        self.f.flush()
+
+    def write_frame(self, buf, thisIndex):
+        """save the 6 records of a history frame, the last of which is at
+        thisIndex"""
+        for x in range(1, 7):
+            idx = get_index(thisIndex - 6 + x)
+            start = 13 + self.RECORD_SIZE * (6 - x)
+            self.f.seek(self.HEADER_SIZE + self.SLOT_SIZE * idx)
+            self.f.write(bytes(buf[start:start + self.RECORD_SIZE]))
+            self.f.write(self.READ)
+        self.num_read += 6
+
+    def open(self):
+        self.f = open(self.path, 'rb')
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, self.dump_ts, self.device_id, self.logger_id,
+         self.latest_index, self.config) = self.HEADER.unpack_from(self.mm, 0)
+        if magic != self.MAGIC:
+            raise weewx.WeeWxIOError('%s is not a logger image' % self.path)
+        if len(self.mm) < self.HEADER_SIZE + self.NUM_SLOTS * self.SLOT_SIZE:
+            raise weewx.WeeWxIOError('%s is truncated' % self.path)
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        elif self.f is not None:
+            self.write_header()
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def get_config(self):
+        """the StationConfig saved with the image, None if there is none"""
+        if self.config is None or not any(bytearray(self.config)):
+            return None
+        config = StationConfig()
+        config.read(bytearray(self.config))
+        return config
+
+    def frames(self):
+        """rebuild the history frames of the records that have been read,
+        oldest first, as (index of the last record, frame, positions).
+        positions are those of the 1-6 that hold a record; slots that have
+        not been read and blank records are left out.  The positions
+        without a record get a copy of one that has, so that the frame
+        decodes without errors; cacheHistoryRecords skips them."""
+        mm = self.mm
+        for n in range(0, self.NUM_SLOTS, 6):
+            thisIndex = get_index(self.latest_index + 6 + n)
+            frame = bytearray(HistoryData.FRAME_SIZE)
+            positions = []
+            for x in range(1, 7):
+                if n + x > self.NUM_SLOTS:
+                    break
+                idx = get_index(thisIndex - 6 + x)
+                ofs = self.HEADER_SIZE + self.SLOT_SIZE * idx
+                if mm[ofs + self.RECORD_SIZE:ofs + self.RECORD_SIZE + 1] != b'\x01':
+                    continue
+                record = mm[ofs:ofs + self.RECORD_SIZE]
+                if record in self.BLANK:
+                    continue
+                start = 13 + self.RECORD_SIZE * (6 - x)
+                frame[start:start + self.RECORD_SIZE] = record
+                positions.append(x)
+            if not positions:
+                continue
+            if len(positions) < 6:
+                start = 13 + self.RECORD_SIZE * (6 - positions[0])
+                record = frame[start:start + self.RECORD_SIZE]
+                for x in range(1, 7):
+                    if x not in positions:
+                        start = 13 + self.RECORD_SIZE * (6 - x)
+                        frame[start:start + self.RECORD_SIZE] = record
+            yield thisIndex, frame, tuple(positions)
+
+    def gen_history_records(self, since_ts=0, batch_size=1000):
+        """decode the image into HistoryRecords since since_ts, oldest first,
+        with the checks applied to records read from a console"""
+        state = ConsoleState(self.logger_id, None)
+        state.history_cache.since_ts = since_ts
+        config = self.get_config()
+        if config is not None:
+            state.sensors.update_config(config.values.sensor_text)
+        now = int(time.time())
+        batch = []
+        for item in self.frames():
+            batch.append(item)
+            if len(batch) < batch_size:
+                continue
+            for rec in self.decode_batch(state, batch, now):
+                yield rec
+            batch = []
+        for rec in self.decode_batch(state, batch, now):
+            yield rec
+
+    @staticmethod
+    def decode_batch(state, batch, now):
+        frames = HistoryData.read_batch([frame for _, frame, _ in batch],
+                                        state.sensors.configured)
+        for (thisIndex, _, positions), data in zip(batch, frames):
+            CommunicationService.cacheHistoryRecords(state, data, thisIndex,
+                                                     now, positions)
+        records = state.history_cache.records
+        state.history_cache.records = []
+        return records
+
+
+class HistoryCache:
     def __init__(self):
         self.wait_at_start = 1
         self.clear_records()
@@ -2964,9 +4584,50 @@ class HistoryCache:
         self.start_index = None
         self.next_index = None
         self.records = []
+        self.queue = None  # records for the driver when streaming
+        self.dump = None  # LoggerImage for the frames when dumping
+        self.resume = None  # checkpoint to start from, see checkResume
+        # read the newest records first, see CommunicationService.nextSegment
+        self.newest_first = False
+        self.plan = None  # the segments [lo, hi, hi_ts] to read
+        self.segments = []  # those not started yet
+        self.stop_index = None  # lo of the segment being read
+        self.history_segment = None  # that of the last record checked
+        self.locate = None  # [latest index, ages], see locateHistory
+        self.verify_index = None
+        self.verify_ts = None
         self.num_outstanding_records = None
         self.num_cached_records = 0
         self.last_ts = 0
+        # frames queued for and decoded by the history thread; each count
+        # is changed by one thread only
+        self.frames_queued = 0
+        self.frames_decoded = 0
+        # requests while reading, and those for current weather, see
+        # CommunicationService.scheduleRequest
+        self.requests = 0
+        self.live_requests = 0
+
+    def add(self, record):
+        if self.queue is not None:
+            self.queue.put(record)
+        else:
+            self.records.append(record)
+        self.num_cached_records += 1
+
+    def frames_pending(self):
+        """the number of frames the history thread has not decoded yet"""
+        decoded = self.frames_decoded
+        return self.frames_queued - decoded
+
+    def is_full(self, size):
+        """True if there is no room for the 6 records of another frame"""
+        if self.queue is not None:
+            used = self.queue.qsize()
+        else:
+            used = self.num_cached_records
+        used += 6 * self.frames_pending()
+        return size - used < 6
 
 
 class TransceiverSettings(object): 
@@ -3001,27 +4662,208 @@ class LastStat(object):
         if config_ts is not None:
             self.last_config_ts = config_ts
 
+    def copy(self):
+        stat = LastStat.__new__(LastStat)
+        stat.__dict__.update(self.__dict__)
+        return stat
+
+
+class Snapshot(object):
+    """What the RF thread last received, as published for the driver.  A
+    snapshot and the objects in it are not changed once published; the RF
+    thread publishes a new snapshot instead, so readers need no lock.
+
+    version counts the snapshots, current_version is the version of the
+    snapshot in which current weather data were last replaced."""
+
+    __slots__ = ('version', 'current_version', 'current', 'last_stat',
+                 'config', 'sensors')
+
+    def __init__(self, version, current_version, current, last_stat, config,
+                 sensors=ALL_SENSORS):
+        self.version = version
+        self.current_version = current_version
+        self.current = current
+        self.last_stat = last_stat
+        self.config = config
+        self.sensors = sensors
+
+
+class SensorPresence(object):
+    """Which of the 9 channels of a console have a sensor, as a bitmask.
+
+    Channel 0, the console itself, always has one.  A remote channel has
+    none if the config of the console names it '(No sensor)', or if its
+    temperature and humidity have been NP or OFL in absent_after current
+    weather frames in a row; the first valid value brings it back.
+    configured is the mask from the config alone, which is used for the
+    history records: a sensor that has stopped sending has older records."""
+
+    def __init__(self, absent_after=10):
+        self.absent_after = absent_after
+        self.configured = ALL_SENSORS
+        self.silent = 0
+        self.mask = ALL_SENSORS
+        self.streaks = [0] * 9
+
+    def update_config(self, sensor_text):
+        """sensor_text are the sensor texts of channels 1-8 in the config"""
+        configured = 1
+        for x in range(1, 9):
+            if sensor_text[x - 1] != '(No sensor)':
+                configured |= 1 << x
+        self.configured = configured
+        self.update()
+
+    def update_current(self, values):
+        """count the frames in a row without a valid value per channel"""
+        t_bad = (SensorLimits.temperature_NP, SensorLimits.temperature_OFL)
+        h_bad = (SensorLimits.humidity_NP, SensorLimits.humidity_OFL)
+        silent = self.silent
+        for x in range(1, 9):
+            if values.temp[x] not in t_bad or values.humidity[x] not in h_bad:
+                self.streaks[x] = 0
+                silent &= ~(1 << x)
+            else:
+                self.streaks[x] += 1
+                if self.streaks[x] >= self.absent_after:
+                    silent |= 1 << x
+        self.silent = silent
+        self.update()
+
+    def update(self):
+        mask = self.configured & ~self.silent | 1
+        if mask != self.mask:
+            loginf('active sensors: %s' %
+                   ' '.join([str(x) for x in SENSOR_CHANNELS[mask]]))
+        self.mask = mask
+
+
+class ConsoleState(object):
+    """Everything the RF thread knows about one console.  A transceiver can
+    talk to several consoles, each on its own logger channel; frames are
+    told apart by the LI byte."""
+
+    def __init__(self, logger_id, values):
+        self.logger_id = logger_id
+        self.values = values
+        self.last_stat = LastStat()
+        self.station_config = StationConfig()
+        self.current = CurrentData()
+        self.command = None
+        self.history_cache = HistoryCache()
+        self.sensors = SensorPresence()
+        self.ts_last_rec = 0
+        self.records_skipped = 0
+        self.snapshot = None
+        # whether the history thread found the clock too far off, None if
+        # it did not check yet; see CommunicationService.applyClockAlarm
+        self.clock_alarm = None
 
-class Transceiver(object):
-    """USB dongle abstraction"""
 
-    def __init__(self):
-        self.devh = None
-        self.timeout = 1000
-        self.last_dump = None
+# abstract base class for Python 2 and 3, as abc.ABC of Python 3
+_ABC = abc.ABCMeta('_ABC', (object,), {})
+
 
+class USBTransport(_ABC):
+    """Control transfers to and from the transceiver.  A transport finds and
+    opens the device, then moves HID reports: write sends a SetReport with
+    the given report value, read issues a GetReport and returns the bytes
+    received.  The reads of the flash memory of the transceiver are built
+    on these.  A subclass can be given to the driver in place of a USB
+    transport, for example to run without hardware."""
+
+    name = None
+
+    @abc.abstractmethod
     def open(self, vid, pid, serial):
-        device = Transceiver._find_device(vid, pid, serial)
+        pass
+
+    @abc.abstractmethod
+    def close(self):
+        pass
+
+    @abc.abstractmethod
+    def write(self, value, buf, timeout=1000):
+        pass
+
+    @abc.abstractmethod
+    def read(self, value, nbytes, timeout=1000):
+        pass
+
+    def readCfg(self, addr, nbytes, timeout=1000, dump=None):
+        """read nbytes of the flash memory from addr.  dump, if given, is
+        called with a label and each buffer sent and received."""
+        new_data = [0] * 0x15
+        while nbytes:
+            buf = [0xcc] * 0x0f  # 0x15
+            buf[0] = 0xdd
+            buf[1] = 0x0a
+            buf[2] = (addr >> 8) & 0xFF
+            buf[3] = (addr >> 0) & 0xFF
+            if dump is not None:
+                dump('readCfgFlash>', buf)
+            self.write(0x3dd, buf, timeout)
+            buf = self.read(0x3dc, 0x15, timeout)
+            new_data = [0] * 0x15
+            if nbytes < 16:
+                for i in range(0, nbytes):
+                    new_data[i] = buf[i + 4]
+                nbytes = 0
+            else:
+                for i in range(0, 16):
+                    new_data[i] = buf[i + 4]
+                nbytes -= 16
+                addr += 16
+            if dump is not None:
+                dump('readCfgFlash<', buf)
+        return new_data
+
+    def readSerial(self):
+        buf = self.readCfg(0x1F9, 7)
+        if buf:
+            return ''.join(['%02d' % x for x in buf[0:7]])
+        return None
+
+
+class LegacyUSBTransport(USBTransport):
+    """Transport for the pyusb 0.x API, also provided as usb.legacy by
+    pyusb 1.x"""
+
+    name = 'legacy'
+
+    def __init__(self, handle=None):
+        self.devh = handle
+
+    def open(self, vid, pid, serial):
+        device = LegacyUSBTransport._find_device(vid, pid, serial)
         if device is None:
-            logcrt('Cannot find USB device with Vendor=0x%04x ProdID=0x%04x Serial=%s' % 
+            logerr('Cannot find USB device with Vendor=0x%04x ProdID=0x%04x Serial=%s' % 
                    (vid, pid, serial))
             raise weewx.WeeWxIOError('Unable to find transceiver on USB')
         self.devh = self._open_device(device)
 
     def close(self):
-        Transceiver._close_device(self.devh)
+        LegacyUSBTransport._close_device(self.devh)
         self.devh = None
 
+    def write(self, value, buf, timeout=1000):
+        self.devh.controlMsg(usb.TYPE_CLASS + usb.RECIP_INTERFACE,
+                             request=0x0000009,
+                             buffer=buf,
+                             value=value,
+                             index=0x0000000,
+                             timeout=timeout)
+
+    def read(self, value, nbytes, timeout=1000):
+        return self.devh.controlMsg(
+            usb.TYPE_CLASS | usb.RECIP_INTERFACE | usb.ENDPOINT_IN,
+            request=usb.REQ_CLEAR_FEATURE,
+            buffer=nbytes,
+            value=value,
+            index=0x0000000,
+            timeout=timeout)
+
     @staticmethod
     def _find_device(vid, pid, serial):
         for bus in usb.busses():
@@ -3032,7 +4874,7 @@ class Transceiver(object):
                                (bus.dirname, dev.filename))
                         return dev
                     else:
-                        sn = Transceiver._read_serial(dev)
+                        sn = LegacyUSBTransport._read_serial(dev)
                         if str(serial) == sn:
                             loginf('found transceiver at bus=%s device=%s serial=%s' %
                                    (bus.dirname, dev.filename, sn))
@@ -3049,15 +4891,13 @@ class Transceiver(object):
             # see if we can read the serial without claiming the interface.
             # we do not want to disrupt any process that might already be
             # using the device.
-            handle = Transceiver._open_device(dev)
-            buf = Transceiver.readCfg(handle, 0x1F9, 7)
-            if buf:
-                return ''.join(['%02d' % x for x in buf[0:7]])
+            handle = LegacyUSBTransport._open_device(dev)
+            return LegacyUSBTransport(handle).readSerial()
         except usb.USBError as e:
             logerr("cannot read serial number: %s" % e)
         finally:
             # if we claimed the interface, we must release it
-            Transceiver._close_device(handle)
+            LegacyUSBTransport._close_device(handle)
             # FIXME: not sure whether we must delete the handle
 #            if handle is not None:
 #                del handle
@@ -3085,8 +4925,8 @@ class Transceiver(object):
             handle.claimInterface(interface)
             handle.setAltInterface(interface)
         except usb.USBError as e:
-            Transceiver._close_device(handle)
-            logcrt('Unable to claim USB interface %s: %s' % (interface, e))
+            LegacyUSBTransport._close_device(handle)
+            logerr('Unable to claim USB interface %s: %s' % (interface, e))
             raise weewx.WeeWxIOError(e)
 
         # FIXME: check return values
@@ -3113,122 +4953,853 @@ class Transceiver(object):
             except usb.USBError:
                 pass
 
+
+class CoreUSBTransport(USBTransport):
+    """Transport for the pyusb 1.x API (usb.core) with a libusb backend.
+    The device handle is kept for the life of the transport, and reports
+    are read into buffers that are allocated once per report size."""
+
+    name = 'core'
+
+    # bmRequestType of the HID class requests and the standard GetDescriptor
+    REQ_OUT = 0x21  # host to device, class, interface
+    REQ_IN = 0xa1  # device to host, class, interface
+    REQ_DESCRIPTOR = 0x80  # device to host, standard, device
+
+    def __init__(self, interface=0):
+        self.dev = None
+        self.interface = interface
+        self.in_bufs = dict()
+
+    @staticmethod
+    def available():
+        """True if usb.core is present and has a usable backend"""
+        try:
+            import usb.core
+        except ImportError:
+            return False
+        try:
+            usb.core.find()
+        except usb.core.NoBackendError:
+            return False
+        return True
+
+    def open(self, vid, pid, serial):
+        import usb.core
+        for dev in usb.core.find(find_all=True, idVendor=vid, idProduct=pid):
+            where = 'bus=%s device=%s' % (dev.bus, dev.address)
+            try:
+                self._open_device(dev)
+            except (usb.core.USBError, weewx.WeeWxIOError) as e:
+                logerr('cannot open transceiver at %s: %s' % (where, e))
+                continue
+            if serial is None:
+                loginf('found transceiver at %s' % where)
+                return
+            try:
+                sn = self.readSerial()
+            except usb.core.USBError as e:
+                logerr("cannot read serial number: %s" % e)
+                sn = None
+            if str(serial) == sn:
+                loginf('found transceiver at %s serial=%s' % (where, sn))
+                return
+            loginf('skipping transceiver with serial %s (looking for %s)' %
+                   (sn, serial))
+            self.close()
+        logerr('Cannot find USB device with Vendor=0x%04x ProdID=0x%04x Serial=%s' %
+               (vid, pid, serial))
+        raise weewx.WeeWxIOError('Unable to find transceiver on USB')
+
+    def _open_device(self, dev):
+        import usb.core
+        import usb.util
+        self.dev = dev
+        interface = self.interface
+        loginf('manufacturer: %s' % dev.manufacturer)
+        loginf('product: %s' % dev.product)
+        loginf('interface: %d' % interface)
+
+        # be sure kernel does not claim the interface
+        try:
+            if dev.is_kernel_driver_active(interface):
+                dev.detach_kernel_driver(interface)
+        except (usb.core.USBError, NotImplementedError):
+            pass
+
+        # attempt to claim the interface
+        try:
+            logdbg('claiming USB interface %d' % interface)
+            usb.util.claim_interface(dev, interface)
+            dev.set_interface_altsetting(interface, 0)
+        except usb.core.USBError as e:
+            self.close()
+            logerr('Unable to claim USB interface %s: %s' % (interface, e))
+            raise weewx.WeeWxIOError(e)
+
+        # same sequence of requests as LegacyUSBTransport._open_device
+        usb_wait = 0.05
+        dev.ctrl_transfer(self.REQ_DESCRIPTOR, 0x06, 0x0100, 0, 0x12)
+        time.sleep(usb_wait)
+        dev.ctrl_transfer(self.REQ_DESCRIPTOR, 0x06, 0x0200, 0, 0x9)
+        time.sleep(usb_wait)
+        dev.ctrl_transfer(self.REQ_DESCRIPTOR, 0x06, 0x0200, 0, 0x22)
+        time.sleep(usb_wait)
+        dev.ctrl_transfer(self.REQ_OUT, 0x0a, 0x0, 0x0, None, 1000)
+        time.sleep(usb_wait)
+        dev.ctrl_transfer(self.REQ_DESCRIPTOR, 0x06, 0x2200, 0, 0x2a9)
+        time.sleep(usb_wait)
+
+    def close(self):
+        if self.dev is not None:
+            import usb.core
+            import usb.util
+            try:
+                logdbg('releasing USB interface')
+                usb.util.release_interface(self.dev, self.interface)
+            except usb.core.USBError:
+                pass
+            usb.util.dispose_resources(self.dev)
+        self.dev = None
+
+    def write(self, value, buf, timeout=1000):
+        self.dev.ctrl_transfer(self.REQ_OUT, 0x09, value, 0, buf, timeout)
+
+    def read(self, value, nbytes, timeout=1000):
+        buf = self.in_bufs.get(nbytes)
+        if buf is None:
+            buf = array('B', [0] * nbytes)
+            self.in_bufs[nbytes] = buf
+        n = self.dev.ctrl_transfer(self.REQ_IN, 0x01, value, 0, buf, timeout)
+        if n < nbytes:
+            return buf[0:n]
+        return buf
+
+
+class ScaledClock(object):
+    """A clock that runs speed times faster than real time.  It has the
+    parts of the time module that the driver uses, so a test can run the
+    driver and a KlimaLoggEmulator on the same simulated time by replacing
+    the time module of this module with it:
+
+      user.kl.time = ScaledClock(60)
+    """
+
+    # the real time module, even after it has been replaced by a clock
+    _time = time
+
+    def __init__(self, speed=1.0, start=None):
+        self.speed = float(speed)
+        self.real_start = self._time.time()
+        self.start = self.real_start if start is None else start
+
+    def time(self):
+        return self.start + (self._time.time() - self.real_start) * self.speed
+
+    def sleep(self, secs):
+        self._time.sleep(secs / self.speed)
+
+    def localtime(self, secs=None):
+        return self._time.localtime(self.time() if secs is None else secs)
+
+    def gmtime(self, secs=None):
+        return self._time.gmtime(self.time() if secs is None else secs)
+
+    def __getattr__(self, name):
+        return getattr(self._time, name)
+
+
+class KlimaLoggEmulator(USBTransport):
+    """A transceiver and KlimaLogg console in one, for running the driver
+    without hardware.  The console answers the frames of the driver as
+    described in the protocol notes at the top of this file: it pairs on
+    the first GetConfig, sends config, current weather and history frames,
+    asks for SetConfig and SetTime, and stores what it is sent.
+
+    The console has a ring of up to 51200 history records, one record per
+    history interval, and the console sensor plus 1-8 external sensors.
+    Values are a function of the sensor and the time, so that runs can be
+    repeated.  A response is ready response_delay seconds after the setTX
+    of the driver and is lost if it is not read within window seconds;
+    when there is nothing to answer, the console sends a frame of its own
+    every comm_interval seconds.  All times are taken from clock, see
+    ScaledClock for running faster than real time."""
+
+    name = 'emulator'
+
+    # frame with a '(No sensor)' description, as read from the console
+    NO_SENSOR = (0x00, 0x00, 0x00, 0x00, 0x00, 0xff, 0xff, 0x00)
+
+    def __init__(self, sensors=8, records=51200, history_interval=HI_05MIN,
+                 comm_interval=8, device_id=0x012e, logger_channel=1,
+                 paired=True, first_index=0, set_time_interval=0,
+                 response_delay=0.3, window=0.2, clock=None, seed=None):
+        if not 1 <= sensors <= 8:
+            raise ValueError('sensors must be 1-8, not %s' % sensors)
+        if not 1 <= records <= KlimaLoggDriver.max_records:
+            raise ValueError('records must be 1-%d, not %s' %
+                             (KlimaLoggDriver.max_records, records))
+        self.clock = time if clock is None else clock
+        self.random = random.Random(seed)
+        self.sensors = sensors
+        self.comm_interval = comm_interval
+        self.device_id = device_id
+        self.logger_id = logger_channel - 1
+        self.paired = paired
+        self.set_time_interval = set_time_interval
+        self.response_delay = response_delay
+        self.window = window
+        self.first_index = first_index
+        self.records = records
+        self.interval = 60 * history_intervals[history_interval]
+        now = self.clock.time()
+        # time of the newest record at start, see numWritten
+        self.ts_latest = int(now) // self.interval * self.interval
+        self.config = self.buildConfig(history_interval)
+        self.clock_offset = 0
+        self.last_time_set = now
+        self.flash = bytearray([0xff] * 0x210)
+        self.flash[0x1F5:0x1F9] = bytearray([0x00, 0x01, 0x78, 0xa0])
+        self.flash[0x1F9:0x200] = bytearray(
+            [1, 2, 10, 12, 12, (device_id >> 8) & 0xff, device_id & 0xff])
+        self.flash_addr = 0
+        self.frame_out = bytearray()
+        # the frame that the console is sending, and when it is sent
+        self.pending = None
+        self.pending_ts = 0
+        self.next_beacon = now + comm_interval
+        self.last_current_ts = 0
+        self.reported_latest = None
+        # sequence number of the last record read by the driver; none of
+        # the records have been read at start
+        self.read_seq = records - 1 - min(records,
+                                          KlimaLoggDriver.max_records - 1)
+        self.stats = {'polls': 0, 'missed': 0, 'sent': dict(),
+                      'received': dict()}
+
+    def open(self, vid, pid, serial):
+        loginf('emulated console with %d sensors, %d records, device id'
+               ' 0x%04x' % (self.sensors, self.records, self.device_id))
+
+    def close(self):
+        pass
+
+    def write(self, value, buf, timeout=1000):
+        if value == 0x3d5:
+            # setFrame: keep the frame until setTX sends it
+            nbytes = (buf[1] << 8) | buf[2]
+            self.frame_out = bytearray(buf[3:3 + nbytes])
+        elif value == 0x3d1:
+            self.receive(self.frame_out)
+            self.frame_out = bytearray()
+        elif value == 0x3dd:
+            self.flash_addr = (buf[2] << 8) | buf[3]
+
+    def read(self, value, nbytes, timeout=1000):
+        buf = bytearray(nbytes)
+        if value == 0x3de:
+            # getState
+            self.stats['polls'] += 1
+            buf[0] = 0xde
+            buf[1] = 0x16 if self.poll() else 0x15
+        elif value == 0x3d6:
+            # getFrame
+            if self.poll():
+                frame = self.pending
+                self.pending = None
+                end = min(3 + len(frame), nbytes)
+                buf[1] = (len(frame) >> 8) & 0xff
+                buf[2] = len(frame) & 0xff
+                buf[3:end] = frame[0:end - 3]
+                sent = self.stats['sent']
+                sent[frame[3]] = sent.get(frame[3], 0) + 1
+                self.next_beacon = self.clock.time() + self.comm_interval
+        elif value == 0x3dc:
+            # readConfigFlash
+            addr = self.flash_addr
+            buf[0] = 0xdc
+            buf[1] = 0x0a
+            buf[2] = (addr >> 8) & 0xff
+            buf[3] = addr & 0xff
+            data = self.flash[addr:addr + nbytes - 4]
+            buf[4:4 + len(data)] = data
+        return buf
+
+    def poll(self):
+        """True if a frame is on air now"""
+        now = self.clock.time()
+        if self.pending is not None and now > self.pending_ts + self.window:
+            # the driver did not pick it up in time
+            self.pending = None
+            self.stats['missed'] += 1
+        if self.pending is None:
+            while now > self.next_beacon + self.window:
+                self.next_beacon += self.comm_interval
+            if now >= self.next_beacon:
+                self.schedule(self.beaconFrame(), self.next_beacon)
+                self.next_beacon += self.comm_interval
+        return self.pending is not None and now >= self.pending_ts
+
+    def schedule(self, frame, ts):
+        self.pending = frame
+        self.pending_ts = ts
+
+    def receive(self, buf):
+        """handle a frame from the driver and schedule the answer"""
+        if len(buf) < 4:
+            return
+        action = buf[3]
+        received = self.stats['received']
+        received[action] = received.get(action, 0) + 1
+        now = self.clock.time()
+        delay = self.response_delay
+        frame = None
+        if not self.paired:
+            if action == ACTION_GET_CONFIG:
+                self.paired = True
+                loginf('emulated console paired to device 0x%04x' %
+                       self.device_id)
+                frame = self.configFrame()
+                delay = 0.085
+        elif action == ACTION_SEND_CONFIG and len(buf) == 0x7D:
+            self.storeConfig(buf)
+            frame = self.shortFrame(RESPONSE_DATA_WRITTEN)
+            delay = 0.085
+        elif action == ACTION_SEND_TIME and len(buf) == 13:
+            self.storeTime(buf)
+            frame = self.shortFrame(RESPONSE_DATA_WRITTEN)
+            delay = 0.085
+        elif action == ACTION_REQ_SET_TIME:
+            frame = self.shortFrame(RESPONSE_REQ_SET_TIME)
+        elif action == ACTION_REQ_SET_CONFIG:
+            frame = self.shortFrame(RESPONSE_REQ_SET_CONFIG)
+        elif action == ACTION_GET_CONFIG:
+            frame = self.configFrame()
+        elif action == ACTION_GET_CURRENT:
+            frame = self.currentFrame()
+        elif action == ACTION_GET_HISTORY:
+            addr = (buf[8] << 16) | (buf[9] << 8) | buf[10]
+            idx = (addr - 0x070000) // 32 if addr != 0xFFFFFF else None
+            frame = self.historyFrame(idx)
+        elif action == RESPONSE_REQ_READ_HISTORY:
+            # the driver echoes a read history request
+            frame = self.historyFrame(None)
+            delay = 0.085
+        if frame is not None:
+            jitter = self.random.uniform(0, 0.010)
+            self.schedule(frame, now + delay + jitter)
+
+    def header(self, buf, resp):
+        did = self.device_id if self.paired else 0xF0F0
+        buf[0] = (did >> 8) & 0xff
+        buf[1] = did & 0xff
+        buf[2] = self.logger_id
+        buf[3] = resp
+        buf[4] = 0x64  # signal quality
+
+    def shortFrame(self, resp, quality=None):
+        """7 byte frame: data written or a request"""
+        buf = bytearray(7)
+        self.header(buf, resp)
+        if quality is not None:
+            buf[4] = quality
+        buf[5] = self.config[123]
+        buf[6] = self.config[124]
+        return buf
+
+    def beaconFrame(self):
+        """what the console sends when it has nothing to answer"""
+        if not self.paired:
+            return self.shortFrame(RESPONSE_REQ_FIRST_CONFIG)
+        now = self.clock.time()
+        if (self.set_time_interval and
+            now - self.last_time_set >= self.set_time_interval):
+            self.last_time_set = now
+            return self.shortFrame(RESPONSE_REQ_SET_TIME)
+        unread = self.numWritten() - 1 - self.read_seq
+        if unread > 0 and self.reported_latest != self.latestIndex():
+            pct = max(1, 100 * unread // KlimaLoggDriver.max_records)
+            return self.shortFrame(RESPONSE_REQ_READ_HISTORY, pct)
+        return self.currentFrame()
+
+    # history ring
+
+    def numWritten(self):
+        """number of records written since the first, at the console time"""
+        elapsed = int(self.clock.time()) - self.ts_latest
+        return self.records + max(0, elapsed // self.interval)
+
+    def latestIndex(self):
+        return get_index((self.first_index + self.numWritten() - 1) %
+                         KlimaLoggDriver.max_records)
+
+    def indexToSeq(self, idx):
+        return self.numWritten() - 1 - get_index(self.latestIndex() - idx)
+
+    def recordTime(self, idx):
+        """timestamp of the record at index idx, None if never written"""
+        n = self.numWritten()
+        age = get_index(self.latestIndex() - idx)
+        if age >= min(n, KlimaLoggDriver.max_records):
+            return None
+        return self.ts_latest + (n - self.records - age) * self.interval
+
+    def sensorValues(self, x, ts):
+        """temperature and humidity of sensor x at ts; a daily cycle"""
+        if x > self.sensors:
+            return None, None
+        phase = ((int(ts) + 3600 * x) % 86400) / 43200.0
+        if phase > 1.0:
+            phase = 2.0 - phase
+        return round(5.0 + 2 * x + 15.0 * phase, 1), int(75 - 40 * phase)
+
+    # frames
+
+    def currentFrame(self):
+        now = self.clock.time() + self.clock_offset
+        self.last_current_ts = now
+        buf = bytearray(CurrentData.FRAME_SIZE)
+        self.header(buf, RESPONSE_GET_CURRENT)
+        buf[5] = self.config[123]
+        buf[6] = self.config[124]
+        hour = int(now) - int(now) % 3600
+        for x in range(0, 9):
+            o = CurrentData.BUFMAP[x]
+            t, h = self.sensorValues(x, now)
+            self.putTemperature(buf, o[2], 0, t)
+            self.putTemperature(buf, o[0], 0, None if t is None else t + 1.5)
+            self.putTemperature(buf, o[1], 1, None if t is None else t - 1.5)
+            self.putHumidity(buf, o[7], h)
+            self.putHumidity(buf, o[5], None if h is None else min(h + 5, 99))
+            self.putHumidity(buf, o[6], None if h is None else max(h - 5, 1))
+            if t is not None:
+                self.putDateTime8(buf, o[3], 0, hour)
+                self.putDateTime8(buf, o[4], 0, hour)
+                self.putDateTime8(buf, o[8], 1, hour)
+                self.putDateTime8(buf, o[9], 1, hour)
+        return buf
+
+    def historyFrame(self, idx):
+        """frame with the 6 records up to 6 after idx.  When idx is None or
+        the latest index, the frame has the actual record in all positions
+        and the index of the last record acknowledged; current weather is
+        sent instead when it is due."""
+        now = self.clock.time()
+        latest = self.latestIndex()
+        if idx is not None:
+            # asking for the records after idx acknowledges idx
+            self.read_seq = max(self.read_seq, self.indexToSeq(idx))
+        if idx is None or idx == latest:
+            if now - self.last_current_ts >= self.comm_interval:
+                return self.currentFrame()
+            this = get_index((self.first_index + self.read_seq) %
+                             KlimaLoggDriver.max_records)
+            times = [int(now + self.clock_offset) // 60 * 60] * 6
+        else:
+            this = get_index(idx + min(6, get_index(latest - idx)))
+            times = [self.recordTime(get_index(this - 5 + p))
+                     for p in range(0, 6)]
+        self.reported_latest = latest
+        buf = bytearray(HistoryData.FRAME_SIZE)
+        self.header(buf, RESPONSE_GET_HISTORY)
+        buf[5] = self.config[123]
+        buf[6] = self.config[124]
+        for i, n in ((7, latest), (10, this)):
+            addr = index_to_addr(n)
+            buf[i] = (addr >> 16) & 0xff
+            buf[i + 1] = (addr >> 8) & 0xff
+            buf[i + 2] = addr & 0xff
+        for p in range(0, 6):
+            ts = times[p]
+            if ts is None:
+                continue
+            his = HistoryData.BUFMAPHIS[p + 1]
+            self.putDateTime10(buf, his[0], ts)
+            for j in range(0, 9):
+                t, h = self.sensorValues(j, ts)
+                self.putTemperature(buf, his[1][j], j % 2, t)
+                self.putHumidity(buf, his[2][j], h)
+        return buf
+
+    # config groups that are sent in reverse byte order, see StationConfig
+    def configGroups(self):
+        groups = [(53, 5)]
+        for x in range(0, 9):
+            groups.append((StationConfig.BUFMAP[0][x], 3))
+            groups.append((StationConfig.BUFMAP[2][x], 2))
+        for x in range(0, 8):
+            groups.append((StationConfig.BUFMAP[4][x], 8))
+        return groups
+
+    def buildConfig(self, history_interval):
+        buf = bytearray(0x7D)
+        buf[5] = 0x48  # contrast 4, alert off, DCF off, 24h, degree C
+        buf[6] = 0
+        buf[7] = history_interval
+        for x in range(0, 9):
+            self.putTemperature(buf, StationConfig.BUFMAP[0][x], 1, 40.0)
+            self.putTemperature(buf, StationConfig.BUFMAP[1][x], 0, 0.0)
+            self.putHumidity(buf, StationConfig.BUFMAP[2][x], 70)
+            self.putHumidity(buf, StationConfig.BUFMAP[3][x], 20)
+        for x in range(self.sensors, 8):
+            start = StationConfig.BUFMAP[4][x]
+            buf[start:start + 8] = bytearray(self.NO_SENSOR)
+        self.setConfigChecksum(buf)
+        return buf
+
+    @staticmethod
+    def setConfigChecksum(buf):
+        cs = calc_checksum(buf, 5, end=122) + 7
+        buf[123] = (cs >> 8) & 0xff
+        buf[124] = cs & 0xff
+
+    def configFrame(self):
+        buf = self.config
+        self.header(buf, RESPONSE_GET_CONFIG)
+        return bytearray(buf)
+
+    def storeConfig(self, buf):
+        cfg = bytearray(buf)
+        for start, count in self.configGroups():
+            StationConfig.reverseByteOrder(cfg, start, count)
+        cfg[122] = 0  # ResetHiLo is output only
+        self.setConfigChecksum(cfg)
+        self.config = cfg
+
+    def storeTime(self, buf):
+        def bcd(b):
+            return (b >> 4) * 10 + (b & 0xf)
+
+        def bcd2(hi, lo):
+            # day, month and year straddle two bytes, see buildTimeFrame
+            return bcd(((hi & 0xf) << 4) | (lo >> 4))
+        try:
+            ts = time.mktime((2000 + bcd2(buf[12], buf[11]),
+                              bcd2(buf[11], buf[10]), bcd2(buf[10], buf[9]),
+                              bcd(buf[8]), bcd(buf[7]), bcd(buf[6]),
+                              0, 0, -1))
+        except (OverflowError, ValueError):
+            logerr('emulated console: bad time in SetTime frame')
+            return
+        self.clock_offset = ts - int(self.clock.time())
+        self.last_time_set = self.clock.time()
+
+    # encoders, the reverse of Decode
+
+    @staticmethod
+    def putNibbles(buf, start, startOnHiNibble, nibbles):
+        pos = 2 * start + (0 if startOnHiNibble else 1)
+        for n in nibbles:
+            i = pos >> 1
+            if pos & 1:
+                buf[i] = (buf[i] & 0xF0) | n
+            else:
+                buf[i] = (buf[i] & 0x0F) | (n << 4)
+            pos += 1
+
+    @staticmethod
+    def putTemperature(buf, start, startOnHiNibble, value):
+        if value is None:
+            nibbles = (0xa, 0xa, 0xa)
+        else:
+            v = int(round((value + SensorLimits.temperature_offset) * 10))
+            nibbles = (v // 100, (v // 10) % 10, v % 10)
+        KlimaLoggEmulator.putNibbles(buf, start, startOnHiNibble, nibbles)
+
+    @staticmethod
+    def putHumidity(buf, start, value):
+        if value is None:
+            buf[start] = 0xaa
+        else:
+            buf[start] = ((value // 10) << 4) | (value % 10)
+
+    @staticmethod
+    def putDateTime10(buf, start, ts):
+        tm = time.localtime(ts)
+        for i, v in enumerate((tm[0] - 2000, tm[1], tm[2], tm[3], tm[4])):
+            buf[start + i] = ((v // 10) << 4) | (v % 10)
+
+    @staticmethod
+    def putDateTime8(buf, start, startOnHiNibble, ts):
+        tm = time.localtime(ts)
+        hour = tm[3]
+        tens = tm[4] // 10
+        if hour >= 20:
+            tim1, tim2 = hour - 10, tens
+        elif hour >= 10:
+            tim1, tim2 = hour - 10, tens + 10
+        else:
+            tim1, tim2 = hour, tens
+        year = tm[0] - 2000
+        KlimaLoggEmulator.putNibbles(
+            buf, start, startOnHiNibble,
+            (year // 10, year % 10, tm[1], tm[2] // 10, tm[2] % 10,
+             tim1, tim2, tm[4] % 10))
+
+
+class CaptureTransport(USBTransport):
+    """Wraps a transport and appends every transfer to a capture file.
+
+    The file starts with a header: the magic KLCAP, a version byte and the
+    wall clock time of the start of the capture.  Each transfer is one
+    record: a monotonic timestamp, the direction (0 for write, 1 for read),
+    the report value, the number of bytes, then the bytes themselves."""
+
+    HEADER = struct.Struct('<5sBd')
+    RECORD = struct.Struct('<dBHH')
+    MAGIC = b'KLCAP'
+    VERSION = 1
+    OUT = 0
+    IN = 1
+
+    def __init__(self, transport, path):
+        self.transport = transport
+        self.name = getattr(transport, 'name', None)
+        self.path = path
+        self.f = None
+        self.clock = getattr(time, 'monotonic', time.time)
+
+    def open(self, vid, pid, serial):
+        loginf('capturing USB transfers to %s' % self.path)
+        self.f = open(self.path, 'ab')
+        if self.f.tell() == 0:
+            self.f.write(self.HEADER.pack(self.MAGIC, self.VERSION,
+                                          time.time()))
+        self.transport.open(vid, pid, serial)
+
+    def close(self):
+        self.transport.close()
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def append(self, direction, value, buf):
+        data = bytearray(buf)
+        self.f.write(self.RECORD.pack(self.clock(), direction, value,
+                                      len(data)))
+        self.f.write(data)
+
+    def write(self, value, buf, timeout=1000):
+        self.transport.write(value, buf, timeout)
+        if self.f is not None:
+            self.append(self.OUT, value, buf)
+
+    def read(self, value, nbytes, timeout=1000):
+        buf = self.transport.read(value, nbytes, timeout)
+        if self.f is not None:
+            self.append(self.IN, value, buf)
+        return buf
+
+
+class ReplayTransport(USBTransport):
+    """Plays back a capture file made by CaptureTransport.  The file is
+    memory mapped and indexed once; each read returns the next captured
+    read of the same report value, and writes are only counted.  With
+    skip_idle the getState reads that found no frame are left out, so that
+    the captured frames are handed to the driver as fast as it asks for
+    them.  At the end of the capture getState reports idle."""
+
+    name = 'replay'
+
+    def __init__(self, path, skip_idle=True):
+        self.path = path
+        self.skip_idle = skip_idle
+        self.f = None
+        self.mm = None
+        self.start_ts = None
+        self.reads = dict()
+        self.cursor = dict()
+        self.num_writes = 0
+        self.finished = False
+
+    def open(self, vid, pid, serial):
+        self.f = open(self.path, 'rb')
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        self.index()
+        loginf('replaying %s: %d reads' %
+               (self.path, sum([len(x) for x in self.reads.values()])))
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        if self.f is not None:
+            self.f.close()
+            self.f = None
+
+    def index(self):
+        """find the offset and length of the payload of every read"""
+        self.reads = dict()
+        self.cursor = dict()
+        for ts, direction, value, ofs, nbytes in self.records():
+            if direction != CaptureTransport.IN:
+                continue
+            if (self.skip_idle and value == 0x3de and nbytes > 1 and
+                self.mm[ofs + 1:ofs + 2] != b'\x16'):
+                continue
+            self.reads.setdefault(value, []).append((ofs, nbytes))
+
+    def records(self):
+        """iterate over the records of the capture: timestamp, direction,
+        value, offset and length of the payload"""
+        mm = self.mm
+        magic, version, self.start_ts = CaptureTransport.HEADER.unpack_from(mm, 0)
+        if magic != CaptureTransport.MAGIC:
+            raise weewx.WeeWxIOError('%s is not a capture file' % self.path)
+        pos = CaptureTransport.HEADER.size
+        rec = CaptureTransport.RECORD
+        end = len(mm)
+        while pos + rec.size <= end:
+            ts, direction, value, nbytes = rec.unpack_from(mm, pos)
+            pos += rec.size
+            if pos + nbytes > end:
+                break
+            yield ts, direction, value, pos, nbytes
+            pos += nbytes
+
+    def write(self, value, buf, timeout=1000):
+        self.num_writes += 1
+
+    def read(self, value, nbytes, timeout=1000):
+        reads = self.reads.get(value, ())
+        n = self.cursor.get(value, 0)
+        if n >= len(reads):
+            if not self.finished:
+                loginf('end of capture %s' % self.path)
+                self.finished = True
+            buf = bytearray(nbytes)
+            if value == 0x3de:
+                buf[0:2] = b'\xde\x15'
+            return buf
+        self.cursor[value] = n + 1
+        ofs, size = reads[n]
+        return bytearray(self.mm[ofs:ofs + size])
+
+
+def get_transport(transport='legacy'):
+    """Return the transport named by the transport option: legacy, core,
+    auto to use core when a libusb backend is available, or emulator for a
+    KlimaLoggEmulator with its defaults.  A USBTransport is returned as
+    is."""
+    if isinstance(transport, USBTransport):
+        return transport
+    name = str(transport).lower()
+    if name == 'auto':
+        name = 'core' if CoreUSBTransport.available() else 'legacy'
+    if name == 'core':
+        return CoreUSBTransport()
+    if name == 'legacy':
+        return LegacyUSBTransport()
+    if name == 'emulator':
+        return KlimaLoggEmulator()
+    raise weewx.ViolatedPrecondition(
+        "transport must be legacy, core, auto or emulator, not '%s'" %
+        transport)
+
+
+class Transceiver(object):
+    """USB dongle abstraction"""
+
+    def __init__(self, transport=None, capture=None):
+        self.transport = get_transport('legacy' if transport is None
+                                       else transport)
+        if capture:
+            # record every transfer to the capture file
+            self.transport = CaptureTransport(self.transport, capture)
+        self.timeout = 1000
+        self.last_dump = None
+        # buffers for outgoing messages, allocated once and reused
+        self.tx_buf = bytearray(0x15)
+        self.tx_buf[0] = 0xD1
+        self.rx_buf = bytearray(0x15)
+        self.rx_buf[0] = 0xD0
+        self.state_buf = bytearray(0x15)
+        self.state_buf[0] = 0xd7
+        self.preamble_buf = bytearray(0x15)
+        self.preamble_buf[0] = 0xd8
+        self.set_frame_buf = bytearray(0x111)
+        self.set_frame_buf[0] = 0xd5
+        self.set_frame_end = 3
+        # buffers for received states and frames, see getState and getFrame
+        self.state = bytearray(2)
+        self.frame = bytearray(0x131)
+        self.frame_len = 0
+
+    def open(self, vid, pid, serial):
+        loginf('using %s USB transport' % getattr(self.transport, 'name', None))
+        self.transport.open(vid, pid, serial)
+
+    def close(self):
+        self.transport.close()
+
     def setTX(self):
-        buf = [0] * 0x15
-        buf[0] = 0xD1
+        buf = self.tx_buf
         if DEBUG_COMM > 1:
             self.dump('setTX', buf, fmt=DEBUG_DUMP_FORMAT)
-        self.devh.controlMsg(usb.TYPE_CLASS + usb.RECIP_INTERFACE,
-                             request=0x0000009,
-                             buffer=buf,
-                             value=0x00003d1,
-                             index=0x0000000,
-                             timeout=self.timeout)
+        self.transport.write(0x3d1, buf, self.timeout)
 
     def setRX(self):
-        buf = [0] * 0x15
-        buf[0] = 0xD0
+        buf = self.rx_buf
         if DEBUG_COMM > 1:
             self.dump('setRX', buf, fmt=DEBUG_DUMP_FORMAT)
-        self.devh.controlMsg(usb.TYPE_CLASS + usb.RECIP_INTERFACE,
-                             request=0x0000009,
-                             buffer=buf,
-                             value=0x00003d0,
-                             index=0x0000000,
-                             timeout=self.timeout)
+        self.transport.write(0x3d0, buf, self.timeout)
 
     def getState(self):
-        buf = self.devh.controlMsg(
-            requestType=usb.TYPE_CLASS | usb.RECIP_INTERFACE | usb.ENDPOINT_IN,
-            request=usb.REQ_CLEAR_FEATURE,
-            buffer=0x0a,
-            value=0x00003de,
-            index=0x0000000,
-            timeout=self.timeout)
+        """return the two bytes of the state.  They are in a buffer that is
+        reused by the next call."""
+        buf = self.transport.read(0x3de, 0x0a, self.timeout)
+        state = self.state
+        state[0] = buf[1]
+        state[1] = buf[2]
         if DEBUG_COMM > 1:
             self.dump('getState', buf, fmt=DEBUG_DUMP_FORMAT)
-        return buf[1:3]
+        return state
 
     def readConfigFlash(self, addr, nbytes):
-        new_data = [0] * 0x15
-        while nbytes:
-            buf = [0xcc] * 0x0f  # 0x15
-            buf[0] = 0xdd
-            buf[1] = 0x0a
-            buf[2] = (addr >> 8) & 0xFF
-            buf[3] = (addr >> 0) & 0xFF
-            if DEBUG_COMM > 1:
-                self.dump('readCfgFlash>', buf, fmt=DEBUG_DUMP_FORMAT)
-            self.devh.controlMsg(usb.TYPE_CLASS + usb.RECIP_INTERFACE,
-                                 request=0x0000009,
-                                 buffer=buf,
-                                 value=0x00003dd,
-                                 index=0x0000000,
-                                 timeout=self.timeout)
-            buf = self.devh.controlMsg(
-                usb.TYPE_CLASS | usb.RECIP_INTERFACE | usb.ENDPOINT_IN,
-                request=usb.REQ_CLEAR_FEATURE,
-                buffer=0x15,
-                value=0x00003dc,
-                index=0x0000000,
-                timeout=self.timeout)
-            new_data = [0] * 0x15
-            if nbytes < 16:
-                for i in range(0, nbytes):
-                    new_data[i] = buf[i + 4]
-                nbytes = 0
-            else:
-                for i in range(0, 16):
-                    new_data[i] = buf[i + 4]
-                nbytes -= 16
-                addr += 16
-            if DEBUG_COMM > 1:
-                self.dump('readCfgFlash<', buf, fmt=DEBUG_DUMP_FORMAT)
-        return new_data
+        dump = None
+        if DEBUG_COMM > 1:
+            def dump(label, buf):
+                self.dump(label, buf, fmt=DEBUG_DUMP_FORMAT)
+        return self.transport.readCfg(addr, nbytes, self.timeout, dump)
 
     def setState(self, state):
-        buf = [0] * 0x15
-        buf[0] = 0xd7
+        buf = self.state_buf
         buf[1] = state
         if DEBUG_COMM > 1:
             self.dump('setState', buf, fmt=DEBUG_DUMP_FORMAT)
-        self.devh.controlMsg(usb.TYPE_CLASS + usb.RECIP_INTERFACE,
-                             request=0x0000009,
-                             buffer=buf,
-                             value=0x00003d7,
-                             index=0x0000000,
-                             timeout=self.timeout)
+        self.transport.write(0x3d7, buf, self.timeout)
 
     def setFrame(self, nbytes, data):
-        buf = [0] * 0x111
-        buf[0] = 0xd5
-        buf[1] = nbytes >> 8
-        buf[2] = nbytes
-        for i in range(0, nbytes):
-            buf[i + 3] = data[i]
+        buf = self.set_frame_buf
+        buf[1] = (nbytes >> 8) & 0xFF
+        buf[2] = nbytes & 0xFF
+        payload = data[0:nbytes]
+        end = 3 + len(payload)
+        buf[3:end] = payload
+        if end < self.set_frame_end:
+            # clear what is left of the previous frame
+            buf[end:self.set_frame_end] = bytearray(self.set_frame_end - end)
+        self.set_frame_end = end
         if DEBUG_COMM == 1:
             self.dump('setFrame', buf, 'short')
         elif DEBUG_COMM > 1:
             self.dump('setFrame', buf, fmt=DEBUG_DUMP_FORMAT)
-        self.devh.controlMsg(usb.TYPE_CLASS + usb.RECIP_INTERFACE,
-                             request=0x0000009,
-                             buffer=buf,
-                             value=0x00003d5,
-                             index=0x0000000,
-                             timeout=self.timeout)
+        self.transport.write(0x3d5, buf, self.timeout)
 
     def getFrame(self):
-        buf = self.devh.controlMsg(
-            usb.TYPE_CLASS | usb.RECIP_INTERFACE | usb.ENDPOINT_IN,
-            request=usb.REQ_CLEAR_FEATURE,
-            buffer=0x111,
-            value=0x00003d6,
-            index=0x0000000,
-            timeout=self.timeout)
-        data = [0] * 0x131
+        """return the length and the payload of the received frame.  The
+        payload is in a buffer that is reused by the next call; it is
+        padded with zeros to 0x131 bytes.  Copy whatever must be kept."""
+        buf = self.transport.read(0x3d6, 0x111, self.timeout)
+        data = self.frame
         nbytes = (buf[1] << 8 | buf[2]) & 0x1ff
-        for i in range(0, nbytes):
-            data[i] = buf[i + 3]
+        payload = buf[3:3 + nbytes]
+        end = len(payload)
+        data[0:end] = payload
+        if end < self.frame_len:
+            # clear what is left of the previous frame
+            data[end:self.frame_len] = bytearray(self.frame_len - end)
+        self.frame_len = end
         if DEBUG_COMM == 1:
             self.dump('getFrame', buf, 'short')
         elif DEBUG_COMM > 1:
@@ -3244,12 +5815,7 @@ class Transceiver(object):
         buf[4] = 0x00
         if DEBUG_COMM > 1:
             self.dump('writeReg', buf, fmt=DEBUG_DUMP_FORMAT)
-        self.devh.controlMsg(usb.TYPE_CLASS + usb.RECIP_INTERFACE,
-                             request=0x0000009,
-                             buffer=buf,
-                             value=0x00003f0,
-                             index=0x0000000,
-                             timeout=self.timeout)
+        self.transport.write(0x3f0, buf, self.timeout)
 
     def execute(self, command):
         buf = [0] * 0x0f  # 0x15
@@ -3257,25 +5823,14 @@ class Transceiver(object):
         buf[1] = command
         if DEBUG_COMM > 1:
             self.dump('execute', buf, fmt=DEBUG_DUMP_FORMAT)
-        self.devh.controlMsg(usb.TYPE_CLASS + usb.RECIP_INTERFACE,
-                             request=0x0000009,
-                             buffer=buf,
-                             value=0x00003d9,
-                             index=0x0000000,
-                             timeout=self.timeout)
+        self.transport.write(0x3d9, buf, self.timeout)
 
     def setPreamblePattern(self, pattern):
-        buf = [0] * 0x15
-        buf[0] = 0xd8
+        buf = self.preamble_buf
         buf[1] = pattern
         if DEBUG_COMM > 1:
             self.dump('setPreamble', buf, fmt=DEBUG_DUMP_FORMAT)
-        self.devh.controlMsg(usb.TYPE_CLASS + usb.RECIP_INTERFACE,
-                             request=0x0000009,
-                             buffer=buf,
-                             value=0x00003d8,
-                             index=0x0000000,
-                             timeout=self.timeout)
+        self.transport.write(0x3d8, buf, self.timeout)
 
     # three formats, long, short, auto.  short shows only the first 16 bytes.
     # long shows the full length of the buffer.  auto shows the message length
@@ -3314,40 +5869,6 @@ class Transceiver(object):
             logdbg('%s: %s%s' % (cmd, pad, strbuf))
             self.last_dump = None
 
-    @staticmethod
-    def readCfg(handle, addr, nbytes, timeout=1000):
-        new_data = [0] * 0x15
-        while nbytes:
-            buf = [0xcc] * 0x0f  # 0x15
-            buf[0] = 0xdd
-            buf[1] = 0x0a
-            buf[2] = (addr >> 8) & 0xFF
-            buf[3] = (addr >> 0) & 0xFF
-            handle.controlMsg(usb.TYPE_CLASS + usb.RECIP_INTERFACE,
-                              request=0x0000009,
-                              buffer=buf,
-                              value=0x00003dd,
-                              index=0x0000000,
-                              timeout=timeout)
-            buf = handle.controlMsg(
-                usb.TYPE_CLASS | usb.RECIP_INTERFACE | usb.ENDPOINT_IN,
-                request=usb.REQ_CLEAR_FEATURE,
-                buffer=0x15,
-                value=0x00003dc,
-                index=0x0000000,
-                timeout=timeout)
-            new_data = [0] * 0x15
-            if nbytes < 16:
-                for i in range(0, nbytes):
-                    new_data[i] = buf[i + 4]
-                nbytes = 0
-            else:
-                for i in range(0, 16):
-                    new_data[i] = buf[i + 4]
-                nbytes -= 16
-                addr += 16
-        return new_data
-
 
 class AX5051RegisterNames:
     REVISION     = 0x0
@@ -3417,40 +5938,153 @@ class AX5051RegisterNames:
     RXMISC       = 0x7D
 
 
+class PollScheduler(object):
+    """Learns when the console answers and picks the sleep before the
+    first getState and the interval between getStates.
+
+    For each response type the offsets from setTX to the getState that
+    found the frame are kept.  The offset is only known to within one poll
+    interval, and when the first getState already finds the frame the
+    frame may have arrived much earlier, so such offsets are counted one
+    poll interval early.  The first sleep aims a poll interval before the
+    early arrivals, the poll interval is a fraction of the spread."""
+
+    # what the console is expected to send for each action of the driver
+    EXPECTED = {ACTION_GET_HISTORY: RESPONSE_GET_HISTORY,
+                ACTION_GET_CURRENT: RESPONSE_GET_CURRENT,
+                ACTION_GET_CONFIG: RESPONSE_GET_CONFIG,
+                ACTION_REQ_SET_TIME: RESPONSE_REQUEST,
+                ACTION_REQ_SET_CONFIG: RESPONSE_REQUEST,
+                ACTION_SEND_CONFIG: RESPONSE_DATA_WRITTEN,
+                ACTION_SEND_TIME: RESPONSE_DATA_WRITTEN}
+
+    def __init__(self, max_samples=32, min_samples=8,
+                 min_poll=0.005, max_poll=0.050, max_sleep=1.0):
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.min_poll = min_poll
+        self.max_poll = max_poll
+        self.max_sleep = max_sleep
+        self.offsets = dict()  # response type: recent offsets
+        self.polls = dict()  # response type: [frames, getStates]
+        self.plan = dict()  # response type: (first sleep, poll interval)
+        self.tx_ts = None
+        self.tx_poll = None
+
+    def sent(self, action, ts, first_sleep, next_sleep):
+        """note a setTX, return the sleeps to use for its response"""
+        self.tx_ts = ts
+        plan = self.plan.get(self.EXPECTED.get(action))
+        if plan is None:
+            plan = (first_sleep, next_sleep)
+        self.tx_poll = plan[1]
+        return plan
+
+    def reset(self):
+        """the next frame is not an answer to a setTX"""
+        self.tx_ts = None
+
+    def received(self, resp, ts, poll_count):
+        """note the arrival of a frame of type resp"""
+        if self.tx_ts is None:
+            return
+        offset = ts - self.tx_ts
+        self.tx_ts = None
+        if poll_count <= 1:
+            offset -= self.tx_poll
+        offsets = self.offsets.setdefault(resp, [])
+        offsets.append(max(0.0, offset))
+        if len(offsets) > self.max_samples:
+            del offsets[0]
+        polls = self.polls.setdefault(resp, [0, 0])
+        polls[0] += 1
+        polls[1] += poll_count
+        if len(offsets) >= self.min_samples:
+            s = sorted(offsets)
+            lo = s[len(s) // 10]
+            hi = s[len(s) * 9 // 10]
+            poll = min(max((hi - lo) / 4.0, self.min_poll), self.max_poll)
+            self.plan[resp] = (min(max(lo - poll, 0.0), self.max_sleep), poll)
+
+    def stats(self):
+        """the learned parameters by response type"""
+        result = dict()
+        for resp in self.offsets:
+            s = sorted(self.offsets[resp])
+            frames, polls = self.polls[resp]
+            first_sleep, poll = self.plan.get(resp, (None, None))
+            result['%02x' % resp] = {
+                'samples': len(s),
+                'p10': s[len(s) // 10],
+                'p50': s[len(s) // 2],
+                'p90': s[len(s) * 9 // 10],
+                'first_sleep': first_sleep,
+                'poll_interval': poll,
+                'polls_per_frame': float(polls) / frames}
+        return result
+
+
 class CommunicationService(object):
 
-    def __init__(self, first_sleep, values, max_records=51200, batch_size=100):
+    def __init__(self, first_sleep, values, max_records=51200, batch_size=100,
+                 transport=None, capture=None, adaptive_timing=False,
+                 snapshot_ready=None, history_share=1.0):
         logdbg('CommunicationService.init')
 
         self.first_sleep = first_sleep
         self.values = values
         self.reg_names = dict()
-        self.hid = Transceiver()
+        self.hid = Transceiver(transport, capture)
         self.transceiver_settings = TransceiverSettings()
-        self.last_stat = LastStat()
-        self.station_config = StationConfig()
-        self.current = CurrentData()
         self.comm_mode_interval = 8
         self.config_serial = None # optionally specified serial number
-        self.logger_id = 0 # the default logger id
+        self.consoles = dict() # console state by logger id
+        self.default_console = None # the first console added
         self.transceiver_present = False
         self.registered_device_id = None
 
         self.firstSleep = 1
         self.nextSleep = 1
         self.pollCount = 0
+        self.scheduler = PollScheduler() if adaptive_timing else None
 
         self.running = False
         self.child = None
         self.thread_wait = 60.0  # seconds
 
-        self.command = None
-        self.history_cache = HistoryCache()
-        self.ts_last_rec = 0
-        self.records_skipped = 0
+        # history frames for the history thread, see doHistory; notified
+        # when it has decoded some
+        self.history_frames = queue.Queue()
+        self.history_decoded = threading.Condition()
+        self.history_child = None
 
         self.max_records = max_records
         self.batch_size = batch_size
+        # share of the requests for history while reading it, see
+        # scheduleRequest
+        self.history_share = history_share
+
+        # may be shared with other services so that one can wait for all
+        if snapshot_ready is None:
+            snapshot_ready = threading.Condition()
+        self.snapshot_ready = snapshot_ready
+
+    def addConsole(self, logger_channel, values=None):
+        """talk to the console on the indicated logger channel (1-10)"""
+        logger_id = logger_channel - 1
+        if logger_id in self.consoles:
+            return self.consoles[logger_id]
+        console = ConsoleState(logger_id, self.values if values is None else values)
+        self.consoles[logger_id] = console
+        if self.default_console is None:
+            self.default_console = console
+        self.publish(console)
+        return console
+
+    def getConsole(self, logger_id=None):
+        if logger_id is None:
+            return self.default_console
+        return self.consoles[logger_id]
 
     def buildFirstConfigFrame(self, cs):
         logdbg('buildFirstConfigFrame: cs=%04x' % cs)
@@ -3470,9 +6104,9 @@ class CommunicationService(object):
         newbuf[10] = (historyAddress >> 0) & 0xFF
         return newlen, newbuf
 
-    def buildConfigFrame(self, buf):
+    def buildConfigFrame(self, console, buf):
         logdbg("buildConfigFrame")
-        changed, cfgbuf = self.station_config.testConfigChanged()
+        changed, cfgbuf = console.station_config.testConfigChanged()
         if changed:
             newlen = 125  # 0x7D
             newbuf = [0] * newlen
@@ -3518,36 +6152,32 @@ class CommunicationService(object):
         newbuf[12] = (tm[0] - 2000) // 10                           # not used + year-hi
         return newlen, newbuf
 
-    def buildACKFrame(self, buf, action, cs, hidx=None):
+    def buildACKFrame(self, console, buf, action, cs, hidx=None):
         if DEBUG_COMM > 1:
             logdbg("buildACKFrame: action=%x cs=%04x historyIndex=%s" %
                    (action, cs, hidx))
 
         comInt = self.comm_mode_interval
 
-        # When last weather is stale, change action to get current weather
-        # This is only needed during long periods of history data catchup
-        if self.command == ACTION_GET_HISTORY:
-            now = int(time.time())
-            age = now - self.last_stat.last_weather_ts
-            # Morphing action only with GetHistory requests, 
-            # and stale data after a period of twice the CommModeInterval,
-            # but not with init GetHistory requests (0xF0)
-            if (action == ACTION_GET_HISTORY and
-                age >= (comInt + 1) * 2 and buf[1] != 0xF0):
-                if DEBUG_COMM > 0:
-                    logdbg('buildACKFrame: morphing action'
-                           ' from %d to 5 (age=%s)' % (action, age))
-                action = ACTION_GET_CURRENT
+        # While history is read, GetHistory requests may ask for current
+        # weather instead, but not init GetHistory requests (0xF0)
+        if (console.command == ACTION_GET_HISTORY and
+            action == ACTION_GET_HISTORY and buf[1] != 0xF0):
+            action = self.scheduleRequest(console)
 
         if hidx == 0xFFFF:
             # At first config preset the address with DeviceId and logger_id
-            haddr = (self.getDeviceID() << 8) + int(self.logger_id)
+            haddr = (self.getDeviceID() << 8) + int(console.logger_id)
             logdbg('buildACKFrame: first config haddr preset to deviceID and logger_id 0x%06x' % haddr)
         else:
             if hidx is None:
-                if self.last_stat.latest_history_index is not None:
-                    hidx = self.last_stat.latest_history_index
+                if (console.command == ACTION_GET_HISTORY and
+                    console.history_cache.next_index is not None):
+                    # while reading history, answers to other frames must
+                    # not skip the records that have not been read yet
+                    hidx = console.history_cache.next_index
+                elif console.last_stat.latest_history_index is not None:
+                    hidx = console.last_stat.latest_history_index
             if hidx is None or hidx < 0 or hidx >= KlimaLoggDriver.max_records:
                 # If no hidx is present yet, preset haddr with 0xffffff
                 haddr = 0xFFFFFF
@@ -3574,35 +6204,69 @@ class CommunicationService(object):
         newbuf[10] = (int(haddr) >> 0) & 0xFF
         return newlen, newbuf
 
-    def handleConfig(self, length, buf):
+    def scheduleRequest(self, console):
+        """Choose whether the next request while reading history asks for
+        history or for current weather.  Current weather is asked for when
+        it is stale, after twice the comm interval, and otherwise in the
+        share of the requests that is not history_share, counted since
+        reading started."""
+        cache = console.history_cache
+        age = int(time.time()) - console.last_stat.last_weather_ts
+        stale = age >= (self.comm_mode_interval + 1) * 2
+        live_share = 1.0 - self.history_share
+        cache.requests += 1
+        if stale or cache.live_requests < live_share * cache.requests:
+            cache.live_requests += 1
+            if DEBUG_COMM > 0:
+                logdbg('scheduleRequest: current weather (age=%s, %d of %d'
+                       ' requests)' % (age, cache.live_requests,
+                                       cache.requests))
+            return ACTION_GET_CURRENT
+        return ACTION_GET_HISTORY
+
+    def handleConfig(self, console, length, buf):
         logdbg('handleConfig: %s' % self.timing())
         if DEBUG_CONFIG_DATA > 2:
             self.hid.dump('InBuf', buf, fmt='long', length=length)
-        self.station_config.read(buf)
+        console.station_config.read(buf)
+        console.sensors.update_config(
+            console.station_config.values.sensor_text)
         if DEBUG_CONFIG_DATA > 1:
-            self.station_config.to_log()
+            console.station_config.to_log()
         now = int(time.time())
-        self.last_stat.update(seen_ts=now,
-                              quality=(buf[4] & 0x7f), 
-                              config_ts=now)
+        console.last_stat.update(seen_ts=now,
+                                 quality=(buf[4] & 0x7f),
+                                 config_ts=now)
         cs = buf[124] | (buf[123] << 8)
         self.setSleep(self.first_sleep, 0.010)
-        return self.buildACKFrame(buf, ACTION_GET_HISTORY, cs)
-
-    def handleCurrentData(self, length, buf):
+        return self.buildACKFrame(console, buf, ACTION_GET_HISTORY, cs)
+
+    def applyClockAlarm(self, console):
+        """set or reset the clock alarm in the config as the history thread
+        decided.  The config is only changed in the RF thread, which also
+        encodes it."""
+        if console.clock_alarm is True:
+            console.station_config.setAlarmClockOffset()
+        elif console.clock_alarm is False:
+            console.station_config.resetAlarmClockOffset()
+
+    def handleCurrentData(self, console, length, buf):
         if DEBUG_WEATHER_DATA > 1:
             logdbg('handleCurrentData: %s' % self.timing())
+        self.applyClockAlarm(console)
 
         now = int(time.time())
 
         # update the weather data cache if stale
-        age = now - self.last_stat.last_weather_ts
+        age = now - console.last_stat.last_weather_ts
         if age >= self.comm_mode_interval:
             if DEBUG_WEATHER_DATA > 2:
                 self.hid.dump('CurWea', buf, fmt='long', length=length)
             data = CurrentData()
-            data.read(buf)
-            self.current = data
+            data.read(buf, console.sensors.mask)
+            console.sensors.update_current(data.values)
+            data.values.calc_derived(console.sensors.mask)
+            console.current = data
             if DEBUG_WEATHER_DATA > 1:
                 data.to_log()
         else:
@@ -3611,24 +6275,26 @@ class CommunicationService(object):
                        (age, now))
 
         # update the connection cache
-        self.last_stat.update(seen_ts=now,
-                              quality=(buf[4] & 0x7f),
-                              weather_ts=now)
+        console.last_stat.update(seen_ts=now,
+                                 quality=(buf[4] & 0x7f),
+                                 weather_ts=now)
 
         cs = buf[6] | (buf[5] << 8)
-        self.station_config.setSensorText(self.values)
-        changed, cfgbuf = self.station_config.testConfigChanged()
-        inBufCS = self.station_config.getInBufCS()
+        console.station_config.setSensorText(console.values)
+        changed = console.station_config.is_dirty()
+        inBufCS = console.station_config.getInBufCS()
         if inBufCS == 0 or inBufCS != cs:
             # request for a get config
             logdbg('handleCurrentData: inBufCS of station does not match')
             self.setSleep(self.first_sleep, 0.010)
-            newlen, newbuf = self.buildACKFrame(buf, ACTION_GET_CONFIG, cs)
+            newlen, newbuf = self.buildACKFrame(console, buf,
+                                                ACTION_GET_CONFIG, cs)
         elif changed:
             # Request for a set config
             logdbg('handleCurrentData: outBufCS of station changed')
             self.setSleep(self.first_sleep, 0.010)
-            newlen, newbuf = self.buildACKFrame(buf, ACTION_REQ_SET_CONFIG, cs)
+            newlen, newbuf = self.buildACKFrame(console, buf,
+                                                ACTION_REQ_SET_CONFIG, cs)
         else:
             # Request for either a history message or a current weather message
             # In general we don't use ACTION_GET_CURRENT to ask for a current
@@ -3636,30 +6302,28 @@ class CommunicationService(object):
             # ACTION_GET_HISTORY. This we learned from the Heavy Weather Pro
             # messages (via USB sniffer).
             self.setSleep(self.first_sleep, 0.010)
-            newlen, newbuf = self.buildACKFrame(buf, ACTION_GET_HISTORY, cs)
+            newlen, newbuf = self.buildACKFrame(console, buf,
+                                                ACTION_GET_HISTORY, cs)
         return newlen, newbuf
 
     # timestamp of record with time 'None'
-    TS_1900 = tstr_to_ts(str(datetime(1900, 1, 1, 0, 0)))
+    TS_1900 = dt_to_ts(datetime(1900, 1, 1, 0, 0))
 
     # initially the clock of the KlimaLogg station starts at 1-jan-2010,
     # so skip all records elder than 1-jul-2010
     # eldest valid timestamp for history record
-    TS_2010_07 = tstr_to_ts(str(datetime(2010, 7, 1, 0, 0)))
+    TS_2010_07 = dt_to_ts(datetime(2010, 7, 1, 0, 0))
 
-    def handleHistoryData(self, length, buf):
+    def handleHistoryData(self, console, length, buf):
+        cache = console.history_cache
         if DEBUG_HISTORY_DATA > 1:
             logdbg('handleHistoryData: %s' % self.timing())
+        self.applyClockAlarm(console)
 
         now = int(time.time())
-        self.last_stat.update(seen_ts=now,
-                              quality=(buf[4] & 0x7f),
-                              history_ts=now)
-
-        data = HistoryData()
-        data.read(buf)
-        if DEBUG_HISTORY_DATA > 1:
-            data.to_log()
+        console.last_stat.update(seen_ts=now,
+                                 quality=(buf[4] & 0x7f),
+                                 history_ts=now)
 
         cs = buf[6] | (buf[5] << 8)
         latestAddr = bytes_to_addr(buf[7], buf[8], buf[9])
@@ -3667,103 +6331,73 @@ class CommunicationService(object):
         latestIndex = addr_to_index(latestAddr)
         thisIndex = addr_to_index(thisAddr)
 
-        tsPos1 = tstr_to_ts(str(data.values['Pos1DT']))
-        tsPos2 = tstr_to_ts(str(data.values['Pos2DT']))
-        tsPos6 = tstr_to_ts(str(data.values['Pos6DT']))
-        if tsPos1 == self.TS_1900:
-            # the first history record has date-time 1900-01-01 00:00:00
-            # use the time difference with the second message
-            tsFirstRec = tsPos2
-        else:
-            tsFirstRec = tsPos1
-        if tsFirstRec is None or tsFirstRec == self.TS_1900:
-            timeDiff = 0
-        else:
-            timeDiff = abs(now - tsFirstRec)
-
-        # FIXME: what if we do not have config data yet?
-        cfg = self.getConfigData().as_dict()
-        dcfOn = 'OFF' if int(cfg['settings']) & 0x4 == 0 else 'ON'
-
-        # check for an actual history record (tsPos1 == tsPos2) with valid
-        # timestamp (tsPos1 != TS_1900)
-        # Take in account that communication might be stalled for 3 minutes during DCF reception and sensor scanning
-        # if history date/time differs more than 5 min from now then
-        # reqSetTime and initiate alarm
-        if data.values['Pos1Alarm'] == 0 and data.values['Pos6Alarm'] == 0:
-            # both records are history records
-            if tsPos1 == tsPos6 and tsPos1 != self.TS_1900:
-                if timeDiff > 300:
-                    self.station_config.setAlarmClockOffset()  # set Humidity0Min value to 99
-                    logerr('ERROR: DCF: %s; dateTime history record %s differs %s seconds from dateTime server; please check and set set the clock of your station' %
-                           (dcfOn, thisIndex, timeDiff))
-                    logerr('ERROR: tsPos1: %s, tsPos2: %s' % (tsPos1, tsPos6))
-                else:
-                    self.station_config.resetAlarmClockOffset()  # set Humidity0Min value to 20
-                    if timeDiff > 30:
-                        logdbg('DCF = %s; dateTime history record %s differs %s seconds from dateTime server' %
-                               (dcfOn, thisIndex, timeDiff))
-
         # initially the first buffer presented is 6, in fact it starts at 0,
         # which has date None, so we start at 1
         if thisIndex == 6 and latestIndex > 12:
             thisIndex = 1
         nrec = get_index(latestIndex - thisIndex)
-        logdbg('handleHistoryData: time=%s this=%d (0x%04x) latest=%d (0x%04x) nrec=%d' %
-               (data.values['Pos1DT'],
-                thisIndex, thisAddr, latestIndex, latestAddr, nrec))
+        logdbg('handleHistoryData: this=%d (0x%04x) latest=%d (0x%04x) nrec=%d' %
+               (thisIndex, thisAddr, latestIndex, latestAddr, nrec))
 
         # track the latest history index
-        self.last_stat.last_history_index = thisIndex
-        self.last_stat.latest_history_index = latestIndex
+        console.last_stat.last_history_index = thisIndex
+        console.last_stat.latest_history_index = latestIndex
 
         nextIndex = None
-        if self.command == ACTION_GET_HISTORY:
-            if self.history_cache.start_index is None:
-                if self.history_cache.num_rec > 0:
-                    logtee('handleHistoryData: request for %s records' %
-                           self.history_cache.num_rec)
-                    nreq = self.history_cache.num_rec
+        if console.command == ACTION_GET_HISTORY:
+            if cache.locate is not None:
+                nreq = self.locateHistory(console, buf,
+                                          addr_to_index(thisAddr), latestIndex)
+                if nreq is None:
+                    nextIndex = cache.next_index
                 else:
-                    if self.history_cache.since_ts > 0:
+                    nextIndex = self.startHistory(console, cache.locate[0],
+                                                  nreq)
+                    cache.locate = None
+            elif cache.start_index is None:
+                nreq = None
+                if cache.dump is not None:
+                    # the whole ring; asking for the latest index gets the
+                    # latest record, so the slot after it, which is written
+                    # next, cannot be read
+                    logtee('handleHistoryData: dump the history of logger %s' %
+                           (console.logger_id + 1))
+                    nreq = KlimaLoggDriver.max_records - 1
+                elif (cache.resume is not None and
+                      not cache.newest_first):
+                    last_index = self.checkResume(console, cache.resume,
+                                                  latestIndex)
+                    cache.resume = None
+                    if last_index is not None:
+                        # ask for the last stored record and those after it
+                        loginf('handleHistoryData: resume at index %s' % last_index)
+                        nreq = get_index(latestIndex - last_index) + 1
+                if nreq is None:
+                    if cache.num_rec > 0:
+                        logtee('handleHistoryData: request for %s records' %
+                               cache.num_rec)
+                        nreq = cache.num_rec
+                    elif cache.since_ts > 0:
                         logtee('handleHistoryData: request records since %s' %
-                               weeutil.weeutil.timestamp_to_string(self.history_cache.since_ts))
-                        span = int(time.time()) - self.history_cache.since_ts
-                        if cfg['history_interval'] is not None:
-                            arcint = 60 * history_intervals.get(cfg['history_interval'])
-                        else:
-                            arcint = 60 * 15  # use the typical history interval of 15 min if interval not known yet
-                        # FIXME: this assumes a constant archive interval for
-                        # all records in the station history
-                        nreq = int(span / arcint) + 5  # FIXME: punt 5
-                        if nrec > 0 and nreq > nrec:
-                            loginf('handleHistoryData: too many records requested (%d), clipping to number stored (%d)' %
-                                  (nreq, nrec))
-                            nreq = nrec
+                               weeutil.weeutil.timestamp_to_string(cache.since_ts))
+                        # the history interval may have changed over the
+                        # records in the ring, so find the record at
+                        # since_ts by asking for a few indexes
+                        cache.locate = [
+                            latestIndex, -1,
+                            min(KlimaLoggDriver.max_records, self.max_records + 1)]
+                        cache.num_outstanding_records = None
+                        nextIndex = self.locateHistory(console, buf, None,
+                                                       latestIndex)
                     else:
                         loginf('handleHistoryData: no start date known (empty database), use number stored (%d)' % nrec)
                         nreq = nrec
-                # limit number of history records that will be read
-                logdbg('handleHistoryData: nreq=%s' % nreq)
-                if nreq > self.max_records:
-                    nreq = self.max_records
-                    loginf('Number of history records limited to: %s' % nreq)
-                if nreq >= KlimaLoggDriver.max_records:
-                    nrec = KlimaLoggDriver.max_records - 1
-                idx = get_index(latestIndex - nreq)
-                self.history_cache.start_index = idx
-                self.history_cache.next_index = idx
-                self.last_stat.last_history_index = idx
-                self.history_cache.num_outstanding_records = nreq
-                logdbg('handleHistoryData: start_index=%s'
-                       ' num_outstanding_records=%s' % (idx, nreq))
-                nextIndex = idx
-                self.records_skipped = 0
-                self.ts_last_rec = 0
-            elif self.history_cache.next_index is not None:
+                if nreq is not None:
+                    nextIndex = self.startHistory(console, latestIndex, nreq)
+            elif cache.next_index is not None:
 
                 # thisIndex should be the 1-6 record(s) after next_index (note: index cycles after 51199 to 0)
-                indexRequested = self.history_cache.next_index
+                indexRequested = cache.next_index
                 # check if thisIndex is within the range expected
                 thisIndexOk = False
                 if indexRequested + 6 < KlimaLoggDriver.max_records:
@@ -3778,66 +6412,36 @@ class CommunicationService(object):
                     # indexRequested 51194 .. 51198 and thisIndex is within one of two ranges
                     thisIndexOk = True
 
-                if thisIndexOk:
-                    # get the next 1-6 history record(s)
-                    for x in range(1, 7):
-                        if data.values['Pos%dAlarm' % x] == 0:
-                            # History record
-                            tsCurrentRec = tstr_to_ts(str(data.values['Pos%dDT' % x]))
-                            # skip records which are too old or elder than requested
-                            if tsCurrentRec >= self.TS_2010_07 and tsCurrentRec >= self.history_cache.since_ts:
-                                # skip records with dateTime in the future
-                                if tsCurrentRec > (now + 300):
-                                    logdbg('handleHistoryData: skipped record at Pos%d tsCurrentRec=%s'
-                                           ' DT is in the future' %
-                                           (x, weeutil.weeutil.timestamp_to_string(tsCurrentRec)))
-                                    self.records_skipped += 1
-                                # Check if two records in a row with the same ts
-                                elif tsCurrentRec == self.ts_last_rec:
-                                    if DEBUG_HISTORY_DATA > 1:
-                                        logdbg('handleHistoryData: skipped record at Pos%d tsCurrentRec=%s'
-                                               ' DT is the same' %
-                                               (x, weeutil.weeutil.timestamp_to_string(tsCurrentRec)))
-                                    self.records_skipped += 1
-                                # Check if this record elder than previous good record
-                                elif tsCurrentRec < self.ts_last_rec:
-                                    logdbg('handleHistoryData: skipped record at Pos%d tsCurrentRec=%s'
-                                           ' DT is in the past' %
-                                           (x, weeutil.weeutil.timestamp_to_string(tsCurrentRec)))
-                                    self.records_skipped += 1
-                                # Check if this record more than 7 days newer than previous good record
-                                elif self.ts_last_rec != 0 and tsCurrentRec > self.ts_last_rec + 604800:
-                                    logdbg('handleHistoryData: skipped record at Pos%d tsCurrentRec=%s'
-                                           ' DT has too big diff' %
-                                           (x, weeutil.weeutil.timestamp_to_string(tsCurrentRec)))
-                                    self.records_skipped += 1
-                                else:
-                                    if self.history_cache.num_cached_records < self.batch_size:
-                                        # append good record to the history
-                                        logdbg('handleHistoryData:  append record at Pos%d tsCurrentRec=%s' %
-                                               (x, weeutil.weeutil.timestamp_to_string(tsCurrentRec)))
-                                        self.history_cache.records.append(data.as_dict(x))
-                                        self.history_cache.num_cached_records += 1
-                                        # save only TS of good records
-                                        self.ts_last_rec = tsCurrentRec
-                                        # save index of last appended record
-                                        self.history_cache.last_this_index = thisIndex
-                                    else:
-                                        logdbg('handleHistoryData: record at Pos%d tsCurrentRec=%s'
-                                               ' handled in next batch' %
-                                               (x, weeutil.weeutil.timestamp_to_string(tsCurrentRec)))
-                                        time.sleep(20)
-                            # Check if this record is too old or has no date
-                            elif tsCurrentRec < self.TS_2010_07:
-                                logerr('handleHistoryData: skippd record at Pos%d tsCurrentRec=None DT is too old' % x)
-                                self.records_skipped += 1
-                            else:
-                                # this record is elder than the requested start dateTime
-                                logdbg('handleHistoryData: skipped record at Pos%d tsCurrentRec=%s < %s' %
-                                       (x, weeutil.weeutil.timestamp_to_string(tsCurrentRec),
-                                        weeutil.weeutil.timestamp_to_string(self.history_cache.since_ts)))
-                                self.records_skipped += 1
-                        self.history_cache.next_index = thisIndex
+                if (thisIndexOk and cache.newest_first and
+                    not self.resumeVerified(console, buf, thisIndex)):
+                    # the gap has been overwritten, go on with the next
+                    self.nextSegment(console)
+                elif (thisIndexOk and
+                      not self.resumeVerified(console, buf, thisIndex)):
+                    # start again without the checkpoint
+                    cache.start_index = None
+                    cache.next_index = None
+                elif (thisIndexOk and cache.dump is None and
+                      cache.is_full(self.batch_size)):
+                    # no room for these records; ask for them again, which
+                    # holds the console until the driver has caught up
+                    logdbg('handleHistoryData: cache full, request index %s again' %
+                           indexRequested)
+                elif thisIndexOk:
+                    # the records are decoded and checked by the history
+                    # thread, so the ACK for the next ones goes out now
+                    if cache.dump is not None:
+                        # the records of the dump are ordered from the
+                        # latest index when it is done
+                        cache.dump.latest_index = latestIndex
+                    cache.frames_queued += 1
+                    self.history_frames.put((console,
+                                             bytearray(buf[0:length]),
+                                             thisIndex, now))
+                    if cache.newest_first:
+                        self.nextFrame(console)
+                    else:
+                        cache.next_index = thisIndex
                 else:
                     if nrec > 0:
                         logdbg('handleHistoryData: index mismatch: indexRequested: %s, thisIndex: %s' %
@@ -3845,19 +6449,402 @@ class CommunicationService(object):
                     elif indexRequested != thisIndex:
                         logdbg('handleHistoryData: skip corrupt record: indexRequested: %s, thisIndex: %s' %
                                (indexRequested, thisIndex))
-                        self.history_cache.next_index += 1
-                        self.records_skipped += 1
-                nextIndex = self.history_cache.next_index
-            self.history_cache.num_outstanding_records = nrec
+                        cache.next_index += 1
+                        console.records_skipped += 1
+                if not cache.newest_first:
+                    cache.num_outstanding_records = nrec
+                nextIndex = cache.next_index
             loginf('handleHistoryData: records cached=%s, records skipped=%s, next=%s' %
-                (self.history_cache.num_cached_records, self.records_skipped, nextIndex))
+                (cache.num_cached_records, console.records_skipped, nextIndex))
         self.setSleep(self.first_sleep, 0.010)
-        newlen, newbuf = self.buildACKFrame(buf, ACTION_GET_HISTORY, cs, nextIndex)
+        newlen, newbuf = self.buildACKFrame(console, buf, ACTION_GET_HISTORY,
+                                            cs, nextIndex)
         return newlen, newbuf
 
-    def handleNextAction(self, length, buf):
-        self.last_stat.update(seen_ts=int(time.time()),
-                              quality=(buf[4] & 0x7f))
+    def doHistory(self):
+        """decode the history frames queued by handleHistoryData, as many
+        at once as have been queued"""
+        while self.running:
+            try:
+                batch = [self.history_frames.get(True, 1)]
+            except queue.Empty:
+                continue
+            while True:
+                try:
+                    batch.append(self.history_frames.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                todo = []
+                for item in batch:
+                    image = item[0].history_cache.dump
+                    if image is not None:
+                        image.write_frame(item[1], item[2])
+                    else:
+                        todo.append(item)
+                # usually all frames are of one console
+                while todo:
+                    console = todo[0][0]
+                    items = [item for item in todo if item[0] is console]
+                    todo = [item for item in todo if item[0] is not console]
+                    frames = HistoryData.read_batch(
+                        [item[1] for item in items],
+                        console.sensors.configured)
+                    for (_, _, thisIndex, now), data in zip(items, frames):
+                        self.checkHistoryClock(console, data, thisIndex, now)
+                        self.cacheHistoryRecords(console, data, thisIndex,
+                                                 now)
+            except Exception as e:
+                logerr('exception in doHistory: %s' % e)
+                if weewx.debug:
+                    log_traceback()
+            finally:
+                with self.history_decoded:
+                    for item in batch:
+                        item[0].history_cache.frames_decoded += 1
+                    self.history_decoded.notify_all()
+        # the frames still queued are not decoded now
+        with self.history_decoded:
+            self.history_decoded.notify_all()
+
+    def checkHistoryClock(self, console, data, thisIndex, now):
+        """decide whether the clock alarm of the console is raised, if the
+        time of its history records is too far off; the RF thread changes
+        the config, see applyClockAlarm"""
+        if DEBUG_HISTORY_DATA > 1:
+            data.to_log()
+        tsPos1 = dt_to_ts(data.values.dt[0])
+        tsPos2 = dt_to_ts(data.values.dt[1])
+        tsPos6 = dt_to_ts(data.values.dt[5])
+        if tsPos1 == self.TS_1900:
+            # the first history record has date-time 1900-01-01 00:00:00
+            # use the time difference with the second message
+            tsFirstRec = tsPos2
+        else:
+            tsFirstRec = tsPos1
+        if tsFirstRec is None or tsFirstRec == self.TS_1900:
+            timeDiff = 0
+        else:
+            timeDiff = abs(now - tsFirstRec)
+
+        # check for an actual history record (tsPos1 == tsPos2) with valid
+        # timestamp (tsPos1 != TS_1900)
+        # Take in account that communication might be stalled for 3 minutes during DCF reception and sensor scanning
+        # if history date/time differs more than 5 min from now then
+        # reqSetTime and initiate alarm
+        if data.values.alarm[0] == 0 and data.values.alarm[5] == 0:
+            # both records are history records
+            if tsPos1 == tsPos6 and tsPos1 != self.TS_1900:
+                if timeDiff > 300:
+                    console.clock_alarm = True  # set Humidity0Min value to 99
+                    logerr('ERROR: DCF: %s; dateTime history record %s differs %s seconds from dateTime server; please check and set set the clock of your station' %
+                           (self.dcfState(console), thisIndex, timeDiff))
+                    logerr('ERROR: tsPos1: %s, tsPos2: %s' % (tsPos1, tsPos6))
+                else:
+                    console.clock_alarm = False  # set Humidity0Min value to 20
+                    if timeDiff > 30:
+                        logdbg('DCF = %s; dateTime history record %s differs %s seconds from dateTime server' %
+                               (self.dcfState(console), thisIndex, timeDiff))
+
+    @classmethod
+    def cacheHistoryRecords(cls, console, data, thisIndex, now,
+                            positions=None):
+        """check the 1-6 records of a history frame and add the good ones to
+        the history cache of the console.  If positions is given, only the
+        records at those positions are checked."""
+        cache = console.history_cache
+        if cache.newest_first:
+            # the newest record first; the segments end at an index, and
+            # those of gaps are before since_ts
+            order = range(6, 0, -1)
+            since_ts = 0
+        else:
+            order = range(1, 7)
+            since_ts = cache.since_ts
+        # get the next 1-6 history record(s)
+        for x in order:
+            if positions is not None and x not in positions:
+                continue
+            if cache.newest_first:
+                # the records of a segment are checked against each other,
+                # not against those of the segment before, which are newer
+                # by as long as the console was offline
+                segment = plan_segment(cache.plan, get_index(thisIndex - 6 + x))
+                if segment is None:
+                    continue
+                if segment != cache.history_segment:
+                    cache.history_segment = segment
+                    console.ts_last_rec = cache.plan[segment][2] or 0
+            if data.values.alarm[x - 1] == 0:
+                # History record
+                tsCurrentRec = dt_to_ts(data.values.dt[x - 1])
+                # skip records which are too old or elder than requested
+                if tsCurrentRec >= cls.TS_2010_07 and tsCurrentRec >= since_ts:
+                    # skip records with dateTime in the future
+                    if tsCurrentRec > (now + 300):
+                        logdbg('handleHistoryData: skipped record at Pos%d tsCurrentRec=%s'
+                               ' DT is in the future' %
+                               (x, weeutil.weeutil.timestamp_to_string(tsCurrentRec)))
+                        console.records_skipped += 1
+                    # Check if two records in a row with the same ts
+                    elif tsCurrentRec == console.ts_last_rec:
+                        if DEBUG_HISTORY_DATA > 1:
+                            logdbg('handleHistoryData: skipped record at Pos%d tsCurrentRec=%s'
+                                   ' DT is the same' %
+                                   (x, weeutil.weeutil.timestamp_to_string(tsCurrentRec)))
+                        console.records_skipped += 1
+                    # Check if this record elder than previous good record
+                    elif (not cache.newest_first and
+                          tsCurrentRec < console.ts_last_rec):
+                        logdbg('handleHistoryData: skipped record at Pos%d tsCurrentRec=%s'
+                               ' DT is in the past' %
+                               (x, weeutil.weeutil.timestamp_to_string(tsCurrentRec)))
+                        console.records_skipped += 1
+                    # or newer, when reading the newest first; the last frame
+                    # of a segment may repeat records
+                    elif (cache.newest_first and console.ts_last_rec != 0 and
+                          tsCurrentRec > console.ts_last_rec):
+                        if DEBUG_HISTORY_DATA > 1:
+                            logdbg('handleHistoryData: skipped record at Pos%d tsCurrentRec=%s'
+                                   ' DT is not older' %
+                                   (x, weeutil.weeutil.timestamp_to_string(tsCurrentRec)))
+                        console.records_skipped += 1
+                    # Check if this record more than 7 days from previous good record
+                    elif (console.ts_last_rec != 0 and
+                          abs(tsCurrentRec - console.ts_last_rec) > 604800):
+                        logdbg('handleHistoryData: skipped record at Pos%d tsCurrentRec=%s'
+                               ' DT has too big diff' %
+                               (x, weeutil.weeutil.timestamp_to_string(tsCurrentRec)))
+                        console.records_skipped += 1
+                    else:
+                        # append good record to the history
+                        logdbg('handleHistoryData:  append record at Pos%d tsCurrentRec=%s' %
+                               (x, weeutil.weeutil.timestamp_to_string(tsCurrentRec)))
+                        rec = data.as_dict(x)
+                        rec.index = get_index(thisIndex - 6 + x)
+                        rec.sensors = console.sensors.configured
+                        cache.add(rec)
+                        # save only TS of good records
+                        console.ts_last_rec = tsCurrentRec
+                        # save index of last appended record
+                        cache.last_this_index = thisIndex
+                # Check if this record is too old or has no date
+                elif tsCurrentRec < cls.TS_2010_07:
+                    logerr('handleHistoryData: skippd record at Pos%d tsCurrentRec=None DT is too old' % x)
+                    console.records_skipped += 1
+                else:
+                    # this record is elder than the requested start dateTime
+                    logdbg('handleHistoryData: skipped record at Pos%d tsCurrentRec=%s < %s' %
+                           (x, weeutil.weeutil.timestamp_to_string(tsCurrentRec),
+                            weeutil.weeutil.timestamp_to_string(since_ts)))
+                    console.records_skipped += 1
+
+    @staticmethod
+    def dcfState(console):
+        # FIXME: what if we do not have config data yet?
+        cfg = console.station_config.as_dict()
+        return 'OFF' if int(cfg['settings']) & 0x4 == 0 else 'ON'
+
+    def startHistory(self, console, latestIndex, nreq):
+        """start reading the nreq records up to latestIndex; returns the
+        index to ask for"""
+        cache = console.history_cache
+        logdbg('handleHistoryData: nreq=%s' % nreq)
+        if cache.dump is not None:
+            image = cache.dump
+            image.device_id = self.getDeviceID()
+            image.logger_id = console.logger_id
+            image.latest_index = latestIndex
+            image.config = console.station_config.in_buf
+            image.write_header()
+        else:
+            if nreq > self.max_records:
+                nreq = self.max_records
+                loginf('Number of history records limited to: %s' % nreq)
+            if nreq >= KlimaLoggDriver.max_records:
+                nreq = KlimaLoggDriver.max_records - 1
+        idx = get_index(latestIndex - nreq)
+        cache.start_index = idx
+        cache.next_index = idx
+        console.last_stat.last_history_index = idx
+        cache.num_outstanding_records = nreq
+        logdbg('handleHistoryData: start_index=%s'
+               ' num_outstanding_records=%s' % (idx, nreq))
+        console.records_skipped = 0
+        console.ts_last_rec = 0
+        if cache.newest_first:
+            cache.plan = [[idx, latestIndex, None]]
+            cache.plan.extend(self.checkGaps(console, cache.resume,
+                                             latestIndex))
+            cache.resume = None
+            cache.segments = [list(g) for g in cache.plan]
+            loginf('handleHistoryData: read newest first: %s' % cache.plan)
+            idx = self.nextSegment(console)
+        return idx
+
+    def nextSegment(self, console):
+        """start reading the next segment [lo, hi, hi_ts] of the plan, the
+        records after lo up to hi, newest first.  The record at hi is
+        checked against hi_ts unless that is None; it is the oldest stored
+        of a gap.  Returns the index to ask for."""
+        cache = console.history_cache
+        while cache.segments:
+            lo, hi, hi_ts = cache.segments.pop(0)
+            if get_index(hi - lo) == 0:
+                continue
+            cache.stop_index = lo
+            cache.verify_index = None if hi_ts is None else hi
+            cache.verify_ts = hi_ts
+            # asking for an index gets the (up to) 6 records after it
+            cache.next_index = get_index(hi - min(6, get_index(hi - lo)))
+            self.countOutstanding(console)
+            logdbg('nextSegment: records %s back to %s' %
+                   (hi, get_index(lo + 1)))
+            return cache.next_index
+        cache.num_outstanding_records = 0
+        return cache.next_index
+
+    def nextFrame(self, console):
+        """the frame asked for while reading newest first has arrived; ask
+        for the one before it, or start the next segment"""
+        cache = console.history_cache
+        remaining = get_index(cache.next_index - cache.stop_index)
+        if remaining == 0:
+            return self.nextSegment(console)
+        cache.next_index = get_index(cache.next_index - min(6, remaining))
+        self.countOutstanding(console)
+        return cache.next_index
+
+    def countOutstanding(self, console):
+        # the frame asked for, those before it and those of the gaps
+        cache = console.history_cache
+        n = 6 + get_index(cache.next_index - cache.stop_index)
+        for lo, hi, _ in cache.segments:
+            n += get_index(hi - lo)
+        cache.num_outstanding_records = n
+
+    def checkGaps(self, console, checkpoint, latestIndex):
+        """the gaps [lo, hi, hi_ts] of the checkpoint that fit this console,
+        each without the part that has been overwritten since.  A gap is
+        left when reading newest first stops after storing the record at
+        index hi and time hi_ts, the oldest of its segment so far."""
+        if checkpoint is None:
+            return []
+        try:
+            device_id = checkpoint['device_id']
+            logger_channel = checkpoint['logger_channel']
+            gaps = checkpoint['gaps']
+        except (KeyError, TypeError):
+            loginf('checkGaps: no gaps in checkpoint')
+            return []
+        if (device_id != self.getDeviceID() or
+            logger_channel != console.logger_id + 1):
+            loginf('checkGaps: checkpoint is for another console')
+            return []
+        oldest = min(self.max_records, KlimaLoggDriver.max_records - 1)
+        result = []
+        for lo, hi, hi_ts in gaps:
+            age_hi = get_index(latestIndex - hi)
+            age_lo = get_index(latestIndex - lo)
+            if age_hi >= oldest:
+                loginf('checkGaps: gap before index %s has been overwritten' % hi)
+                continue
+            if age_lo <= age_hi or age_lo > oldest:
+                lo = get_index(latestIndex - oldest)
+            result.append([lo, hi, hi_ts])
+        return result
+
+    def locateHistory(self, console, buf, thisIndex, latestIndex):
+        """binary search of the ring for the first record at or after
+        since_ts.  Ages count back from the latest index when the search
+        started; newer is the oldest age known to be at or after since_ts,
+        older the newest age known to be before it.  The records of each
+        frame narrow that range.  Returns the number of records to read
+        once the range is closed, otherwise None with next_index set to
+        the index to ask for next."""
+        cache = console.history_cache
+        base, newer, older = cache.locate
+        asked = cache.next_index
+        if thisIndex is not None and 1 <= get_index(thisIndex - asked) <= 6:
+            # records written since the search started are not counted
+            data = HistoryData()
+            data.read(buf)
+            shift = get_index(latestIndex - base)
+            for x in range(1, 7):
+                age = get_index(latestIndex - (thisIndex - 6 + x)) - shift
+                if age <= newer or age >= older:
+                    continue
+                ts = None
+                if data.values.alarm[x - 1] == 0:
+                    ts = dt_to_ts(data.values.dt[x - 1])
+                if (ts is not None and ts >= self.TS_2010_07 and
+                    ts >= cache.since_ts):
+                    newer = age
+                else:
+                    older = age
+            cache.locate[1:] = [newer, older]
+        elif thisIndex is not None:
+            logdbg('locateHistory: index mismatch: indexRequested: %s, thisIndex: %s' %
+                   (asked, thisIndex))
+        if older - newer <= 1:
+            logdbg('locateHistory: first record since %s is %s back from %s' %
+                   (cache.since_ts, newer, base))
+            return max(older, 1)
+        # ask for the records around the middle of the range
+        cache.next_index = get_index(base - (newer + older) // 2 - 3)
+        return None
+
+    def checkResume(self, console, checkpoint, latestIndex):
+        """the ring index of the last stored record if the checkpoint fits
+        this console and reading from there takes no more than max_records
+        records, otherwise None.  The console only counts the records it
+        has not sent yet, so the checkpoint may be further back than that."""
+        cache = console.history_cache
+        try:
+            device_id = checkpoint['device_id']
+            logger_channel = checkpoint['logger_channel']
+            last_index = checkpoint['next_index']
+            last_ts = checkpoint['last_ts']
+        except (KeyError, TypeError):
+            loginf('checkResume: incomplete checkpoint')
+            return None
+        if (device_id != self.getDeviceID() or
+            logger_channel != console.logger_id + 1):
+            loginf('checkResume: checkpoint is for another console')
+            return None
+        if last_ts > cache.since_ts:
+            loginf('checkResume: checkpoint is newer than the database')
+            return None
+        if get_index(latestIndex - last_index) >= self.max_records:
+            loginf('checkResume: checkpoint is too old')
+            return None
+        cache.verify_index = last_index
+        cache.verify_ts = last_ts
+        return last_index
+
+    def resumeVerified(self, console, buf, thisIndex):
+        """False if the checkpoint that reading resumed from does not match
+        the record in the frame at its index"""
+        cache = console.history_cache
+        if cache.verify_index is None:
+            return True
+        data = HistoryData()
+        data.read(buf)
+        x = 6 - get_index(thisIndex - cache.verify_index)
+        ts = None
+        if 1 <= x <= 6 and data.values.alarm[x - 1] == 0:
+            ts = dt_to_ts(data.values.dt[x - 1])
+        ok = ts == cache.verify_ts
+        if not ok:
+            loginf('resumeVerified: record %s is not the one in the checkpoint' %
+                   cache.verify_index)
+        cache.verify_index = None
+        cache.verify_ts = None
+        return ok
+
+    def handleNextAction(self, console, length, buf):
+        console.last_stat.update(seen_ts=int(time.time()),
+                                 quality=(buf[4] & 0x7f))
         cs = buf[6] | (buf[5] << 8)
         resp = buf[3]
         if resp == RESPONSE_REQ_READ_HISTORY:
@@ -3873,7 +6860,7 @@ class CommunicationService(object):
         elif resp == RESPONSE_REQ_SET_CONFIG:
             logdbg('handleNextAction: %02x (set config data)' % resp)
             self.setSleep(0.075, 0.005)
-            newlen, newbuf = self.buildConfigFrame(buf)
+            newlen, newbuf = self.buildConfigFrame(console, buf)
         elif resp == RESPONSE_REQ_SET_TIME:
             logdbg('handleNextAction: %02x (set time data)' % resp)
             self.setSleep(0.075, 0.005)
@@ -3881,10 +6868,20 @@ class CommunicationService(object):
         else:
             logdbg('handleNextAction: %02x' % resp)
             self.setSleep(self.first_sleep, 0.010)
-            newlen, newbuf = self.buildACKFrame(buf, ACTION_GET_HISTORY, cs)
+            newlen, newbuf = self.buildACKFrame(console, buf,
+                                                ACTION_GET_HISTORY, cs)
         return newlen, newbuf
 
-    def generateResponse(self, length, buf):
+    def frameConsole(self, length, buf):
+        """the console that sent the frame, by its logger channel; with a
+        single console, whatever channel it uses.  The default console if
+        there is no such channel, see generateResponse."""
+        if length > 2 and buf[2] in self.consoles:
+            return self.consoles[buf[2]]
+        return self.default_console
+
+    def generateResponse(self, console, length, buf):
+        """the answer to the frame buf from console, see frameConsole"""
         if DEBUG_COMM > 1:
             logdbg('generateResponse: %s' % self.timing())
         if length == 0:
@@ -3898,9 +6895,15 @@ class CommunicationService(object):
                    (bufferID, respType, length))
         deviceID = self.getDeviceID()
 
+        if (loggerID not in self.consoles and len(self.consoles) > 1 and
+            bufferID == deviceID):
+            raise BadResponse('logger channel %d is not configured' %
+                              (loggerID + 1))
+
         if bufferID == 0xF0F0 or bufferID == 0xFFFF:
             loginf('generateResponse: console not paired, attempting to pair to 0x%04x' % deviceID)
-            newlen, newbuf = self.buildACKFrame(buf, ACTION_GET_CONFIG, 0xFFFF, 0xFFFF)
+            newlen, newbuf = self.buildACKFrame(console, buf,
+                                                ACTION_GET_CONFIG, 0xFFFF, 0xFFFF)
         elif bufferID == deviceID:
             self.set_registered_device_id(bufferID, loggerID)  # the station and transceiver are paired now
             if respType == RESPONSE_DATA_WRITTEN:
@@ -3911,22 +6914,25 @@ class CommunicationService(object):
                     raise BadResponse('len=%x resp=%x' % (length, respType))
             elif respType == RESPONSE_GET_CONFIG:
                 if length == 0x7D:  # 125
-                    newlen, newbuf = self.handleConfig(length, buf)
+                    newlen, newbuf = self.handleConfig(console, length, buf)
                 else:
                     raise BadResponse('len=%x resp=%x' % (length, respType))
             elif respType == RESPONSE_GET_CURRENT:
                 if length == 0xE5:  # 229
-                    newlen, newbuf = self.handleCurrentData(length, buf)
+                    newlen, newbuf = self.handleCurrentData(console, length,
+                                                            buf)
                 else:
                     raise BadResponse('len=%x resp=%x' % (length, respType))
             elif respType == RESPONSE_GET_HISTORY:
                 if length == 0xB5:  # 181
-                    newlen, newbuf = self.handleHistoryData(length, buf)
+                    newlen, newbuf = self.handleHistoryData(console, length,
+                                                            buf)
                 else:
                     raise BadResponse('len=%x resp=%x' % (length, respType))
             elif respType == RESPONSE_REQUEST:
                 if length == 0x07:  # 7
-                    newlen, newbuf = self.handleNextAction(length, buf)
+                    newlen, newbuf = self.handleNextAction(console, length,
+                                                           buf)
                     self.hid.setState(0)
                 else:
                     raise BadResponse('len=%x resp=%x' % (length, respType))
@@ -4043,7 +7049,7 @@ class CommunicationService(object):
         loginf("comm_interval is %s" % comm_interval)
         loginf("logger_channel is %s" % logger_channel)
         self.comm_mode_interval = comm_interval
-        self.logger_id = logger_channel - 1
+        self.addConsole(logger_channel)
         self.config_serial = serial
         self.hid.open(vendor_id, product_id, serial)
         self.initTransceiver(frequency_standard)
@@ -4074,51 +7080,135 @@ class CommunicationService(object):
     def getTransceiverSerNo(self):
         return self.transceiver_settings.serial_number
 
-    # FIXME: make this thread-safe
-    def getCurrentData(self):
-        return self.current
-
-    # FIXME: make this thread-safe
-    def getLastStat(self):
-        return self.last_stat
-
-    # FIXME: make this thread-safe
-    def getConfigData(self):
-        return self.station_config
-
-    def startCachingHistory(self, since_ts=0, num_rec=0):
-        self.history_cache.clear_records()
+    def publish(self, console):
+        """make what has been received so far from console available to the
+        driver"""
+        last = console.snapshot
+        if last is None:
+            version = current_version = 0
+        else:
+            version = last.version + 1
+            current_version = last.current_version
+            if console.current is not last.current:
+                current_version = version
+        console.snapshot = Snapshot(version, current_version, console.current,
+                                    console.last_stat.copy(),
+                                    console.station_config.as_dict(),
+                                    console.sensors.mask)
+        if current_version == version and last is not None:
+            with self.snapshot_ready:
+                self.snapshot_ready.notify_all()
+
+    def getSnapshot(self, logger_id=None):
+        return self.getConsole(logger_id).snapshot
+
+    def getCurrentData(self, logger_id=None):
+        return self.getSnapshot(logger_id).current
+
+    def getLastStat(self, logger_id=None):
+        return self.getSnapshot(logger_id).last_stat
+
+    def getConfigData(self, logger_id=None):
+        return self.getSnapshot(logger_id).config
+
+    def startCachingHistory(self, since_ts=0, num_rec=0, logger_id=None):
+        console = self.getConsole(logger_id)
+        console.history_cache.clear_records()
         if since_ts is None:
             since_ts = 0
-        self.history_cache.since_ts = since_ts
+        console.history_cache.since_ts = since_ts
         if num_rec > KlimaLoggDriver.max_records - 2:
             num_rec = KlimaLoggDriver.max_records - 2
-        self.history_cache.num_rec = num_rec
-        self.command = ACTION_GET_HISTORY
-
-    def stopCachingHistory(self):
-        self.command = None
-
-    def getUncachedHistoryCount(self):
-        return self.history_cache.num_outstanding_records
-
-    def getNextHistoryIndex(self):
-        return self.history_cache.next_index
-
-    def getCachedHistoryCount(self):
-        return self.history_cache.num_cached_records
+        console.history_cache.num_rec = num_rec
+        console.command = ACTION_GET_HISTORY
+
+    def startStreamingHistory(self, since_ts=0, logger_id=None, resume=None,
+                              newest_first=False):
+        """like startCachingHistory, but hand each record to the driver as
+        it arrives, see getHistoryRecord.  At most batch_size records wait
+        for the driver.  Start after the record of the checkpoint resume if
+        it fits, see checkResume.  With newest_first, read the newest
+        records first, then those of the gaps in the checkpoint, see
+        checkGaps."""
+        self.startCachingHistory(since_ts, 0, logger_id)
+        cache = self.getConsole(logger_id).history_cache
+        cache.queue = queue.Queue()
+        cache.resume = resume
+        cache.newest_first = newest_first
+
+    def startDumpingHistory(self, image, logger_id=None):
+        """read the whole history ring of the console into the LoggerImage
+        image, which has been created.  The frames are saved as they are,
+        without decoding; see isHistoryDumped."""
+        self.startCachingHistory(0, 0, logger_id)
+        self.getConsole(logger_id).history_cache.dump = image
+
+    def isHistoryDumped(self, logger_id=None):
+        """True if all frames up to the latest have been saved"""
+        cache = self.getConsole(logger_id).history_cache
+        done = cache.num_outstanding_records == 0
+        return done and cache.frames_pending() == 0
+
+    def getHistoryRecord(self, timeout, logger_id=None):
+        """the next streamed record, or None after timeout seconds"""
+        try:
+            return self.getConsole(logger_id).history_cache.queue.get(True, timeout)
+        except queue.Empty:
+            return None
 
-    def getLatestHistoryIndex(self):
-        return self.last_stat.latest_history_index
+    def isHistoryStreamed(self, logger_id=None):
+        """True if all records up to the latest have been handed over"""
+        cache = self.getConsole(logger_id).history_cache
+        # read the counts first, records are queued before they are updated
+        done = cache.num_outstanding_records == 0
+        done = done and cache.frames_pending() == 0
+        return done and cache.queue.empty()
+
+    def stopCachingHistory(self, logger_id=None):
+        self.getConsole(logger_id).command = None
+
+    def getUncachedHistoryCount(self, logger_id=None):
+        return self.getConsole(logger_id).history_cache.num_outstanding_records
+
+    def getHistoryPlan(self, logger_id=None):
+        return self.getConsole(logger_id).history_cache.plan
+
+    def getNextHistoryIndex(self, logger_id=None):
+        return self.getConsole(logger_id).history_cache.next_index
+
+    def getCachedHistoryCount(self, logger_id=None):
+        return self.getConsole(logger_id).history_cache.num_cached_records
+
+    def getLatestHistoryIndex(self, logger_id=None):
+        return self.getSnapshot(logger_id).last_stat.latest_history_index
+
+    def getHistoryCacheRecords(self, logger_id=None, timeout=60):
+        """the cached records, once the history thread has decoded the
+        frames that have been read, or after timeout seconds"""
+        cache = self.getConsole(logger_id).history_cache
+        end = time.time() + timeout
+        with self.history_decoded:
+            while cache.frames_pending() > 0 and self.running:
+                remaining = end - time.time()
+                if remaining <= 0:
+                    logerr('getHistoryCacheRecords: %d frames not decoded'
+                           ' after %s seconds' %
+                           (cache.frames_pending(), timeout))
+                    break
+                self.history_decoded.wait(remaining)
+        return cache.records
 
-    def getHistoryCacheRecords(self):
-        return self.history_cache.records
+    def clearHistoryCache(self, logger_id=None):
+        self.getConsole(logger_id).history_cache.clear_records()
 
-    def clearHistoryCache(self):
-        self.history_cache.clear_records()
+    def clearWaitAtStart(self, logger_id=None):
+        self.getConsole(logger_id).history_cache.wait_at_start = 0
 
-    def clearWaitAtStart(self):
-        self.history_cache.wait_at_start = 0
+    def waitingAtStart(self):
+        for console in self.consoles.values():
+            if console.history_cache.wait_at_start == 1:
+                return True
+        return False
 
     def startRFThread(self):
         if self.child is not None:
@@ -4126,19 +7216,26 @@ class CommunicationService(object):
         logdbg('startRFThread: spawning RF thread')
         self.running = True
         self.child = threading.Thread(target=self.doRF)
-        self.child.setName('RFComm')
-        self.child.setDaemon(True)
+        self.child.name = 'RFComm'
+        self.child.daemon = True
         self.child.start()
+        self.history_child = threading.Thread(target=self.doHistory)
+        self.history_child.name = 'KLHistory'
+        self.history_child.daemon = True
+        self.history_child.start()
 
     def stopRFThread(self):
         self.running = False
         logdbg('stopRFThread: waiting for RF thread to terminate')
         self.child.join(self.thread_wait)
-        if self.child.isAlive():
+        if self.child.is_alive():
             logerr('unable to terminate RF thread after %d seconds' %
                    self.thread_wait)
         else:
             self.child = None
+        if self.history_child is not None:
+            self.history_child.join(self.thread_wait)
+            self.history_child = None
 
     def isRunning(self):
         return self.running
@@ -4148,7 +7245,7 @@ class CommunicationService(object):
             logdbg('setting up rf communication')
             self.doRFSetup()
             # wait for genStartupRecords or show_current to start
-            while self.history_cache.wait_at_start == 1:
+            while self.waitingAtStart():
                 time.sleep(1)
             loginf("starting rf communication")
             while self.running:
@@ -4198,10 +7295,17 @@ class CommunicationService(object):
             return
 
         framelen, framebuf = self.hid.getFrame()
+        if self.scheduler is not None:
+            self.scheduler.received(framebuf[3] & 0xF0, time.time(),
+                                    self.pollCount)
+        tx = False
+        console = self.frameConsole(framelen, framebuf)
         try:
-            framelen, framebuf = self.generateResponse(framelen, framebuf)
+            framelen, framebuf = self.generateResponse(console, framelen,
+                                                       framebuf)
             self.hid.setFrame(framelen, framebuf)
             self.hid.setTX()
+            tx = True
         except DataWritten:
             logdbg('SetTime/SetConfig data written')
             self.hid.setRX()
@@ -4212,12 +7316,26 @@ class CommunicationService(object):
             if self.config_serial is None:
                 logerr("%s; use parameter 'serial' if more than one USB transceiver present" % e)
             self.hid.setRX()
+        if self.scheduler is not None:
+            if tx:
+                # use the learned timing for the answer to this frame
+                action = framebuf[3] if framelen > 3 else None
+                self.firstSleep, self.nextSleep = self.scheduler.sent(
+                    action, time.time(), self.firstSleep, self.nextSleep)
+            else:
+                self.scheduler.reset()
+        self.publish(console)
 
     # these are for diagnostics and debugging
     def setSleep(self, firstsleep, nextsleep):
         self.firstSleep = firstsleep
         self.nextSleep = nextsleep
 
+    def getPollTiming(self):
+        if self.scheduler is None:
+            return None
+        return self.scheduler.stats()
+
     def timing(self):
         s = self.firstSleep + self.nextSleep * (self.pollCount - 1)
         return 'sleep=%s first=%s next=%s count=%s' % (
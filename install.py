@@ -9,11 +9,12 @@ def loader():
 class KlimaLoggInstaller(ExtensionInstaller):
     def __init__(self):
         super(KlimaLoggInstaller, self).__init__(
-            version="1.4.2",
+            version="1.5.0",
             name='klimalogg',
             description='Collect and display KlimaLogg Pro sensor data',
             author="Luc Heijst",
             author_email="ljm.heijst@gmail.com",
+            prep_services='user.kl.KlimaLoggBulkIngest',
             config={
                 'StdReport': {
                     'data_binding': 'kl_binding',
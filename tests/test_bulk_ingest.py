@@ -0,0 +1,198 @@
+# tests for storing klimalogg history with KlimaLoggBulkIngest in weewx
+# Copyright 2026 The weewx-klimalogg authors
+"""Run the startup of a weewx engine with KlimaLoggBulkIngest and
+StdArchive on a KlimaLoggEmulator, with a sqlite database, and the LOOP
+packets that store the history of a backfill.  The driver and
+the emulated console share a ScaledClock.
+
+  PYTHONPATH=/home/weewx/bin python -m pytest tests
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+import configobj
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+import user.kl as kl
+import weewx
+import weewx.engine
+
+
+class Engine(weewx.engine.StdEngine):
+    """an engine with a driver of the test instead of that of the config"""
+
+    driver = None
+
+    def setupStation(self, config_dict):
+        self.console = self.driver
+
+
+class BulkIngestTest(unittest.TestCase):
+
+    records = 300
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.time = kl.time
+        # just after a record, so that no new one is written during a test
+        start = int(time.time()) // 3600 * 3600 + 60
+        self.clock = kl.time = kl.ScaledClock(200, start=start)
+        self.archived = []
+        self.engine = None
+
+    def tearDown(self):
+        if self.engine is not None:
+            self.engine.shutDown()
+        elif Engine.driver is not None:
+            Engine.driver.closePort()
+        Engine.driver = None
+        kl.time = self.time
+        shutil.rmtree(self.tmp)
+
+    def config(self, prep_services='user.kl.KlimaLoggBulkIngest',
+               target_unit='METRIC', **stn):
+        stn.setdefault('batch_size', 200)
+        return configobj.ConfigObj({
+            'WEEWX_ROOT': self.tmp,
+            'Station': {'station_type': 'KlimaLogg', 'location': 'test',
+                        'latitude': 50.0, 'longitude': 8.0,
+                        'altitude': [100, 'meter']},
+            'KlimaLogg': dict(stn, driver='user.kl'),
+            'StdConvert': {'target_unit': target_unit},
+            'StdArchive': {'data_binding': 'kl_binding',
+                           'record_generation': 'software',
+                           'archive_interval': 300},
+            'DataBindings': {
+                'kl_binding': {'database': 'kl_sqlite',
+                               'table_name': 'archive',
+                               'manager': 'weewx.manager.DaySummaryManager',
+                               'schema': 'user.kl.schema'}},
+            'Databases': {'kl_sqlite': {'database_name': 'kl.sdb',
+                                        'database_type': 'SQLite'}},
+            'DatabaseTypes': {'SQLite': {'driver': 'weedb.sqlite',
+                                         'SQLITE_ROOT': self.tmp}},
+            'Engine': {'Services': {
+                'prep_services': prep_services,
+                'xtype_services': [],
+                'archive_services': 'weewx.engine.StdArchive'}}})
+
+    def start(self, console, config):
+        """run the events of the engine up to the first LOOP packet"""
+        Engine.driver = kl.KlimaLoggDriver(transport=console,
+                                           **config['KlimaLogg'].dict())
+        self.engine = Engine(config)
+        self.engine.bind(weewx.NEW_ARCHIVE_RECORD,
+                         lambda event: self.archived.append(event.record))
+        t0 = time.time()
+        self.engine.dispatchEvent(weewx.Event(weewx.STARTUP))
+        self.startup_time = time.time() - t0
+        self.engine.dispatchEvent(weewx.Event(weewx.PRE_LOOP))
+        return self.engine.db_binder.get_manager('kl_binding')
+
+    def loop(self, timeout=60):
+        """dispatch LOOP packets until the backfill is done"""
+        service = [s for s in self.engine.service_obj
+                   if isinstance(s, kl.KlimaLoggBulkIngest)][0]
+        packets = 0
+        end = time.time() + timeout
+        while service.backfill_queue is not None and time.time() < end:
+            packet = {'dateTime': int(self.clock.time()),
+                      'usUnits': weewx.METRIC}
+            self.engine.dispatchEvent(
+                weewx.Event(weewx.NEW_LOOP_PACKET, packet=packet))
+            packets += 1
+            time.sleep(0.05)
+        self.assertIsNone(service.backfill_queue)
+        return packets
+
+    def stored(self, dbmanager):
+        return [ts for ts, in dbmanager.genSql(
+            'SELECT dateTime FROM archive ORDER BY dateTime')]
+
+    def test_catchup_at_startup(self):
+        console = kl.KlimaLoggEmulator(records=self.records, clock=self.clock,
+                                       history_interval=kl.HI_01STD, seed=1)
+        dbmanager = self.start(console, self.config())
+        stored = self.stored(dbmanager)
+        # all but the oldest, which gives the interval of the next one
+        self.assertEqual(len(stored), self.records - 1)
+        self.assertEqual(set(b - a for a, b in zip(stored, stored[1:])),
+                         set([console.interval]))
+        # StdArchive got no records from the driver
+        self.assertEqual(self.archived, [])
+
+    def test_backfill(self):
+        console = kl.KlimaLoggEmulator(records=self.records, clock=self.clock,
+                                       history_interval=kl.HI_01STD, seed=1)
+        dbmanager = self.start(console, self.config(backfill=True))
+        # STARTUP does not wait for the history
+        self.assertLess(self.startup_time, 1)
+        self.assertGreater(self.loop(), 1)
+        self.assertEqual(len(self.stored(dbmanager)), self.records - 1)
+        self.assertEqual(self.archived, [])
+
+    def test_us_units(self):
+        # the records of the driver are metric, those of the database US
+        for backfill in (False, True):
+            console = kl.KlimaLoggEmulator(
+                records=self.records, clock=self.clock,
+                history_interval=kl.HI_01STD, seed=1)
+            dbmanager = self.start(console, self.config(target_unit='US',
+                                                        backfill=backfill))
+            if backfill:
+                self.loop()
+            rows = list(dbmanager.genSql(
+                'SELECT dateTime, usUnits, temp0 FROM archive'))
+            self.assertEqual(len(rows), self.records - 1)
+            for ts, units, temp0 in rows:
+                self.assertEqual(units, weewx.US)
+                self.assertAlmostEqual(
+                    temp0, console.sensorValues(0, ts)[0] * 1.8 + 32, 3)
+            self.engine.shutDown()
+            self.engine = None
+            Engine.driver = None
+            os.remove(os.path.join(self.tmp, 'kl.sdb'))
+
+    def test_newest_first(self):
+        console = kl.KlimaLoggEmulator(records=self.records, clock=self.clock,
+                                       history_interval=kl.HI_01STD, seed=1)
+        checkpoint = os.path.join(self.tmp, 'checkpoint.json')
+        chunks = []
+        history_stored = kl.KlimaLoggDriver.history_stored
+        self.addCleanup(setattr, kl.KlimaLoggDriver, 'history_stored',
+                        history_stored)
+
+        def stored_back_to(driver, ts):
+            chunks.append(ts)
+            history_stored(driver, ts)
+        kl.KlimaLoggDriver.history_stored = stored_back_to
+        dbmanager = self.start(console, self.config(
+            history_order='newest', checkpoint_file=checkpoint,
+            batch_size=50, catchup_chunk_size=50))
+        stored = self.stored(dbmanager)
+        self.assertEqual(len(stored), self.records - 1)
+        self.assertEqual(set(b - a for a, b in zip(stored, stored[1:])),
+                         set([console.interval]))
+        self.assertEqual(self.archived, [])
+        # stored in chunks from the newest record back
+        self.assertGreater(len(chunks), 2)
+        self.assertEqual(chunks, sorted(chunks, reverse=True))
+        with open(checkpoint) as f:
+            self.assertEqual(json.load(f)['gaps'], [])
+
+    def test_without_service(self):
+        console = kl.KlimaLoggEmulator(records=self.records, clock=self.clock,
+                                       history_interval=kl.HI_01STD, seed=1)
+        dbmanager = self.start(console, self.config(prep_services=[]))
+        self.assertEqual(len(self.stored(dbmanager)), self.records - 1)
+        self.assertEqual(len(self.archived), self.records - 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
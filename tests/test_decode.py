@@ -0,0 +1,240 @@
+# tests for decoding klimalogg frames
+# Copyright 2026 The weewx-klimalogg authors
+"""Compare the decoding of frames with the lookup tables against the
+decoding value by value with the error and overflow checks of Decode, on
+frames of a KlimaLoggEmulator and on random frames.  Compare the records of
+the decoded values with the dicts keyed by label that they replace.
+
+  PYTHONPATH=/home/weewx/bin python -m pytest tests
+"""
+
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+import user.kl as kl
+from user.kl import Decode, SensorLimits
+
+
+def temperature_3_1(buf, start, startOnHiNibble):
+    """Decode.toTemperature_3_1 without the table"""
+    if Decode.isErr3(buf, start, startOnHiNibble):
+        return SensorLimits.temperature_NP
+    if Decode.isOFL3(buf, start, startOnHiNibble):
+        return SensorLimits.temperature_OFL
+    if startOnHiNibble:
+        rawtemp = (buf[start] >> 4) * 10 \
+            + (buf[start + 0] & 0xF) * 1 \
+            + (buf[start + 1] >> 4) * 0.1
+    else:
+        rawtemp = (buf[start] & 0xF) * 10 \
+            + (buf[start + 1] >> 4) * 1 \
+            + (buf[start + 1] & 0xF) * 0.1
+    return rawtemp - SensorLimits.temperature_offset
+
+
+def humidity_2_0(buf, start, startOnHiNibble):
+    """Decode.toHumidity_2_0 without the table"""
+    if Decode.isErr2(buf, start, startOnHiNibble):
+        return SensorLimits.humidity_NP
+    if Decode.isOFL2(buf, start, startOnHiNibble):
+        return SensorLimits.humidity_OFL
+    return Decode.toInt_2(buf, start, startOnHiNibble)
+
+
+def current_values(buf):
+    """the values of a current weather frame, decoded one by one"""
+    values = dict()
+    values['SignalQuality'] = buf[4] & 0x7F
+    for x in range(0, 9):
+        o = kl.CurrentData.BUFMAP[x]
+        lbl = 'Temp%s' % x
+        values[lbl + 'Max'] = temperature_3_1(buf, o[0], 0)
+        values[lbl + 'Min'] = temperature_3_1(buf, o[1], 1)
+        values[lbl] = temperature_3_1(buf, o[2], 0)
+        lbl = 'Humidity%s' % x
+        values[lbl + 'Max'] = humidity_2_0(buf, o[5], 1)
+        values[lbl + 'Min'] = humidity_2_0(buf, o[6], 1)
+        values[lbl] = humidity_2_0(buf, o[7], 1)
+    return values
+
+
+def history_values(buf):
+    """the values of a history frame by label, decoded one by one"""
+    values = dict()
+    for i in range(1, 7):
+        ala = kl.HistoryData.BUFMAPALA[i]
+        his = kl.HistoryData.BUFMAPHIS[i]
+        values['Pos%dAlarm' % i] = 1 if buf[ala[0]] == 0xee else 0
+        if values['Pos%dAlarm' % i] == 0:
+            values['Pos%dDT' % i] = Decode.toDateTime10(
+                buf, his[0], 1, 'HistoryData%d' % i)
+            for j in range(0, 9):
+                values['Pos%dTemp%d' % (i, j)] = temperature_3_1(
+                    buf, his[1][j], j % 2)
+                values['Pos%dHumidity%d' % (i, j)] = humidity_2_0(
+                    buf, his[2][j], 1)
+        else:
+            values['Pos%dDT' % i] = Decode.toDateTime10(
+                buf, ala[1], 1, 'HistoryData%d' % i)
+            values['Pos%dHumidityHi' % i] = humidity_2_0(buf, ala[8], 1)
+            values['Pos%dHumidityLo' % i] = humidity_2_0(buf, ala[7], 1)
+            values['Pos%dHumidity' % i] = humidity_2_0(buf, ala[6], 1)
+            values['Pos%dTempHi' % i] = temperature_3_1(buf, ala[5], 1)
+            values['Pos%dTempLo' % i] = temperature_3_1(buf, ala[4], 0)
+            values['Pos%dTemp' % i] = temperature_3_1(buf, ala[3], 0)
+            values['Pos%dAlarmdata' % i] = (buf[ala[2]] >> 4) & 0xf
+            values['Pos%dSensor' % i] = buf[ala[2]] & 0xf
+    return values
+
+
+def config_values(buf):
+    """the values of a config frame by label, decoded one by one"""
+    bufmap = kl.StationConfig.BUFMAP
+    values = dict()
+    values['Settings'] = buf[5]
+    values['TimeZone'] = buf[6]
+    values['HistoryInterval'] = buf[7] & 0xF
+    for x in range(0, 9):
+        values['Temp%dMax' % x] = temperature_3_1(buf, bufmap[0][x], 1)
+        values['Temp%dMin' % x] = temperature_3_1(buf, bufmap[1][x], 0)
+        values['Humidity%dMax' % x] = humidity_2_0(buf, bufmap[2][x], 1)
+        values['Humidity%dMin' % x] = humidity_2_0(buf, bufmap[3][x], 1)
+    values['AlarmSet'] = buf[53:53 + 5]
+    for x in range(1, 9):
+        start = bufmap[4][x - 1]
+        values['Description%d' % x] = buf[start:start + 8]
+        text = (Decode.toCharacters3_2(buf, start + 6, 0) +
+                Decode.toCharacters3_2(buf, start + 5, 1) +
+                Decode.toCharacters3_2(buf, start + 3, 0) +
+                Decode.toCharacters3_2(buf, start + 2, 1) +
+                Decode.toCharacters3_2(buf, start, 0))
+        if text == ' E@@      ':
+            text = '(No sensor)'
+        values['SensorText%d' % x] = text
+    values['ResetHiLo'] = buf[122]
+    values['InBufCS'] = (buf[123] << 8) | buf[124]
+    values['OutBufCS'] = kl.calc_checksum(buf, 5, end=122) + 7
+    return values
+
+
+def random_frames(size, n, seed=1):
+    """frames of random bytes, with many error and overflow nibbles"""
+    rnd = random.Random(seed)
+    return [bytearray(rnd.getrandbits(8) for _ in range(size))
+            for _ in range(n)]
+
+
+class DecodeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.console = kl.KlimaLoggEmulator(sensors=3, records=100, seed=1)
+
+    def test_temperature_table(self):
+        for key in range(0, 0x1000):
+            for buf, hi in ((bytearray([key >> 4, (key & 0xF) << 4]), 1),
+                            (bytearray([key >> 8, key & 0xFF]), 0)):
+                self.assertEqual(Decode.toTemperature_3_1(buf, 0, hi),
+                                 temperature_3_1(buf, 0, hi), hex(key))
+
+    def test_humidity_table(self):
+        for key in range(0, 0x100):
+            for buf, hi in ((bytearray([key, 0]), 1),
+                            (bytearray([key >> 4, (key & 0xF) << 4]), 0)):
+                self.assertEqual(Decode.toHumidity_2_0(buf, 0, hi),
+                                 humidity_2_0(buf, 0, hi), hex(key))
+
+    def test_current_data(self):
+        frames = [self.console.currentFrame()]
+        frames.extend(random_frames(kl.CurrentData.FRAME_SIZE, 20))
+        for buf in frames:
+            data = kl.CurrentData()
+            data.read(buf)
+            for key, value in current_values(buf).items():
+                self.assertEqual(data.values[key], value, key)
+
+    def test_history_data(self):
+        frames = [self.console.historyFrame(10), self.console.historyFrame(40)]
+        alarms = random_frames(kl.HistoryData.FRAME_SIZE, 20)
+        for n, buf in enumerate(alarms):
+            # alarm records in some of the positions
+            for i in range(1, 7):
+                if (n >> (i - 1)) & 1:
+                    buf[kl.HistoryData.BUFMAPALA[i][0]] = 0xee
+        frames.extend(alarms)
+        for buf in frames:
+            data = kl.HistoryData()
+            data.read(buf)
+            expected = history_values(buf)
+            for key, value in expected.items():
+                self.assertEqual(data.values[key], value, key)
+            # the positions of the other type keep the defaults
+            defaults = kl.HistoryValues()
+            for key in data.values:
+                if key not in expected:
+                    self.assertEqual(data.values[key], defaults[key], key)
+
+    @unittest.skipIf(kl.numpy is None, 'needs numpy')
+    def test_history_batch(self):
+        frames = [self.console.historyFrame(idx) for idx in (10, 40, 70)]
+        frames.extend(random_frames(kl.HistoryData.FRAME_SIZE, 20, seed=2))
+        for n, buf in enumerate(frames[3:]):
+            for i in range(1, 7):
+                if (n >> (i - 1)) & 1:
+                    buf[kl.HistoryData.BUFMAPALA[i][0]] = 0xee
+        for sensors in (kl.ALL_SENSORS, 0x00B, 0x001):
+            batch = kl.HistoryData.read_batch_numpy(frames, sensors)
+            for buf, data in zip(frames, batch):
+                expected = kl.HistoryData()
+                expected.read(buf, sensors)
+                for key in expected.values:
+                    self.assertEqual(data.values[key], expected.values[key],
+                                     (sensors, key))
+
+    def test_history_record(self):
+        data = kl.HistoryData()
+        data.read(self.console.historyFrame(10))
+        for x in range(1, 7):
+            rec = data.as_dict(x)
+            dt = data.values['Pos%dDT' % x]
+            self.assertEqual(rec['dateTime'], kl.tstr_to_ts(str(dt)))
+            for y in range(0, 9):
+                self.assertEqual(rec['Temp%d' % y],
+                                 data.values['Pos%dTemp%d' % (x, y)])
+                self.assertEqual(rec['Humidity%d' % y],
+                                 data.values['Pos%dHumidity%d' % (x, y)])
+            self.assertEqual(rec['dewpoint0'], None)
+            self.assertEqual(set(rec.keys()), set(kl.HistoryRecord.KEYS))
+
+    def test_station_config(self):
+        frames = [self.console.configFrame()]
+        frames.extend(random_frames(0x7D, 20))
+        for buf in frames:
+            config = kl.StationConfig()
+            config.read(buf)
+            expected = config_values(buf)
+            self.assertEqual(set(config.values.keys()), set(expected))
+            for key, value in expected.items():
+                self.assertEqual(config.values[key], value, key)
+
+    def test_record_access(self):
+        data = kl.CurrentData()
+        data.read(self.console.currentFrame())
+        values = data.values
+        self.assertIn('Temp3', values)
+        self.assertNotIn('Temp9', values)
+        self.assertRaises(KeyError, lambda: values['Temp9'])
+        self.assertIsNone(values.get('Temp9'))
+        values['Temp3'] = 12.5
+        self.assertEqual(values.temp[3], 12.5)
+        self.assertEqual(dict(values.items())['Temp3'], 12.5)
+        self.assertEqual(len(values), len(values.keys()))
+        # the date-times are decoded from the frame when looked up
+        self.assertIsNotNone(values['Temp0MaxDT'])
+        self.assertIsNone(values['Temp8MaxDT'])
+
+
+if __name__ == '__main__':
+    unittest.main()
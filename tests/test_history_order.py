@@ -0,0 +1,92 @@
+# tests for reading klimalogg history newest first
+# Copyright 2026 The weewx-klimalogg authors
+"""Read the history of a KlimaLoggEmulator newest first into a sqlite
+database, stop, and read the rest at the next start from the gaps in the
+checkpoint.  The driver and the emulated console share a ScaledClock.
+
+  PYTHONPATH=/home/weewx/bin python -m pytest tests
+"""
+
+import itertools
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+import user.kl as kl
+import weewx.manager
+
+
+class NewestFirstTest(unittest.TestCase):
+
+    records = 600
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.time = kl.time
+        # just after a record, so that no new one is written during a test
+        start = int(time.time()) // 3600 * 3600 + 60
+        self.clock = kl.time = kl.ScaledClock(200, start=start)
+        self.checkpoint = os.path.join(self.tmp, 'checkpoint.json')
+        schema = {'table': kl.schema,
+                  'day_summaries': [('temp0', 'scalar')]}
+        self.db = weewx.manager.DaySummaryManager.open_with_create(
+            {'database_name': os.path.join(self.tmp, 'kl.sdb'),
+             'driver': 'weedb.sqlite'}, schema=schema)
+
+    def tearDown(self):
+        self.db.close()
+        kl.time = self.time
+        shutil.rmtree(self.tmp)
+
+    def read(self, console, limit=None):
+        """store the history since the last record in the database, or
+        the first limit records of it"""
+        driver = kl.KlimaLoggDriver(transport=console, batch_size=200,
+                                    history_order='newest',
+                                    checkpoint_file=self.checkpoint)
+        try:
+            records = driver.gen_history_records(self.db.lastGoodStamp(),
+                                                 True)
+            if limit is not None:
+                records = itertools.islice(records, limit)
+            return kl.store_records(self.db, records, 50, 60,
+                                    driver.history_stored, in_order=False)
+        finally:
+            driver.closePort()
+
+    def stored(self):
+        return [ts for ts, in self.db.genSql(
+            'SELECT dateTime FROM archive ORDER BY dateTime')]
+
+    def test_gap_after_a_week_offline(self):
+        # hourly records, so that the gap starts more than 7 days before
+        # the oldest record read at the second start
+        console = kl.KlimaLoggEmulator(records=self.records, clock=self.clock,
+                                       history_interval=kl.HI_01STD, seed=1)
+        self.assertEqual(self.read(console, 200), 200)
+        with open(self.checkpoint) as f:
+            gaps = json.load(f)['gaps']
+        self.assertEqual(len(gaps), 1)
+        newest = self.stored()
+        self.assertGreater(newest[-1] - newest[0], 7 * 86400)
+
+        self.read(console)
+        stored = self.stored()
+        # all but the oldest, which gives the interval of the next one
+        self.assertEqual(len(stored), self.records - 1)
+        self.assertEqual(set(b - a for a, b in zip(stored, stored[1:])),
+                         set([console.interval]))
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)['gaps'], [])
+        # the daily summaries have each record once
+        count = self.db.getSql('SELECT SUM(count) FROM archive_day_temp0')
+        self.assertEqual(count[0], len(stored))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+# tests for decoding klimalogg history frames in the history thread
+# Copyright 2026 The weewx-klimalogg authors
+"""Queue history frames of a KlimaLoggEmulator for the history thread of a
+CommunicationService, as the RF thread does, and wait for the records.
+
+  PYTHONPATH=/home/weewx/bin python -m pytest tests
+"""
+
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+import user.kl as kl
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+
+class HistoryThreadTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = kl.ScaledClock(0, start=1700000000)
+        self.console = kl.KlimaLoggEmulator(records=100, clock=self.clock)
+        service = kl.CommunicationService.__new__(kl.CommunicationService)
+        service.running = True
+        service.history_frames = queue.Queue()
+        service.history_decoded = threading.Condition()
+        service.default_console = kl.ConsoleState(0, None)
+        service.consoles = {0: service.default_console}
+        self.service = service
+        self.errors = []
+        self.logerr = kl.logerr
+        kl.logerr = self.errors.append
+
+    def tearDown(self):
+        self.service.running = False
+        kl.logerr = self.logerr
+
+    def queue_frames(self, indexes):
+        state = self.service.default_console
+        for idx in indexes:
+            buf = self.console.historyFrame(idx)
+            this = kl.addr_to_index((buf[10] << 16) | (buf[11] << 8) | buf[12])
+            state.history_cache.frames_queued += 1
+            self.service.history_frames.put(
+                (state, bytearray(buf), this, int(self.clock.time())))
+
+    def test_wait_for_frames(self):
+        self.queue_frames(range(10, 70, 6))
+        thread = threading.Thread(target=self.service.doHistory)
+        thread.start()
+        try:
+            records = self.service.getHistoryCacheRecords(timeout=10)
+        finally:
+            self.service.running = False
+            thread.join()
+        self.assertEqual(len(records), 60)
+        self.assertEqual(self.errors, [])
+
+    def test_timeout(self):
+        # no history thread
+        self.queue_frames([10])
+        t0 = time.time()
+        self.assertEqual(self.service.getHistoryCacheRecords(timeout=0.2), [])
+        self.assertLess(time.time() - t0, 5)
+        self.assertEqual(len(self.errors), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# tests for finding klimalogg history records in the ring
+# Copyright 2026 The weewx-klimalogg authors
+"""Find the first history record since a time with locateHistory in the
+ring of a KlimaLoggEmulator whose records run across index 51199 to 0.
+The clock of the emulator stands still, so no records are written during
+a search.
+
+  PYTHONPATH=/home/weewx/bin python -m pytest tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+import user.kl as kl
+from user.kl import get_index
+
+MAX_RECORDS = kl.KlimaLoggDriver.max_records
+
+
+class GetIndexTest(unittest.TestCase):
+
+    def test_wrap(self):
+        self.assertEqual(get_index(MAX_RECORDS - 1), 51199)
+        self.assertEqual(get_index(MAX_RECORDS), 0)
+        self.assertEqual(get_index(MAX_RECORDS + 5), 5)
+        self.assertEqual(get_index(-1), 51199)
+        self.assertEqual(get_index(0 - 6), 51194)
+        # ages back from a latest index after the wrap
+        self.assertEqual(get_index(3 - 51199), 4)
+        self.assertEqual(get_index(51199 - 3), 51196)
+
+    def test_addresses(self):
+        for idx in (0, 1, 51198, 51199):
+            addr = kl.index_to_addr(idx)
+            self.assertEqual(kl.addr_to_index(addr), idx)
+        self.assertEqual(kl.index_to_addr(0), 0x070000)
+
+
+class LocateTest(unittest.TestCase):
+
+    records = 300
+    first_index = 51100
+
+    def setUp(self):
+        clock = kl.ScaledClock(0, start=1700000000)
+        self.console = kl.KlimaLoggEmulator(
+            records=self.records, first_index=self.first_index, clock=clock)
+        self.latest = self.console.latestIndex()
+        self.service = kl.CommunicationService.__new__(kl.CommunicationService)
+
+    def locate(self, since_ts):
+        """the number of records back from the latest that have to be read
+        for those since since_ts, and the number of frames asked for"""
+        state = kl.ConsoleState(0, None)
+        cache = state.history_cache
+        cache.since_ts = since_ts
+        cache.locate = [self.latest, -1, MAX_RECORDS]
+        nreq = self.service.locateHistory(state, None, None, self.latest)
+        frames = 0
+        while nreq is None:
+            self.assertNotEqual(cache.next_index, self.latest)
+            buf = self.console.historyFrame(cache.next_index)
+            frames += 1
+            this = kl.addr_to_index((buf[10] << 16) | (buf[11] << 8) | buf[12])
+            nreq = self.service.locateHistory(state, buf, this, self.latest)
+        return nreq, frames
+
+    def test_ring_wraps(self):
+        self.assertEqual(self.latest, self.first_index + self.records - 1
+                         - MAX_RECORDS)
+
+    def test_records_across_wrap(self):
+        for idx in (self.first_index + 1, 51150, 51199, 0, 1, 5, 100,
+                    self.latest - 1):
+            idx = get_index(idx)
+            ts = self.console.recordTime(idx)
+            expected = get_index(self.latest - idx) + 1
+            # at a record and just after the one before it
+            for since_ts in (ts, ts - 1):
+                nreq, frames = self.locate(since_ts)
+                self.assertEqual(nreq, expected, idx)
+                self.assertLess(frames, 20)
+
+    def test_all_records(self):
+        first = self.console.recordTime(self.first_index)
+        self.assertEqual(self.locate(first)[0], self.records)
+        self.assertEqual(self.locate(first - 86400)[0], self.records)
+
+    def test_no_records(self):
+        latest_ts = self.console.recordTime(self.latest)
+        self.assertEqual(self.locate(latest_ts)[0], 1)
+        self.assertEqual(self.locate(latest_ts + 1)[0], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
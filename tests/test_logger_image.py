@@ -0,0 +1,129 @@
+# tests for klimalogg logger images
+# Copyright 2026 The weewx-klimalogg authors
+"""Save history frames of a KlimaLoggEmulator to a LoggerImage as a dump
+does, decode the records of the image, and import them into a sqlite
+database with wee_device --import-dump.
+
+  PYTHONPATH=/home/weewx/bin python -m pytest tests
+"""
+
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+import user.kl as kl
+import weewx
+import weewx.manager
+
+
+class LoggerImageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'kl.img')
+        clock = kl.ScaledClock(0, start=1700000000)
+        self.console = kl.KlimaLoggEmulator(records=100, clock=clock)
+        self.errors = []
+        self.logerr = kl.logerr
+        kl.logerr = self.errors.append
+
+    def tearDown(self):
+        kl.logerr = self.logerr
+        shutil.rmtree(self.tmp)
+
+    def dump(self, indexes, close=True):
+        """save the frames asked for with indexes, return the indexes of
+        the records saved"""
+        image = kl.LoggerImage(self.path)
+        image.create()
+        image.latest_index = self.console.latestIndex()
+        image.config = bytes(self.console.configFrame())
+        image.write_header()
+        saved = set()
+        for idx in indexes:
+            buf = self.console.historyFrame(idx)
+            this = kl.addr_to_index((buf[10] << 16) | (buf[11] << 8) | buf[12])
+            image.write_frame(buf, this)
+            saved.update(kl.get_index(this - 6 + x) for x in range(1, 7))
+        if close:
+            image.close()
+        else:
+            # as if the dump had been stopped
+            image.f.flush()
+            self.addCleanup(image.f.close)
+        return saved
+
+    def records(self):
+        image = kl.LoggerImage(self.path)
+        image.open()
+        try:
+            return list(image.gen_history_records())
+        finally:
+            image.close()
+
+    def test_partial_frames(self):
+        # the frames of the dump are not aligned with those of the image,
+        # so the first and the last frame of the image are partly unread
+        saved = self.dump(range(10, 90, 6))
+        records = self.records()
+        self.assertEqual(len(records), len(saved))
+        self.assertEqual([r['dateTime'] for r in records],
+                         [self.console.recordTime(idx)
+                          for idx in sorted(saved)])
+        self.assertEqual(self.errors, [])
+
+    def test_scattered_frames(self):
+        saved = self.dump([3, 30, 31, 70])
+        records = self.records()
+        self.assertEqual(sorted(r['dateTime'] for r in records),
+                         [self.console.recordTime(idx)
+                          for idx in sorted(saved)])
+        self.assertEqual(self.errors, [])
+
+    def test_interrupted_dump(self):
+        saved = self.dump(range(10, 50, 6), close=False)
+        self.assertEqual(sorted(r['dateTime'] for r in self.records()),
+                         [self.console.recordTime(idx)
+                          for idx in sorted(saved)])
+
+    def test_import_dump(self):
+        # without a transceiver; the database is in US units, the records
+        # of the image metric
+        saved = self.dump(range(10, 90, 6))
+        config_dict = {
+            'WEEWX_ROOT': self.tmp,
+            'StdConvert': {'target_unit': 'US'},
+            'StdArchive': {'data_binding': 'kl_binding'},
+            'DataBindings': {
+                'kl_binding': {'database': 'kl_sqlite',
+                               'table_name': 'archive',
+                               'manager': 'weewx.manager.DaySummaryManager',
+                               'schema': 'user.kl.schema'}},
+            'Databases': {'kl_sqlite': {'database_name': 'kl.sdb',
+                                        'database_type': 'SQLite'}},
+            'DatabaseTypes': {'SQLite': {'driver': 'weedb.sqlite',
+                                         'SQLITE_ROOT': self.tmp}},
+            'KlimaLogg': {'driver': 'user.kl', 'transport': 'usb'}}
+        configurator = kl.KlimaLoggConfigurator()
+        parser = optparse.OptionParser()
+        configurator.add_options(parser)
+        options, _ = parser.parse_args(['--import-dump', self.path])
+        configurator.do_options(options, parser, config_dict, False)
+        with weewx.manager.open_manager_with_config(
+                config_dict, 'kl_binding') as dbmanager:
+            rows = list(dbmanager.genSql(
+                'SELECT dateTime, usUnits, temp0 FROM archive'))
+        # all but the oldest, which gives the interval of the next one
+        self.assertEqual(len(rows), len(saved) - 1)
+        for ts, units, temp0 in rows:
+            self.assertEqual(units, weewx.US)
+            self.assertAlmostEqual(
+                temp0, self.console.sensorValues(0, ts)[0] * 1.8 + 32, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
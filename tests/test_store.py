@@ -0,0 +1,78 @@
+# tests for storing klimalogg history in bulk
+# Copyright 2026 The weewx-klimalogg authors
+"""Store records with store_records and store_backfill into a sqlite
+database with daily summaries.
+
+  PYTHONPATH=/home/weewx/bin python -m pytest tests
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+import user.kl as kl
+import weewx
+import weewx.manager
+
+
+def record(ts, temp0=20.0):
+    return {'dateTime': ts, 'usUnits': weewx.METRIC, 'interval': 5,
+            'temp0': temp0}
+
+
+class StoreTest(unittest.TestCase):
+
+    start = 1700000100
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        schema = {'table': kl.schema,
+                  'day_summaries': [('temp0', 'scalar')]}
+        self.db = weewx.manager.DaySummaryManager.open_with_create(
+            {'database_name': os.path.join(self.tmp, 'kl.sdb'),
+             'driver': 'weedb.sqlite'}, schema=schema)
+
+    def tearDown(self):
+        self.db.close()
+        shutil.rmtree(self.tmp)
+
+    def count(self):
+        return self.db.getSql('SELECT SUM(count) FROM archive_day_temp0')[0]
+
+    def test_backfill_skips_stored_records(self):
+        self.db.addRecord(record(self.start + 300, 25.0))
+        records = [record(self.start + 600), record(self.start + 300),
+                   record(self.start)]
+        self.assertEqual(kl.store_backfill(self.db, records), 2)
+        stored = list(self.db.genSql(
+            'SELECT dateTime, temp0 FROM archive ORDER BY dateTime'))
+        self.assertEqual(stored, [(self.start, 20.0),
+                                  (self.start + 300, 25.0),
+                                  (self.start + 600, 20.0)])
+        self.assertEqual(self.count(), 3)
+        # all of them again
+        self.assertEqual(kl.store_backfill(self.db, records), 0)
+        self.assertEqual(self.count(), 3)
+
+    def test_records_in_order(self):
+        records = [record(self.start + 300 * i) for i in range(10)]
+        self.assertEqual(kl.store_records(self.db, iter(records), 4), 10)
+        self.assertEqual(self.db.lastGoodStamp(), records[-1]['dateTime'])
+        self.assertEqual(self.count(), 10)
+
+    def test_unknown_weewx(self):
+        version = weewx.__version__
+        weewx.__version__ = '6.0.0'
+        try:
+            self.assertRaises(weewx.UnsupportedFeature, kl.store_records,
+                              self.db, iter([record(self.start)]))
+        finally:
+            weewx.__version__ = version
+        self.assertIsNone(self.db.lastGoodStamp())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+# tests for converting klimalogg date-times to timestamps
+# Copyright 2026 The weewx-klimalogg authors
+"""Compare dt_to_ts with the string round trip of tstr_to_ts, every few
+minutes of the days around the DST changes of some time zones.  The zones
+are given as POSIX TZ strings, so no time zone database is needed.
+
+  PYTHONPATH=/home/weewx/bin python -m pytest tests
+"""
+
+import os
+import sys
+import time
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+import user.kl as kl
+
+
+@unittest.skipUnless(hasattr(time, 'tzset'), 'needs time.tzset')
+class DateTimeTest(unittest.TestCase):
+
+    # zone, then the days of its changes in 2024
+    ZONES = (('CET-1CEST,M3.5.0,M10.5.0/3', (3, 31), (10, 27)),
+             ('EST5EDT,M3.2.0,M11.1.0', (3, 10), (11, 3)),
+             # a change of half an hour, in the southern hemisphere
+             ('<+1030>-10:30<+11>-11,M10.1.0,M4.1.0', (4, 7), (10, 6)))
+
+    def setUp(self):
+        self.tz = os.environ.get('TZ')
+        kl._local_midnight.clear()
+
+    def tearDown(self):
+        if self.tz is None:
+            del os.environ['TZ']
+        else:
+            os.environ['TZ'] = self.tz
+        time.tzset()
+        kl._local_midnight.clear()
+
+    def set_zone(self, tz):
+        os.environ['TZ'] = tz
+        time.tzset()
+        kl._local_midnight.clear()
+
+    def check_days(self, first, days, step=5):
+        dt = first
+        end = first + timedelta(days=days)
+        while dt < end:
+            self.assertEqual(kl.dt_to_ts(dt), kl.tstr_to_ts(str(dt)), dt)
+            dt += timedelta(minutes=step)
+
+    def test_dst_changes(self):
+        for tz, spring, autumn in self.ZONES:
+            self.set_zone(tz)
+            for month, day in (spring, autumn):
+                first = datetime(2024, month, day) - timedelta(days=1)
+                self.check_days(first, 3)
+                # the day of the change is not taken from the memo
+                self.assertIsNone(kl._local_midnight[(2024, month, day)])
+                self.assertIsNotNone(
+                    kl._local_midnight[(first.year, first.month, first.day)])
+
+    def test_whole_year(self):
+        self.set_zone(self.ZONES[0][0])
+        self.check_days(datetime(2024, 1, 1), 366, step=97)
+
+    def test_utc(self):
+        self.set_zone('UTC0')
+        dt = datetime(2024, 3, 31, 2, 30)
+        self.assertEqual(kl.dt_to_ts(dt), 1711852200)
+        self.assertEqual(kl.dt_to_ts(datetime(1900, 1, 1)),
+                         kl.tstr_to_ts('1900-01-01 00:00:00'))
+
+
+if __name__ == '__main__':
+    unittest.main()
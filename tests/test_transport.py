@@ -0,0 +1,56 @@
+# tests for the klimalogg transports
+# Copyright 2026 The weewx-klimalogg authors
+"""Read the flash memory of a KlimaLoggEmulator through a Transceiver and
+check that transports implement the USBTransport interface.
+
+  PYTHONPATH=/home/weewx/bin python -m pytest tests
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'bin'))
+import user.kl as kl
+import weewx
+
+
+class TransportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.console = kl.KlimaLoggEmulator(device_id=0x0123, seed=1)
+
+    def test_read_config_flash(self):
+        hid = kl.Transceiver(transport=self.console)
+        buf = hid.readConfigFlash(0x1F9, 7)
+        self.assertEqual(buf[0:7], list(self.console.flash[0x1F9:0x200]))
+        self.assertEqual((buf[5] << 8) + buf[6], 0x0123)
+        self.assertEqual(self.console.readSerial(), '01021012120135')
+
+    def test_read_config_flash_dump(self):
+        dumped = []
+        buf = self.console.readCfg(0x1F5, 4,
+                                   dump=lambda label, b: dumped.append(label))
+        self.assertEqual(buf[0:4], [0x00, 0x01, 0x78, 0xa0])
+        self.assertEqual(dumped, ['readCfgFlash>', 'readCfgFlash<'])
+
+    def test_abstract(self):
+        self.assertRaises(TypeError, kl.USBTransport)
+
+        class Incomplete(kl.USBTransport):
+            def open(self, vid, pid, serial):
+                pass
+
+        self.assertRaises(TypeError, Incomplete)
+
+    def test_get_transport(self):
+        self.assertIs(kl.get_transport(self.console), self.console)
+        self.assertIsInstance(kl.get_transport(), kl.LegacyUSBTransport)
+        self.assertIsInstance(kl.get_transport('emulator'),
+                              kl.KlimaLoggEmulator)
+        self.assertRaises(weewx.ViolatedPrecondition, kl.get_transport,
+                          object())
+
+
+if __name__ == '__main__':
+    unittest.main()